@@ -49,12 +49,16 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     # WhiteNoise para servir estáticos en producción de forma eficiente
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Consultas SQL y tiempos por vista (core/metricas.py, expuestos en /metrics/)
+    'core.metricas.MetricasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Lecturas del dashboard, listados y exportaciones a la réplica, si la hay (core/routers.py)
+    'core.routers.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'biblioteca.urls'
@@ -85,17 +89,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Base de pruebas en archivo (no en memoria compartida) para que las
+        # pruebas de concurrencia vean los mismos bloqueos que en producción
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Conexiones persistentes: cada worker reutiliza la suya durante DB_CONN_MAX_AGE
+# segundos y comprueba que sigue viva antes de usarla en una nueva petición.
+# Detrás de PgBouncer en modo transacción (DB_PGBOUNCER=1) conviene
+# DB_CONN_MAX_AGE=0 y no usar cursores del lado del servidor.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER') == '1'
+
+
+def _base_de_datos_url(url):
+    base = dj_database_url.parse(
+        url,
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=True,
+        ssl_require=url.startswith('postgres'),
+    )
+    if DB_PGBOUNCER:
+        base['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return base
+
+
 # Si hay DATABASE_URL (p.ej. usando Postgres gratuito externo), usarla
 DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL:
-    DATABASES['default'] = dj_database_url.parse(
-        DATABASE_URL,
-        conn_max_age=600,
-        ssl_require=True,
-    )
+    DATABASES['default'] = _base_de_datos_url(DATABASE_URL)
 
 # En Render (sin DATABASE_URL), usar SQLite y permitir ruta configurable
 # - Si defines la variable de entorno SQLITE_PATH, se usará directamente.
@@ -107,6 +130,46 @@ if os.getenv('RENDER') and not DATABASE_URL:
     elif os.path.isdir('/var/data'):
         DATABASES['default']['NAME'] = '/var/data/db.sqlite3'
 
+# Ajustes de cada conexión SQLite (init_command de Django). WAL deja leer
+# mientras otro proceso escribe y 'synchronous=NORMAL' evita un fsync por
+# commit; busy_timeout hace esperar (en ms) en lugar de fallar con
+# "database is locked". Con transacciones IMMEDIATE cada bloque atómico (en
+# esta aplicación, los de escritura) toma el bloqueo de escritura al empezar,
+# así dos procesos no se atascan al pasar de lectura a escritura.
+# WAL solo en Render o si SQLITE_JOURNAL_MODE lo pide: cambia la cabecera del
+# archivo y deja db.sqlite3-wal/-shm a su lado, y en desarrollo la base está en git.
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL' if os.getenv('RENDER') else '')
+SQLITE_PRAGMAS = {
+    **({'journal_mode': SQLITE_JOURNAL_MODE} if SQLITE_JOURNAL_MODE else {}),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024))),
+    # Negativo = KiB por conexión
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-32000')),
+    'temp_store': 'MEMORY',
+}
+SQLITE_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {nombre}={valor}' for nombre, valor in SQLITE_PRAGMAS.items()),
+    # DEFERRED (el comportamiento por defecto de SQLite), IMMEDIATE o EXCLUSIVE
+    'transaction_mode': os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+}
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = SQLITE_OPTIONS
+
+# Réplica de solo lectura para el dashboard, los listados y las exportaciones
+# (core/routers.py). En local sirve una copia del archivo SQLite:
+# DATABASE_REPLICA_URL=sqlite:////ruta/replica.sqlite3
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = _base_de_datos_url(DATABASE_REPLICA_URL)
+    if DATABASES['replica']['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES['replica']['OPTIONS'] = SQLITE_OPTIONS
+    # En las pruebas la réplica es la misma base de pruebas
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['core.routers.RouterReplica']
+# Segundos que un navegador lee de la principal después de escribir (retraso tolerado de la réplica)
+REPLICA_RETRASO_SEGUNDOS = int(os.getenv('REPLICA_RETRASO_SEGUNDOS', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -176,4 +239,56 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 # --- Media (subida de archivos) ---
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# --- Portadas ---
+# Anchos (px) de las miniaturas que se generan de cada portada subida (core/portadas.py)
+PORTADAS_ANCHOS = (160, 320, 640)
+# Las portadas de más bytes se procesan en la cola de trabajos, fuera de la petición
+PORTADAS_MAX_SINCRONO = int(os.getenv('PORTADAS_MAX_SINCRONO', str(512 * 1024)))
+
+# --- Cola de reportes en segundo plano ---
+# Solicitudes idénticas dentro de esta ventana (segundos) reutilizan el mismo reporte
+REPORTES_VENTANA_FRESCURA = int(os.getenv('REPORTES_VENTANA_FRESCURA', '300'))
+
+# --- Préstamos ---
+# Préstamos activos simultáneos por lector (0 = sin límite)
+MAX_PRESTAMOS_LECTOR = int(os.getenv('MAX_PRESTAMOS_LECTOR', '0'))
+
+# --- Caché (estadísticas del dashboard y fragmentos del catálogo) ---
+# Con varios procesos web conviene una caché compartida (requiere el paquete 'redis');
+# si no, cada proceso usa la suya en memoria y la invalidación solo le llega a él.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+ESTADISTICAS_CACHE_SEGUNDOS = int(os.getenv('ESTADISTICAS_CACHE_SEGUNDOS', '300'))
+# Tarjetas y fichas de libros; la clave incluye la versión del libro, así que no hace falta invalidar
+FRAGMENTOS_CACHE_SEGUNDOS = int(os.getenv('FRAGMENTOS_CACHE_SEGUNDOS', '86400'))
+# Autocompletado: cada proceso rehace su lista de autores y categorías al invalidarse
+# (con caché compartida) o, como muy tarde, pasado este tiempo
+AUTOCOMPLETAR_SEGUNDOS = int(os.getenv('AUTOCOMPLETAR_SEGUNDOS', '300'))
+
+# --- Métricas y logs ---
+# Si se define, /metrics/ exige la cabecera 'Authorization: Bearer <token>'; sin él,
+# /metrics/ solo responde con DEBUG activado
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Una línea por petición: vista, estado, consultas SQL, tiempos y bytes
+        'biblioteca.metricas': {
+            'handlers': ['consola'],
+            'level': os.getenv('METRICAS_LOG_NIVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -1,12 +1,13 @@
 # core/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Usuario, Autor, Categoria, Libro, Prestamo, Reserva
+from .models import Usuario, Autor, Categoria, Libro, Prestamo, Reserva, Trabajo, CorreoPendiente
 
 # Configuraciones personalizadas para el Admin
 
 class UsuarioAdmin(UserAdmin):
-    list_display = ('username', 'email', 'first_name', 'last_name', 'rol', 'is_staff')
+    list_display = ('username', 'email', 'first_name', 'last_name', 'rol', 'prestamos_activos', 'bloqueado', 'is_staff')
+    list_filter = UserAdmin.list_filter + ('rol', 'bloqueado')
     fieldsets = UserAdmin.fieldsets + (
         ('Información Adicional', {'fields': ('rol',)}),
     )
@@ -23,10 +24,26 @@ class LibroAdmin(admin.ModelAdmin):
     list_filter = ('estado', 'categoria', 'autor')
     search_fields = ('titulo', 'isbn', 'autor__nombre')
 
+class TrabajoAdmin(admin.ModelAdmin):
+    list_display = ('tipo', 'estado', 'solicitado_por', 'creado', 'terminado')
+    list_filter = ('tipo', 'estado')
+
+class ReservaAdmin(admin.ModelAdmin):
+    list_display = ('libro', 'usuario', 'fecha_reserva', 'estado', 'fecha_expiracion')
+    list_filter = ('estado',)
+    search_fields = ('libro__titulo', 'usuario__username')
+
+class CorreoPendienteAdmin(admin.ModelAdmin):
+    list_display = ('asunto', 'destinatario', 'estado', 'intentos', 'proximo_intento', 'enviado')
+    list_filter = ('estado',)
+    search_fields = ('destinatario', 'asunto')
+
 # Registramos los modelos
 admin.site.register(Usuario, UsuarioAdmin)
 admin.site.register(Autor)
 admin.site.register(Categoria)
 admin.site.register(Libro, LibroAdmin)
 admin.site.register(Prestamo, PrestamoAdmin)
-admin.site.register(Reserva)
\ No newline at end of file
+admin.site.register(Reserva, ReservaAdmin)
+admin.site.register(Trabajo, TrabajoAdmin)
+admin.site.register(CorreoPendiente, CorreoPendienteAdmin)
\ No newline at end of file
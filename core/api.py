@@ -0,0 +1,321 @@
+# core/api.py
+"""
+API JSON de solo lectura del catálogo (para el quiosco y la app móvil).
+
+Se construye sobre ``values_list()``, sin instanciar modelos, y se serializa
+con ``json.dumps`` a partir de tuplas: decenas de miles de filas por segundo.
+
+- ``?fields=id,titulo,disponible`` elige los campos (``CAMPOS_*``); los que
+  necesitan una subconsulta (``en_cola``, ``libros``) solo se calculan si se piden.
+- ``/api/libros/?ids=1,2&isbn=978...`` devuelve varios libros en una consulta.
+- Los listados se paginan por cursor (``?cursor=`` y ``?limite=``) y aceptan
+  los filtros del catálogo (``q``, ``estado``, ``categoria``, ``autor``).
+- Todas las respuestas llevan ``ETag`` y contestan ``304`` si no cambiaron. En
+  los libros se comprueba con la versión del catálogo antes de consultar nada.
+- ``/api/autocompletar/?tipo=autor&q=gar`` sugiere libros, autores o
+  categorías por prefijo (core/autocompletar.py).
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import BooleanField, Case, Count, ExpressionWrapper, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Concat
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+
+from . import autocompletar, busqueda, fragmentos
+from .models import Autor, Categoria, Libro, Reserva
+from .paginacion import paginar
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+# Máximo de ids + ISBN en una búsqueda masiva
+MAXIMO_LOTE = 500
+
+
+def _en_cola():
+    return Coalesce(Subquery(
+        Reserva.objects.filter(libro=OuterRef('pk'), estado=Reserva.ESTADO_EN_COLA)
+        .values('libro').annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def _portada():
+    # Misma URL que daría el almacenamiento de archivos (MEDIA_URL + nombre)
+    return Case(
+        When(~Q(portada='') & Q(portada__isnull=False), then=Concat(Value(settings.MEDIA_URL), 'portada')),
+        default=F('portada_url'),
+    )
+
+
+def _libros_de(relacion):
+    def expresion():
+        return Coalesce(Subquery(
+            Libro.objects.filter(**{relacion: OuterRef('pk')})
+            .values(relacion).annotate(total=Count('pk')).values('total')
+        ), 0)
+    return expresion
+
+
+# campo público -> nombre del campo o función que devuelve la expresión
+CAMPOS_LIBRO = {
+    'id': 'id',
+    'titulo': 'titulo',
+    'isbn': 'isbn',
+    'resumen': 'resumen',
+    'estado': 'estado',
+    'disponible': lambda: ExpressionWrapper(Q(estado=Libro.ESTADO_DISPONIBLE), output_field=BooleanField()),
+    'en_cola': _en_cola,
+    'autor_id': 'autor_id',
+    'autor': lambda: Concat('autor__nombre', Value(' '), 'autor__apellido'),
+    'categoria_id': 'categoria_id',
+    'categoria': lambda: F('categoria__nombre'),
+    'portada': _portada,
+    'actualizado_en': 'actualizado_en',
+}
+CAMPOS_LIBRO_DEFECTO = ('id', 'titulo', 'isbn', 'autor', 'categoria', 'estado', 'disponible')
+
+CAMPOS_AUTOR = {
+    'id': 'id',
+    'nombre': 'nombre',
+    'apellido': 'apellido',
+    'libros': _libros_de('autor'),
+}
+CAMPOS_AUTOR_DEFECTO = ('id', 'nombre', 'apellido')
+
+CAMPOS_CATEGORIA = {
+    'id': 'id',
+    'nombre': 'nombre',
+    'libros': _libros_de('categoria'),
+}
+CAMPOS_CATEGORIA_DEFECTO = ('id', 'nombre')
+
+# Campos que dependen de otras tablas además de Libro (sin versión propia)
+CAMPOS_SIN_VERSION = {'en_cola'}
+
+
+class ErrorApi(Exception):
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def _campos(request, disponibles, defecto):
+    valor = request.GET.get('fields')
+    if not valor:
+        return list(defecto)
+    campos = list(dict.fromkeys(c.strip() for c in valor.split(',') if c.strip()))
+    desconocidos = [c for c in campos if c not in disponibles]
+    if desconocidos or not campos:
+        raise ErrorApi(f'Campos desconocidos: {", ".join(desconocidos)}. Disponibles: {", ".join(disponibles)}.')
+    return campos
+
+
+def _lista(request, parametro):
+    return [v.strip() for v in request.GET.get(parametro, '').split(',') if v.strip()]
+
+
+def _limite(request):
+    try:
+        limite = int(request.GET.get('limite', LIMITE_POR_DEFECTO))
+    except ValueError:
+        raise ErrorApi('limite debe ser un número.')
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        raise ErrorApi(f'limite debe estar entre 1 y {LIMITE_MAXIMO}.')
+    return limite
+
+
+def _columnas(queryset, campos, disponibles, extra=()):
+    """
+    ``values_list`` con los ``campos`` pedidos (y después las columnas de
+    ``extra`` que falten, p. ej. las claves del cursor). Devuelve el queryset y
+    la posición de cada columna.
+    """
+    anotaciones, columnas = {}, []
+    for campo in campos:
+        origen = disponibles[campo]
+        if isinstance(origen, str):
+            columnas.append(origen)
+        else:
+            anotaciones[f'api_{campo}'] = origen()
+            columnas.append(f'api_{campo}')
+    for nombre in extra:
+        if nombre not in columnas:
+            columnas.append(nombre)
+    if anotaciones:
+        queryset = queryset.annotate(**anotaciones)
+    return queryset.values_list(*columnas), {nombre: i for i, nombre in enumerate(columnas)}
+
+
+def _filas(campos, filas):
+    """Tuplas de ``values_list`` a diccionarios. Solo convierte las columnas de fecha."""
+    n = len(campos)
+    if filas and len(filas[0]) > n:
+        filas = [fila[:n] for fila in filas]
+    fechas = [i for i, campo in enumerate(campos) if campo == 'actualizado_en']
+    if fechas:
+        filas = [list(fila) for fila in filas]
+        for fila in filas:
+            for i in fechas:
+                if fila[i] is not None:
+                    fila[i] = fila[i].isoformat()
+    return [dict(zip(campos, fila)) for fila in filas]
+
+
+def _json(datos):
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def _etag(request, version):
+    partes = (version, request.get_full_path())
+    return quote_etag(hashlib.sha1(repr(partes).encode()).hexdigest())
+
+
+def _responder(request, generar, version=None):
+    """
+    Respuesta JSON con ``ETag``. Con ``version`` el 304 se decide antes de
+    llamar a ``generar()``; sin ella, el ``ETag`` es el hash del cuerpo.
+    """
+    if version is not None:
+        etag = _etag(request, version)
+        respuesta = get_conditional_response(request, etag=etag)
+        if respuesta is None:
+            respuesta = HttpResponse(generar(), content_type='application/json')
+    else:
+        cuerpo = generar()
+        etag = quote_etag(hashlib.sha1(cuerpo).hexdigest())
+        respuesta = get_conditional_response(request, etag=etag) or HttpResponse(
+            cuerpo, content_type='application/json'
+        )
+    respuesta.headers.setdefault('ETag', etag)
+    # Datos públicos: cualquier caché puede guardarlos, pero debe revalidar
+    patch_cache_control(respuesta, public=True, no_cache=True)
+    return respuesta
+
+
+def _vista_api(vista):
+    """Solo GET/HEAD y errores en JSON."""
+    @require_safe
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        try:
+            return vista(request, *args, **kwargs)
+        except ErrorApi as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+        except Http404 as e:
+            return JsonResponse({'error': str(e) or 'No encontrado.'}, status=404)
+    return envoltura
+
+
+def _listado(request, queryset, orden, campos, disponibles, limite):
+    filas, posiciones = _columnas(queryset, campos, disponibles, extra=[c.lstrip('-') for c in orden])
+    indices = [posiciones[c.lstrip('-')] for c in orden]
+    pagina = paginar(filas, orden, request.GET.get('cursor'), limite,
+                     valores=lambda fila: [fila[i] for i in indices])
+    return _json({'resultados': _filas(campos, pagina.objetos), 'siguiente': pagina.siguiente_cursor})
+
+
+# --- LIBROS ---
+
+def _version_libros(campos):
+    if CAMPOS_SIN_VERSION.intersection(campos):
+        return None
+    version, _ = fragmentos.version_catalogo()
+    return version
+
+
+@_vista_api
+def libros(request):
+    """
+    Listado paginado del catálogo o, con ``ids``/``isbn``, búsqueda masiva en
+    una sola consulta (sin paginar; añade ``no_encontrados``).
+    """
+    campos = _campos(request, CAMPOS_LIBRO, CAMPOS_LIBRO_DEFECTO)
+    ids, isbns = _lista(request, 'ids'), _lista(request, 'isbn')
+    if ids or isbns:
+        return _lote(request, campos, ids, isbns)
+
+    limite = _limite(request)
+
+    def generar():
+        qs = busqueda.filtrar_catalogo(Libro.objects.all(), request.GET)
+        # Mismo orden que el catálogo HTML
+        orden = ('rank', 'id') if busqueda.terminos(request.GET.get('q')) else ('titulo', 'id')
+        return _listado(request, qs, orden, campos, CAMPOS_LIBRO, limite)
+    return _responder(request, generar, _version_libros(campos))
+
+
+def _lote(request, campos, ids, isbns):
+    if len(ids) + len(isbns) > MAXIMO_LOTE:
+        raise ErrorApi(f'Como máximo {MAXIMO_LOTE} ids e ISBN por petición.')
+    try:
+        ids = [int(i) for i in ids]
+    except ValueError:
+        raise ErrorApi('ids debe ser una lista de números separados por comas.')
+
+    def generar():
+        filas, posiciones = _columnas(
+            Libro.objects.filter(Q(pk__in=ids) | Q(isbn__in=isbns)).order_by('id'),
+            campos, CAMPOS_LIBRO, extra=['id', 'isbn'],
+        )
+        filas = list(filas)
+        vistos_id = {fila[posiciones['id']] for fila in filas}
+        vistos_isbn = {fila[posiciones['isbn']] for fila in filas}
+        no_encontrados = [i for i in ids if i not in vistos_id] + [i for i in isbns if i not in vistos_isbn]
+        return _json({'resultados': _filas(campos, filas), 'no_encontrados': no_encontrados})
+    return _responder(request, generar, _version_libros(campos))
+
+
+@_vista_api
+def libro(request, pk):
+    campos = _campos(request, CAMPOS_LIBRO, CAMPOS_LIBRO_DEFECTO)
+
+    def generar():
+        filas, _ = _columnas(Libro.objects.filter(pk=pk), campos, CAMPOS_LIBRO)
+        fila = filas.first()
+        if fila is None:
+            raise Http404('Libro no encontrado.')
+        return _json(_filas(campos, [fila])[0])
+    return _responder(request, generar)
+
+
+# --- AUTORES Y CATEGORÍAS ---
+
+@_vista_api
+def autores(request):
+    campos, limite = _campos(request, CAMPOS_AUTOR, CAMPOS_AUTOR_DEFECTO), _limite(request)
+    return _responder(request, lambda: _listado(
+        request, Autor.objects.all(), ('apellido', 'nombre', 'id'), campos, CAMPOS_AUTOR, limite
+    ))
+
+
+@_vista_api
+def categorias(request):
+    campos, limite = _campos(request, CAMPOS_CATEGORIA, CAMPOS_CATEGORIA_DEFECTO), _limite(request)
+    return _responder(request, lambda: _listado(
+        request, Categoria.objects.all(), ('nombre', 'id'), campos, CAMPOS_CATEGORIA, limite
+    ))
+
+
+# --- AUTOCOMPLETADO ---
+
+@_vista_api
+def sugerencias(request):
+    tipo = request.GET.get('tipo', 'libro')
+    if tipo not in autocompletar.TIPOS:
+        raise ErrorApi(f'tipo debe ser uno de: {", ".join(autocompletar.TIPOS)}.')
+    try:
+        k = int(request.GET.get('k', autocompletar.K_POR_DEFECTO))
+    except ValueError:
+        raise ErrorApi('k debe ser un número.')
+    if not 1 <= k <= autocompletar.K_MAXIMO:
+        raise ErrorApi(f'k debe estar entre 1 y {autocompletar.K_MAXIMO}.')
+    resultados = autocompletar.sugerencias(tipo, request.GET.get('q', ''), k)
+    respuesta = HttpResponse(_json({'resultados': resultados}), content_type='application/json')
+    # Cada pulsación es una petición: el navegador repite las mismas durante un rato
+    patch_cache_control(respuesta, public=True, max_age=60)
+    return respuesta
@@ -0,0 +1,173 @@
+# core/autocompletar.py
+"""
+Sugerencias para los buscadores del catálogo (autocompletado).
+
+- Autores y categorías: cada proceso guarda una lista ordenada de nombres
+  normalizados (sin tildes ni mayúsculas; los autores también como
+  "apellido nombre") y busca el prefijo con ``bisect``, sin consultar la base.
+  La lista se reconstruye cuando cambia la versión compartida en la caché
+  (``invalidar()``, desde core/signals.py) o tras ``AUTOCOMPLETAR_SEGUNDOS``,
+  por si la caché no es compartida entre procesos.
+- Libros: si el texto parece un ISBN, rango sobre el índice único de ``isbn``;
+  si no, prefijo de palabras del título en el índice de texto completo (las
+  primeras ``CANDIDATOS_TITULO`` coincidencias, ordenadas en Python). Los
+  resultados quedan en un LRU por proceso cuya clave incluye la versión del
+  catálogo, así que nunca se sirve una sugerencia obsoleta.
+"""
+import bisect
+import threading
+import time
+import unicodedata
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from . import busqueda
+from .models import Autor, Categoria, Libro
+
+TIPOS = ('libro', 'autor', 'categoria')
+K_POR_DEFECTO = 8
+K_MAXIMO = 20
+# Letras mínimas antes de consultar títulos (un prefijo de una letra casa con medio catálogo)
+MINIMO_TITULO = 2
+# Coincidencias de título que se leen del índice y se ordenan aquí. Ordenar todas
+# por relevancia (bm25) cuesta cientos de ms con prefijos cortos como "el"
+CANDIDATOS_TITULO = 50
+
+CLAVE_VERSION = 'autocompletar:version'
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ' '.join(''.join(c for c in texto if not unicodedata.combining(c)).casefold().split())
+
+
+# --- Versión compartida ---
+
+def version():
+    actual = cache.get(CLAVE_VERSION)
+    if actual is None:
+        actual = uuid.uuid4().hex
+        cache.add(CLAVE_VERSION, actual, timeout=None)
+        actual = cache.get(CLAVE_VERSION, actual)
+    return actual
+
+
+def invalidar():
+    """Autores, categorías o libros cambiaron: todos los procesos reconstruyen."""
+    cache.set(CLAVE_VERSION, uuid.uuid4().hex, timeout=None)
+    # Otra vez al confirmar: una lectura concurrente pudo reconstruir con datos previos
+    transaction.on_commit(lambda: cache.set(CLAVE_VERSION, uuid.uuid4().hex, timeout=None))
+
+
+# --- Autores y categorías (en memoria) ---
+
+class IndicePrefijos:
+    """Claves normalizadas ordenadas; cada una apunta a ``(id, texto visible)``."""
+
+    def __init__(self, entradas):
+        entradas = sorted(entradas)
+        self.claves = [clave for clave, _, _ in entradas]
+        self.valores = [(pk, texto) for _, pk, texto in entradas]
+
+    def buscar(self, prefijo, k):
+        resultados, vistos = [], set()
+        i = bisect.bisect_left(self.claves, prefijo)
+        while i < len(self.claves) and len(resultados) < k and self.claves[i].startswith(prefijo):
+            pk, texto = self.valores[i]
+            if pk not in vistos:
+                vistos.add(pk)
+                resultados.append({'id': pk, 'texto': texto})
+            i += 1
+        return resultados
+
+    def __len__(self):
+        return len(self.claves)
+
+
+def _entradas_autores():
+    for pk, nombre, apellido in Autor.objects.values_list('pk', 'nombre', 'apellido').iterator():
+        texto = f'{nombre} {apellido}'.strip()
+        yield normalizar(texto), pk, texto
+        if apellido:
+            yield normalizar(f'{apellido} {nombre}'), pk, texto
+
+
+def _entradas_categorias():
+    for pk, nombre in Categoria.objects.values_list('pk', 'nombre'):
+        yield normalizar(nombre), pk, nombre
+
+
+CONSTRUCTORES = {'autor': _entradas_autores, 'categoria': _entradas_categorias}
+
+# tipo -> (versión, instante de construcción, índice)
+_indices = {}
+_bloqueo = threading.Lock()
+
+
+def indice(tipo):
+    actual = version()
+
+    def vigente(guardado):
+        return guardado and guardado[0] == actual and time.monotonic() - guardado[1] < settings.AUTOCOMPLETAR_SEGUNDOS
+
+    guardado = _indices.get(tipo)
+    if vigente(guardado):
+        return guardado[2]
+    with _bloqueo:
+        # Otro hilo pudo reconstruirlo mientras esperábamos
+        guardado = _indices.get(tipo)
+        if not vigente(guardado):
+            guardado = (actual, time.monotonic(), IndicePrefijos(CONSTRUCTORES[tipo]()))
+            _indices[tipo] = guardado
+    return guardado[2]
+
+
+# --- Libros (índices de la base de datos + LRU) ---
+
+def _parece_isbn(texto):
+    """El texto sin guiones si parece el comienzo de un ISBN (y no un título como "1984")."""
+    limpio = texto.replace('-', '').replace(' ', '').upper()
+    if limpio.rstrip('X').isdigit() and (limpio.startswith(('978', '979')) or len(limpio) >= 10):
+        return limpio
+    return None
+
+
+@lru_cache(maxsize=2048)
+def _libros(version_catalogo, texto, k):
+    isbn = _parece_isbn(texto)
+    if isbn:
+        # Rango [prefijo, prefijo siguiente): usa el índice único de isbn en cualquier motor
+        siguiente = isbn[:-1] + chr(ord(isbn[-1]) + 1)
+        filas = Libro.objects.filter(isbn__gte=isbn, isbn__lt=siguiente).order_by('isbn').values_list(
+            'pk', 'titulo', 'isbn'
+        )[:k]
+        return tuple((pk, f'{titulo} ({codigo})') for pk, titulo, codigo in filas)
+    filas = busqueda.buscar(Libro.objects.all(), texto, solo_titulo=True).order_by().values_list(
+        'pk', 'titulo'
+    )[:CANDIDATOS_TITULO]
+    # Primero los títulos que empiezan por el texto, luego los más cortos
+    filas = sorted(filas, key=lambda fila: (not normalizar(fila[1]).startswith(texto), len(fila[1]), fila[1]))
+    return tuple(filas[:k])
+
+
+def _version_libros():
+    # Max sobre un campo indexado: una lectura del índice. Las bajas llaman a invalidar()
+    return version(), Libro.objects.aggregate(ultimo=Max('actualizado_en'))['ultimo']
+
+
+def sugerencias(tipo, texto, k=K_POR_DEFECTO):
+    """Hasta ``k`` resultados ``{'id', 'texto'}`` que empiezan por ``texto``."""
+    if tipo == 'libro':
+        clave = _parece_isbn(texto) or ' '.join(busqueda.terminos(texto))
+        if len(clave) < MINIMO_TITULO:
+            return []
+        return [{'id': pk, 'texto': titulo} for pk, titulo in _libros(_version_libros(), clave, k)]
+    prefijo = normalizar(texto)
+    if not prefijo:
+        return []
+    return indice(tipo).buscar(prefijo, k)
@@ -0,0 +1,189 @@
+# core/busqueda.py
+"""
+Índice de búsqueda de texto completo del catálogo.
+
+- SQLite: tabla virtual FTS5 ``core_libro_fts`` (rowid = id del libro).
+- PostgreSQL: tabla ``core_libro_busqueda`` con un ``tsvector`` e índice GIN.
+
+Las crea la migración 0005. En cualquier otro motor se recurre a los filtros
+``icontains`` de siempre.
+El índice se mantiene sincronizado desde ``core/signals.py`` y se puede
+reconstruir con ``python manage.py reconstruir_indice_busqueda``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABLA_FTS = 'core_libro_fts'
+TABLA_PG = 'core_libro_busqueda'
+
+# Documento de cada libro (id, título, ISBN, resumen, autor, categoría)
+_SELECT_DOCUMENTOS = """
+    SELECT l.id, l.titulo, l.isbn, COALESCE(l.resumen, ''),
+           a.nombre || ' ' || a.apellido, COALESCE(c.nombre, '')
+    FROM core_libro l
+    INNER JOIN core_autor a ON a.id = l.autor_id
+    LEFT JOIN core_categoria c ON c.id = l.categoria_id
+"""
+
+_DOCUMENTO_PG = """
+    setweight(to_tsvector('simple', d.titulo), 'A') ||
+    setweight(to_tsvector('simple', d.isbn), 'A') ||
+    setweight(to_tsvector('simple', d.autor), 'B') ||
+    setweight(to_tsvector('simple', d.categoria), 'C') ||
+    setweight(to_tsvector('simple', d.resumen), 'D')
+"""
+
+# Límite prudente de parámetros por sentencia (SQLite admite 999 en builds antiguos)
+TAMANO_LOTE = 500
+
+
+def motor(conn=None):
+    """Devuelve 'sqlite', 'postgresql' o None si el motor no tiene índice."""
+    vendor = (conn or connection).vendor
+    return vendor if vendor in ('sqlite', 'postgresql') else None
+
+
+# --- Mantenimiento del índice ---
+
+def _reindexar(where, params=(), conn=None):
+    """Borra y vuelve a insertar los documentos de los libros que cumplen ``where``."""
+    conn = conn or connection
+    tipo = motor(conn)
+    if tipo is None:
+        return
+    subconsulta = f"SELECT l.id FROM core_libro l WHERE {where}"
+    with conn.cursor() as cursor:
+        if tipo == 'sqlite':
+            cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid IN ({subconsulta})", params)
+            cursor.execute(
+                f"INSERT INTO {TABLA_FTS}(rowid, titulo, isbn, resumen, autor, categoria) "
+                f"{_SELECT_DOCUMENTOS} WHERE {where}",
+                params,
+            )
+        else:
+            cursor.execute(f"DELETE FROM {TABLA_PG} WHERE libro_id IN ({subconsulta})", params)
+            cursor.execute(
+                f"INSERT INTO {TABLA_PG}(libro_id, documento) "
+                f"SELECT d.id, {_DOCUMENTO_PG} FROM ("
+                f"{_SELECT_DOCUMENTOS} WHERE {where}"
+                ") AS d(id, titulo, isbn, resumen, autor, categoria)",
+                params,
+            )
+
+
+def indexar_libros(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), TAMANO_LOTE):
+        lote = ids[i:i + TAMANO_LOTE]
+        marcadores = ', '.join(['%s'] * len(lote))
+        _reindexar(f"l.id IN ({marcadores})", lote)
+
+
+def indexar_por_autor(autor_id):
+    _reindexar("l.autor_id = %s", [autor_id])
+
+
+def indexar_por_categoria(categoria_id):
+    _reindexar("l.categoria_id = %s", [categoria_id])
+
+
+def desindexar_libro(libro_id):
+    tipo = motor()
+    if tipo is None:
+        return
+    with connection.cursor() as cursor:
+        if tipo == 'sqlite':
+            cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [libro_id])
+        else:
+            cursor.execute(f"DELETE FROM {TABLA_PG} WHERE libro_id = %s", [libro_id])
+
+
+def reconstruir(conn=None):
+    """Vacía el índice y lo regenera en bloque a partir de las tablas del catálogo."""
+    conn = conn or connection
+    tipo = motor(conn)
+    if tipo is None:
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS if tipo == 'sqlite' else TABLA_PG}")
+    _reindexar("1 = 1", conn=conn)
+    if tipo == 'sqlite':
+        with conn.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('optimize')")
+
+
+# --- Consultas ---
+
+def terminos(texto):
+    return re.findall(r'\w+', (texto or '').lower())
+
+
+def buscar(qs, texto, solo_titulo=False):
+    """
+    Filtra un queryset de ``Libro`` por ``texto`` usando el índice y lo ordena
+    por relevancia. Añade la anotación ``rank`` (menor = más relevante).
+    Con ``solo_titulo`` las palabras se buscan solo en el título (y el ISBN
+    en PostgreSQL, que comparte peso), como hace el autocompletado.
+    """
+    palabras = terminos(texto)
+    if not palabras:
+        return qs
+    tipo = motor()
+    tabla = qs.model._meta.db_table
+    if tipo == 'sqlite':
+        consulta = ' '.join(f'"{p}"*' for p in palabras)
+        if solo_titulo:
+            consulta = f'titulo : ({consulta})'
+        qs = qs.extra(
+            tables=[TABLA_FTS],
+            where=[f'{TABLA_FTS}.rowid = {tabla}.id', f'{TABLA_FTS} MATCH %s'],
+            params=[consulta],
+        ).annotate(rank=RawSQL(f'{TABLA_FTS}.rank', ()))
+    elif tipo == 'postgresql':
+        consulta = ' & '.join(f'{p}:*A' if solo_titulo else f'{p}:*' for p in palabras)
+        qs = qs.extra(
+            tables=[TABLA_PG],
+            where=[
+                f'{TABLA_PG}.libro_id = {tabla}.id',
+                f"{TABLA_PG}.documento @@ to_tsquery('simple', %s)",
+            ],
+            params=[consulta],
+        ).annotate(rank=RawSQL(
+            f"-ts_rank({TABLA_PG}.documento, to_tsquery('simple', %s))", (consulta,)
+        ))
+    else:
+        for p in palabras:
+            if solo_titulo:
+                qs = qs.filter(titulo__icontains=p)
+                continue
+            qs = qs.filter(
+                Q(titulo__icontains=p) | Q(isbn__icontains=p) | Q(resumen__icontains=p) |
+                Q(autor__nombre__icontains=p) | Q(autor__apellido__icontains=p) |
+                Q(categoria__nombre__icontains=p)
+            )
+        return qs.order_by('titulo', 'id')
+    return qs.order_by('rank', 'id')
+
+
+def filtrar_catalogo(qs, params):
+    """
+    Aplica los filtros del catálogo (``q``, ``estado``, ``categoria``, ``autor``)
+    tal como llegan en ``request.GET``. Compartido por el listado y los reportes.
+    """
+    estado = params.get('estado')
+    categoria_id = params.get('categoria')
+    autor_id = params.get('autor')
+    q = params.get('q')
+    if estado:
+        qs = qs.filter(estado=estado)
+    if categoria_id:
+        qs = qs.filter(categoria_id=categoria_id)
+    if autor_id:
+        qs = qs.filter(autor_id=autor_id)
+    if terminos(q):
+        # Índice de texto completo, ordenado por relevancia
+        return buscar(qs, q)
+    return qs.order_by('titulo')
@@ -0,0 +1,203 @@
+# core/correo.py
+"""
+Envío de correos en lote.
+
+``enviar_en_lotes`` reparte los mensajes en lotes y cada lote viaja por una
+única conexión SMTP (``get_connection()``), en lugar de abrir una por
+correo como hace ``send_mail``. Con ``hilos > 1`` se envían varios lotes a
+la vez, cada uno por su propia conexión.
+
+Las vistas no envían correos: los dejan en la bandeja de salida
+(``CorreoPendiente``) con ``encolar()``, dentro de la misma transacción que el
+préstamo o la devolución, y el comando ``procesar_outbox`` los envía.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CorreoPendiente
+
+REMITENTE = 'noreply@biblioteca.com'
+
+
+class LimitadorTasa:
+    """Reparte los envíos para no superar ``por_segundo`` mensajes por segundo entre todos los hilos."""
+    def __init__(self, por_segundo=None):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self.siguiente = time.monotonic()
+        self.lock = threading.Lock()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self.lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self.siguiente)
+            self.siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+class ResultadoEnvio:
+    def __init__(self):
+        self.enviados = 0
+        self.errores = []  # (destinatario, mensaje de error)
+        self.lotes = 0
+        self.segundos = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def por_segundo(self):
+        return self.enviados / self.segundos if self.segundos else 0.0
+
+
+def mensaje(asunto, cuerpo, destinatario):
+    return EmailMessage(subject=asunto, body=cuerpo, from_email=REMITENTE, to=[destinatario])
+
+
+def _lotes(mensajes, tamano):
+    mensajes = iter(mensajes)
+    while lote := list(islice(mensajes, tamano)):
+        yield lote
+
+
+def enviar_por_conexion(correos, limitador=None):
+    """
+    Envía ``correos`` por una sola conexión y devuelve ``[(correo, error)]``
+    con ``error = None`` si salió bien. Tras un fallo se abre otra conexión
+    para el resto, por si la anterior quedó rota.
+    """
+    resultados = []
+    conexion = get_connection()
+    try:
+        conexion.open()
+        for correo in correos:
+            if limitador:
+                limitador.esperar()
+            try:
+                conexion.send_messages([correo])
+                resultados.append((correo, None))
+            except Exception as e:
+                resultados.append((correo, str(e)))
+                conexion.close()
+                conexion = get_connection()
+                conexion.open()
+    except Exception as e:
+        # No se pudo (re)abrir la conexión: el resto queda sin enviar
+        resultados.extend((correo, str(e)) for correo in correos[len(resultados):])
+    finally:
+        conexion.close()
+    return resultados
+
+
+def _enviar_lote(lote, limitador, resultado):
+    resultados = enviar_por_conexion(lote, limitador)
+    with resultado.lock:
+        for correo, error in resultados:
+            if error is None:
+                resultado.enviados += 1
+            else:
+                resultado.errores.append((', '.join(correo.to), error))
+        resultado.lotes += 1
+
+
+def enviar_en_lotes(mensajes, tamano_lote=100, hilos=1, por_segundo=None):
+    """
+    Envía ``mensajes`` (iterable de ``EmailMessage``) y devuelve un ``ResultadoEnvio``.
+    Un error en un correo no detiene el resto.
+    """
+    resultado = ResultadoEnvio()
+    limitador = LimitadorTasa(por_segundo)
+    inicio = time.perf_counter()
+    if hilos <= 1:
+        for lote in _lotes(mensajes, tamano_lote):
+            _enviar_lote(lote, limitador, resultado)
+    else:
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            # list() para que las excepciones inesperadas no pasen desapercibidas
+            list(ejecutor.map(lambda lote: _enviar_lote(lote, limitador, resultado), _lotes(mensajes, tamano_lote)))
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+# --- Bandeja de salida ---
+
+# Segundos de espera antes del reintento n: 60, 120, 240... hasta una hora
+ESPERA_BASE = 60
+ESPERA_MAXIMA = 3600
+MAX_INTENTOS = 5
+# Tiempo que un lote queda reservado; si el procesador muere, vuelve a la cola
+DURACION_RECLAMO = timedelta(minutes=10)
+
+
+def encolar(asunto, cuerpo, destinatario):
+    """Deja un correo pendiente. Llamar dentro de la transacción que lo origina."""
+    if destinatario:
+        return CorreoPendiente.objects.create(asunto=asunto, cuerpo=cuerpo, destinatario=destinatario)
+
+
+def encolar_varios(correos):
+    """Como ``encolar`` para una lista de ``(asunto, cuerpo, destinatario)``, en un solo INSERT."""
+    return CorreoPendiente.objects.bulk_create([
+        CorreoPendiente(asunto=asunto, cuerpo=cuerpo, destinatario=destinatario)
+        for asunto, cuerpo, destinatario in correos if destinatario
+    ])
+
+
+def espera_reintento(intentos):
+    return timedelta(seconds=min(ESPERA_BASE * 2 ** (intentos - 1), ESPERA_MAXIMA))
+
+
+def reclamar_lote(tamano):
+    """Reserva hasta ``tamano`` correos listos para enviar; seguro con varios procesos."""
+    ahora = timezone.now()
+    listos = CorreoPendiente.objects.filter(estado=CorreoPendiente.ESTADO_PENDIENTE, proximo_intento__lte=ahora)
+    ids = list(listos.order_by('proximo_intento').values_list('pk', flat=True)[:tamano])
+    if not ids:
+        return []
+    reclamo = uuid.uuid4()
+    # Condicional: si otro proceso reclamó alguno entre medias, ya no cumple proximo_intento <= ahora
+    listos.filter(pk__in=ids).update(reclamo=reclamo, proximo_intento=ahora + DURACION_RECLAMO)
+    return list(CorreoPendiente.objects.filter(reclamo=reclamo))
+
+
+def procesar_outbox(tamano_lote=100, max_intentos=MAX_INTENTOS):
+    """
+    Envía un lote de la bandeja de salida por una conexión. Los fallos se
+    reintentan con espera creciente y tras ``max_intentos`` quedan como
+    'fallido'. Devuelve ``(enviados, fallidos)``.
+    """
+    pendientes = reclamar_lote(tamano_lote)
+    if not pendientes:
+        return 0, 0
+    resultados = enviar_por_conexion([mensaje(p.asunto, p.cuerpo, p.destinatario) for p in pendientes])
+    ahora = timezone.now()
+    enviados = [p.pk for p, (_, error) in zip(pendientes, resultados) if error is None]
+    CorreoPendiente.objects.filter(pk__in=enviados).update(
+        estado=CorreoPendiente.ESTADO_ENVIADO, enviado=ahora, reclamo=None, intentos=F('intentos') + 1,
+    )
+    for pendiente, (_, error) in zip(pendientes, resultados):
+        if error is None:
+            continue
+        intentos = pendiente.intentos + 1
+        CorreoPendiente.objects.filter(pk=pendiente.pk).update(
+            intentos=intentos,
+            ultimo_error=error,
+            reclamo=None,
+            proximo_intento=ahora + espera_reintento(intentos),
+            # Sin más reintentos queda apartado para revisión en el admin
+            estado=CorreoPendiente.ESTADO_FALLIDO if intentos >= max_intentos else CorreoPendiente.ESTADO_PENDIENTE,
+        )
+    return len(enviados), len(pendientes) - len(enviados)
+
+
+def purgar_enviados(dias):
+    limite = timezone.now() - timedelta(days=dias)
+    return CorreoPendiente.objects.filter(estado=CorreoPendiente.ESTADO_ENVIADO, enviado__lt=limite).delete()[0]
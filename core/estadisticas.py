@@ -0,0 +1,172 @@
+# core/estadisticas.py
+"""
+Estadísticas del dashboard del bibliotecario.
+
+Los préstamos por mes, por libro y por autor se guardan ya contados en
+``EstadisticaMensual``, ``EstadisticaLibro`` y ``EstadisticaAutor``. Los
+contadores se actualizan con ``F()`` al crear o borrar un préstamo (ver
+``core/signals.py``), así el dashboard lee unas pocas filas en lugar de
+agrupar toda la tabla de préstamos. Las sumas de un préstamo nuevo se aplican
+al confirmar su transacción: la fila del mes es la misma para todos los
+préstamos y bloquearla dentro de ``prestar()`` los pondría en fila uno tras
+otro; además, un préstamo deshecho no llega a contarse. El resumen completo se guarda además en
+la caché de Django y se invalida cuando cambian los datos.
+
+``reconstruir()`` (comando ``reconstruir_estadisticas``) recalcula los
+contadores desde cero.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import (
+    EstadisticaAutor, EstadisticaLibro, EstadisticaMensual, Libro, Prestamo, Usuario,
+)
+
+CLAVE_CACHE = 'dashboard:resumen'
+TOP = 5
+
+
+def _mes(fecha):
+    # Mismo criterio que TruncMonth: el mes en la zona horaria actual
+    return timezone.localtime(fecha).date().replace(day=1)
+
+
+def _sumar(modelo, filtro, delta):
+    """Suma ``delta`` al contador que cumple ``filtro``, creándolo si hace falta."""
+    if delta < 0:
+        modelo.objects.filter(prestamos__gt=0, **filtro).update(prestamos=F('prestamos') + delta)
+        return
+    if modelo.objects.filter(**filtro).update(prestamos=F('prestamos') + delta):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(prestamos=delta, **filtro)
+    except IntegrityError:
+        # Otra petición creó la fila entre medias
+        modelo.objects.filter(**filtro).update(prestamos=F('prestamos') + delta)
+
+
+def _al_confirmar(sumar):
+    """Ejecuta ``sumar`` en su propia transacción corta, después del COMMIT del préstamo."""
+    def aplicar():
+        with transaction.atomic():
+            sumar()
+            invalidar()
+    # Un fallo aquí no deshace el préstamo ya confirmado; reconstruir() lo corrige
+    transaction.on_commit(aplicar, robust=True)
+
+
+def registrar_prestamo(prestamo):
+    mes, libro_id, autor_id = _mes(prestamo.fecha_prestamo), prestamo.libro_id, prestamo.libro.autor_id
+
+    def sumar():
+        _sumar(EstadisticaMensual, {'mes': mes}, 1)
+        _sumar(EstadisticaLibro, {'libro_id': libro_id}, 1)
+        _sumar(EstadisticaAutor, {'autor_id': autor_id}, 1)
+
+    _al_confirmar(sumar)
+
+
+def registrar_varios(fecha_prestamo, libros):
+    """
+    Para préstamos creados con bulk_create: ``libros`` = [(libro_id, autor_id)],
+    cada libro una sola vez.
+    """
+    if not libros:
+        return
+    mes = _mes(fecha_prestamo)
+
+    def sumar():
+        _sumar(EstadisticaMensual, {'mes': mes}, len(libros))
+        # Un solo UPDATE para los que ya tienen contador y un INSERT para el resto
+        ids = {libro_id for libro_id, _ in libros}
+        existentes = set(EstadisticaLibro.objects.filter(libro_id__in=ids).values_list('libro_id', flat=True))
+        EstadisticaLibro.objects.filter(libro_id__in=existentes).update(prestamos=F('prestamos') + 1)
+        nuevos = ids - existentes
+        try:
+            with transaction.atomic():
+                EstadisticaLibro.objects.bulk_create([EstadisticaLibro(libro_id=i, prestamos=1) for i in nuevos])
+        except IntegrityError:
+            # Otro préstamo, ya confirmado, creó alguno entre medias
+            for libro_id in nuevos:
+                _sumar(EstadisticaLibro, {'libro_id': libro_id}, 1)
+        for autor_id, total in Counter(autor_id for _, autor_id in libros).items():
+            _sumar(EstadisticaAutor, {'autor_id': autor_id}, total)
+
+    _al_confirmar(sumar)
+
+
+def descontar_prestamo(prestamo):
+    _sumar(EstadisticaMensual, {'mes': _mes(prestamo.fecha_prestamo)}, -1)
+    _sumar(EstadisticaLibro, {'libro_id': prestamo.libro_id}, -1)
+    # Sin leer el libro: puede estar borrándose en cascada
+    _sumar(EstadisticaAutor, {'autor__libros': prestamo.libro_id}, -1)
+
+
+def reconstruir():
+    """Recalcula todos los contadores a partir de la tabla de préstamos."""
+    prestamos = Prestamo.objects.order_by()
+    with transaction.atomic():
+        for modelo in (EstadisticaMensual, EstadisticaLibro, EstadisticaAutor):
+            modelo.objects.all().delete()
+        EstadisticaMensual.objects.bulk_create(
+            EstadisticaMensual(mes=f['mes'], prestamos=f['total'])
+            for f in prestamos.annotate(mes=TruncMonth('fecha_prestamo', output_field=DateField()))
+            .values('mes').annotate(total=Count('id'))
+        )
+        EstadisticaLibro.objects.bulk_create(
+            (EstadisticaLibro(libro_id=f['libro_id'], prestamos=f['total'])
+             for f in prestamos.values('libro_id').annotate(total=Count('id'))),
+            batch_size=1000,
+        )
+        EstadisticaAutor.objects.bulk_create(
+            (EstadisticaAutor(autor_id=f['libro__autor_id'], prestamos=f['total'])
+             for f in prestamos.values('libro__autor_id').annotate(total=Count('id'))),
+            batch_size=1000,
+        )
+    invalidar()
+
+
+# --- Caché del resumen ---
+
+def invalidar():
+    cache.delete(CLAVE_CACHE)
+    # Otra vez al confirmar: una lectura concurrente pudo cachear datos previos
+    transaction.on_commit(lambda: cache.delete(CLAVE_CACHE))
+
+
+def _calcular():
+    return {
+        'total_libros': Libro.objects.count(),
+        'total_lectores': Usuario.objects.filter(rol=Usuario.ROL_LECTOR).count(),
+        'total_prestamos_activos': Prestamo.objects.activos().count(),
+        'meses': [
+            (mes.strftime('%b %Y'), total)
+            for mes, total in EstadisticaMensual.objects.filter(prestamos__gt=0).order_by('mes')
+            .values_list('mes', 'prestamos')
+        ],
+        'top_libros': list(
+            EstadisticaLibro.objects.filter(prestamos__gt=0).order_by('-prestamos')
+            .values_list('libro__titulo', 'prestamos')[:TOP]
+        ),
+        'top_autores': [
+            (f'{nombre} {apellido}', total)
+            for nombre, apellido, total in EstadisticaAutor.objects.filter(prestamos__gt=0)
+            .order_by('-prestamos').values_list('autor__nombre', 'autor__apellido', 'prestamos')[:TOP]
+        ],
+    }
+
+
+def resumen():
+    """KPIs y series del dashboard, desde la caché si están disponibles."""
+    datos = cache.get(CLAVE_CACHE)
+    if datos is None:
+        datos = _calcular()
+        cache.set(CLAVE_CACHE, datos, getattr(settings, 'ESTADISTICAS_CACHE_SEGUNDOS', 300))
+    return datos
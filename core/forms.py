@@ -4,6 +4,7 @@ from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import get_user_model
 from .models import Usuario, Libro
 from django.forms import ClearableFileInput
+from django.core.validators import FileExtensionValidator
 
 # Crispy Forms
 from crispy_forms.helper import FormHelper
@@ -112,4 +113,14 @@ class LibroForm(forms.ModelForm):
             'portada': ClearableFileInput(attrs={'class': 'form-control'}),
             'portada_url': forms.URLInput(attrs={'class': 'form-control'}),
             'estado': forms.Select(attrs={'class': 'form-select'}),
-        }
\ No newline at end of file
+        }
+
+class ImportarLibrosForm(forms.Form):
+    """
+    Archivo CSV o XLSX con el catálogo a importar (core/importacion.py).
+    """
+    archivo = forms.FileField(
+        label='Archivo CSV o XLSX',
+        validators=[FileExtensionValidator(['csv', 'txt', 'xlsx'])],
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.txt,.xlsx'}),
+    )
@@ -0,0 +1,92 @@
+# core/fragmentos.py
+"""
+Versiones de las páginas del catálogo para la caché de fragmentos y las
+peticiones condicionales.
+
+Cada libro lleva ``actualizado_en`` (``auto_now``), que también se fija a mano
+en los ``update()`` masivos y se "toca" cuando cambia su autor o su categoría.
+Con esa marca:
+
+- las plantillas cachean la tarjeta y la ficha de cada libro con
+  ``{% cache %}`` usando ``(pk, actualizado_en)`` como clave, así que un cambio
+  en el libro deja la entrada vieja sin usar y no hace falta invalidar nada;
+- las vistas calculan un ``ETag`` con la versión de los datos más el estado del
+  usuario que la plantilla muestra (rol, sanción, límite...) y responden
+  ``304 Not Modified`` si el navegador ya tiene esa versión.
+
+Lo que depende del usuario queda siempre fuera de los fragmentos cacheados.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Libro
+
+# Súbela al cambiar las plantillas del catálogo: deja obsoletos los fragmentos
+# cacheados y el HTML que ya tienen los navegadores
+VERSION_PLANTILLAS = '3'
+
+
+def tocar_libros(libros):
+    """Marca como modificados los libros de ``libros`` (un queryset). Devuelve cuántos."""
+    return libros.update(actualizado_en=timezone.now())
+
+
+def version_libro(libro):
+    return (libro.pk, libro.actualizado_en.timestamp())
+
+
+def version_catalogo():
+    """Último cambio y número de libros: detecta altas, cambios y bajas en una consulta."""
+    datos = Libro.objects.aggregate(ultimo=Max('actualizado_en'), total=Count('pk'))
+    ultimo = datos['ultimo']
+    return (ultimo.timestamp() if ultimo else 0, datos['total']), ultimo
+
+
+def _estado_usuario(request):
+    usuario = request.user
+    if not usuario.is_authenticated:
+        return ('anonimo',)
+    return (
+        usuario.pk, usuario.username, usuario.rol, usuario.tiene_sancion(), usuario.alcanzo_limite(),
+        usuario.prestamos_activos,
+    )
+
+
+def calcular_etag(request, version):
+    partes = (
+        VERSION_PLANTILLAS, version, _estado_usuario(request),
+        # El token CSRF de los formularios cambia si cambia la cookie
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        request.get_full_path(),
+    )
+    return quote_etag(hashlib.sha1(repr(partes).encode()).hexdigest())
+
+
+def responder_condicional(request, version, ultimo_cambio, generar):
+    """
+    Devuelve ``304`` si el ``ETag`` (o, para anónimos, la fecha) coincide con
+    lo que envía el navegador; si no, la respuesta de ``generar()`` con esas
+    cabeceras. Con mensajes pendientes se genera siempre la página completa.
+    """
+    if len(messages.get_messages(request)):
+        return generar()
+    etag = calcular_etag(request, version)
+    # La fecha solo sirve sola cuando la página no depende del usuario
+    # (en segundos enteros, como la cabecera)
+    fecha = int(ultimo_cambio.timestamp()) if ultimo_cambio and not request.user.is_authenticated else None
+    respuesta = get_conditional_response(request, etag=etag, last_modified=fecha)
+    if respuesta is None:
+        respuesta = generar()
+    if respuesta.status_code in (200, 304):
+        respuesta.headers.setdefault('ETag', etag)
+        if fecha:
+            respuesta.headers.setdefault('Last-Modified', http_date(fecha))
+        # El navegador guarda la página pero la revalida en cada visita
+        patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
@@ -0,0 +1,318 @@
+# core/importacion.py
+"""
+Importación masiva del catálogo desde CSV o XLSX.
+
+El archivo se lee fila a fila (``csv.reader`` u openpyxl en modo de solo
+lectura), así la memoria no depende de su tamaño. Autores y categorías se
+resuelven con diccionarios cargados una sola vez (los nuevos se crean por
+lotes) y los libros se insertan o actualizan por ISBN con
+``bulk_create(update_conflicts=True)``: un ``INSERT ... ON CONFLICT`` por lote.
+El estado, la portada subida y los préstamos de un libro existente no se tocan.
+
+Las filas inválidas (ISBN incorrecto o repetido, campos obligatorios vacíos...)
+no detienen la importación: se informan a ``rechazados(fila, motivo, valores)``.
+
+Columnas (la cabecera no distingue mayúsculas ni tildes, y acepta el CSV que
+exporta el propio catálogo): Titulo, Autor, ISBN y, opcionales, Categoria,
+Resumen y PortadaURL. El autor va como "Nombre Apellido" o "Apellido, Nombre".
+"""
+import csv
+import io
+import unicodedata
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+from django.utils import timezone
+
+from . import autocompletar, busqueda, estadisticas
+from .models import Autor, Categoria, Libro
+
+TAMANO_LOTE = 2000
+
+# cabecera normalizada -> campo
+COLUMNAS = {
+    'titulo': 'titulo',
+    'autor': 'autor',
+    'categoria': 'categoria',
+    'isbn': 'isbn',
+    'resumen': 'resumen',
+    'portadaurl': 'portada_url',
+    'portada_url': 'portada_url',
+}
+OBLIGATORIAS = ('titulo', 'autor', 'isbn')
+CABECERA_RECHAZADOS = ['Fila', 'Motivo', 'Titulo', 'Autor', 'Categoria', 'ISBN']
+
+# Campos que se sobrescriben cuando el ISBN ya existe
+CAMPOS_ACTUALIZABLES = ['titulo', 'autor', 'categoria', 'resumen', 'portada_url', 'actualizado_en']
+
+_validar_url = URLValidator()
+
+
+class ErrorImportacion(Exception):
+    """El archivo entero no se puede importar (formato o cabecera)."""
+
+
+def formato_de(nombre):
+    extension = nombre.rsplit('.', 1)[-1].lower()
+    if extension in ('csv', 'txt'):
+        return 'csv'
+    if extension == 'xlsx':
+        return 'xlsx'
+    raise ErrorImportacion('Formato no admitido: usa CSV o XLSX.')
+
+
+def _clave(texto):
+    """Nombre normalizado para las búsquedas en memoria."""
+    return ' '.join(texto.split()).casefold()
+
+
+def _sin_tildes(texto):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+# --- ISBN ---
+
+def _digito_isbn13(doce):
+    suma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(doce))
+    return str((10 - suma % 10) % 10)
+
+
+def normalizar_isbn(valor):
+    """
+    Devuelve el ISBN-13 (sin guiones ni espacios) si ``valor`` es un ISBN-10 o
+    ISBN-13 válido, o ``None``. Los ISBN-10 se convierten con el prefijo 978.
+    """
+    isbn = ''.join(c for c in str(valor) if c not in '- ').upper()
+    if len(isbn) == 13 and isbn.isdigit():
+        return isbn if _digito_isbn13(isbn[:12]) == isbn[12] else None
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == 'X'):
+        suma = sum(int(d) * (10 - i) for i, d in enumerate(isbn[:9])) + (10 if isbn[9] == 'X' else int(isbn[9]))
+        if suma % 11:
+            return None
+        doce = '978' + isbn[:9]
+        return doce + _digito_isbn13(doce)
+    return None
+
+
+# --- Lectura del archivo ---
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        # Excel guarda los ISBN escritos como número
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    try:
+        yield from csv.reader(texto, dialecto)
+    finally:
+        texto.detach()
+
+
+def _filas_xlsx(archivo):
+    from openpyxl import load_workbook
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, formato):
+    """Genera ``(número de fila, {campo: texto})`` a partir de un archivo binario."""
+    filas = _filas_csv(archivo) if formato == 'csv' else _filas_xlsx(archivo)
+    cabecera = next(filas, None)
+    if cabecera is None:
+        raise ErrorImportacion('El archivo está vacío.')
+    indices = {}
+    for i, nombre in enumerate(cabecera):
+        campo = COLUMNAS.get(_sin_tildes(_texto(nombre)).lower().replace(' ', ''))
+        if campo and campo not in indices:
+            indices[campo] = i
+    faltan = [c for c in OBLIGATORIAS if c not in indices]
+    if faltan:
+        raise ErrorImportacion(f'Faltan columnas obligatorias: {", ".join(faltan)}.')
+    for numero, fila in enumerate(filas, start=2):
+        if not any(fila):
+            continue
+        yield numero, {campo: _texto(fila[i]) if i < len(fila) else '' for campo, i in indices.items()}
+
+
+# --- Importación ---
+
+def _partir_autor(texto):
+    if ',' in texto:
+        apellido, nombre = (p.strip() for p in texto.split(',', 1))
+    else:
+        nombre, _, apellido = texto.partition(' ')
+    return nombre.strip(), apellido.strip()
+
+
+def _clave_autor(texto):
+    return _clave(' '.join(_partir_autor(texto)))
+
+
+class Importador:
+    """Acumula filas válidas y las guarda por lotes."""
+
+    def __init__(self, rechazados=None, lote=TAMANO_LOTE):
+        self.rechazados = rechazados or (lambda fila, motivo, valores: None)
+        self.lote = lote
+        self.autores = {
+            _clave(f'{nombre} {apellido}'): pk
+            for pk, nombre, apellido in Autor.objects.values_list('pk', 'nombre', 'apellido').iterator()
+        }
+        self.categorias = {_clave(nombre): pk for pk, nombre in Categoria.objects.values_list('pk', 'nombre')}
+        self.isbns = set()
+        self.pendientes = []
+        self.totales = {'creados': 0, 'actualizados': 0, 'rechazados': 0}
+
+    def rechazar(self, numero, motivo, valores):
+        self.totales['rechazados'] += 1
+        self.rechazados(numero, motivo, valores)
+
+    def validar(self, valores):
+        """Devuelve el motivo del rechazo o ``None``; deja el ISBN normalizado en ``valores``."""
+        for campo in OBLIGATORIAS:
+            if not valores.get(campo):
+                return f'Falta {campo}.'
+        isbn = normalizar_isbn(valores['isbn'])
+        if isbn is None:
+            return 'ISBN inválido.'
+        if isbn in self.isbns:
+            return 'ISBN repetido en el archivo.'
+        if len(valores['titulo']) > Libro._meta.get_field('titulo').max_length:
+            return 'Título demasiado largo.'
+        nombre, apellido = _partir_autor(valores['autor'])
+        if not nombre or len(nombre) > 100 or len(apellido) > 100:
+            return 'Autor inválido.'
+        if len(valores.get('categoria', '')) > 100:
+            return 'Categoría demasiado larga.'
+        if valores.get('portada_url'):
+            try:
+                _validar_url(valores['portada_url'])
+            except ValidationError:
+                return 'URL de portada inválida.'
+        valores['isbn'] = isbn
+        return None
+
+    def agregar(self, numero, valores):
+        motivo = self.validar(valores)
+        if motivo:
+            self.rechazar(numero, motivo, valores)
+            return
+        self.isbns.add(valores['isbn'])
+        self.pendientes.append(valores)
+        if len(self.pendientes) >= self.lote:
+            self.guardar()
+
+    def _resolver(self, nombres, conocidos, clave_de, crear):
+        """Crea en bloque los que aún no están en ``conocidos`` (clave -> pk)."""
+        nuevos = {}
+        for nombre in nombres:
+            clave = clave_de(nombre)
+            if clave and clave not in conocidos and clave not in nuevos:
+                nuevos[clave] = nombre
+        if nuevos:
+            for clave, objeto in zip(nuevos, crear(list(nuevos.values()))):
+                conocidos[clave] = objeto.pk
+
+    def _crear_autores(self, nombres):
+        return Autor.objects.bulk_create(Autor(nombre=n, apellido=a) for n, a in map(_partir_autor, nombres))
+
+    def _crear_categorias(self, nombres):
+        # Por si otra importación la creó a la vez (nombre es único)
+        return Categoria.objects.bulk_create(
+            [Categoria(nombre=' '.join(n.split())) for n in nombres],
+            update_conflicts=True, unique_fields=['nombre'], update_fields=['nombre'],
+        )
+
+    def guardar(self):
+        if not self.pendientes:
+            return
+        filas, self.pendientes = self.pendientes, []
+        with transaction.atomic():
+            self._resolver((v['autor'] for v in filas), self.autores, _clave_autor, self._crear_autores)
+            self._resolver((v.get('categoria', '') for v in filas), self.categorias, _clave, self._crear_categorias)
+            existentes = set(Libro.objects.filter(isbn__in=[v['isbn'] for v in filas]).values_list('isbn', flat=True))
+            ahora = timezone.now()
+            libros = Libro.objects.bulk_create(
+                [
+                    Libro(
+                        titulo=v['titulo'], isbn=v['isbn'],
+                        autor_id=self.autores[_clave_autor(v['autor'])],
+                        categoria_id=self.categorias.get(_clave(v.get('categoria', ''))),
+                        resumen=v.get('resumen') or None, portada_url=v.get('portada_url') or None,
+                        actualizado_en=ahora,
+                    )
+                    for v in filas
+                ],
+                update_conflicts=True, unique_fields=['isbn'], update_fields=CAMPOS_ACTUALIZABLES,
+            )
+            # bulk_create no emite post_save: índice de búsqueda a mano
+            busqueda.indexar_libros(libro.pk for libro in libros)
+        self.totales['actualizados'] += len(existentes)
+        self.totales['creados'] += len(filas) - len(existentes)
+
+    def terminar(self):
+        self.guardar()
+        estadisticas.invalidar()
+        autocompletar.invalidar()
+        return self.totales
+
+
+def importar(archivo, formato, rechazados=None, lote=TAMANO_LOTE):
+    """
+    Importa el archivo binario ``archivo`` (``'csv'`` o ``'xlsx'``) y devuelve
+    ``{'creados', 'actualizados', 'rechazados'}``.
+    """
+    importador = Importador(rechazados, lote)
+    for numero, valores in leer_filas(archivo, formato):
+        importador.agregar(numero, valores)
+    return importador.terminar()
+
+
+def fila_rechazada(numero, motivo, valores):
+    """Fila del reporte de rechazados (``CABECERA_RECHAZADOS``)."""
+    return [numero, motivo] + [valores.get(c, '') for c in ('titulo', 'autor', 'categoria', 'isbn')]
+
+
+def resumen_texto(totales):
+    return (
+        f'{totales["creados"]} creado(s), {totales["actualizados"]} actualizado(s), '
+        f'{totales["rechazados"]} rechazado(s)'
+    )
+
+
+def ejecutar_trabajo(salida, parametros):
+    """
+    Trabajo ``importar_libros`` de la cola (core/trabajos.py): importa el
+    archivo subido, escribe las filas rechazadas en ``salida`` (CSV) y lo borra.
+    """
+    from django.core.files.storage import default_storage
+    texto = io.TextIOWrapper(salida, encoding='utf-8', newline='')
+    escritor = csv.writer(texto)
+    escritor.writerow(CABECERA_RECHAZADOS)
+
+    def rechazados(numero, motivo, valores):
+        escritor.writerow(fila_rechazada(numero, motivo, valores))
+
+    try:
+        with default_storage.open(parametros['archivo'], 'rb') as archivo:
+            totales = importar(archivo, formato_de(parametros['archivo']), rechazados)
+    finally:
+        texto.flush()
+        texto.detach()
+        default_storage.delete(parametros['archivo'])
+    return resumen_texto(totales)
@@ -0,0 +1,33 @@
+# core/management/commands/barrer_reservas.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from core import reservas
+
+
+class Command(BaseCommand):
+    """
+    Vence los libros apartados por reserva que no se retiraron a tiempo (un
+    solo ``UPDATE``) y los aparta para la siguiente reserva de cada cola,
+    avisándole por correo. Programarlo periódicamente (cron) o dejarlo en
+    marcha con ``--cada``.
+    """
+    help = 'Vence los apartados de reservas sin retirar y promueve la siguiente reserva.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=float, default=0,
+                            help='Repetir cada N segundos (0 = una sola pasada).')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                expiradas, promovidas = reservas.barrer()
+                self.stdout.write(self.style.SUCCESS(
+                    f'{expiradas} reserva(s) expiradas, {promovidas} promovida(s).'
+                ))
+                if not options['cada']:
+                    break
+                time.sleep(options['cada'])
+        except KeyboardInterrupt:
+            pass
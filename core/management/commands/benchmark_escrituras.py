@@ -0,0 +1,158 @@
+# core/management/commands/benchmark_escrituras.py
+
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time as reloj
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _conectar(ruta, opciones):
+    """En un proceso nuevo ('spawn'): Django apuntando a la base temporal, antes de abrir la conexión."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    from django.db import connections
+    connections['default'].settings_dict.update(NAME=ruta, OPTIONS=opciones)
+
+
+def _preparar(ruta, libros, lectores):
+    _conectar(ruta, {})
+    from django.core.management import call_command
+    from core.models import Autor, Libro, Usuario
+    call_command('migrate', verbosity=0)
+    autor = Autor.objects.create(nombre='Banco', apellido='De Pruebas')
+    Libro.objects.bulk_create(
+        Libro(titulo=f'Libro {i}', autor=autor, isbn=f'97800{i:08d}') for i in range(libros)
+    )
+    Usuario.objects.bulk_create(
+        Usuario(username=f'escritor{i}', password='!', rol=Usuario.ROL_LECTOR, email=f'escritor{i}@ejemplo.com')
+        for i in range(lectores)
+    )
+
+
+def _escritor(ruta, opciones, indice, operaciones, barrera, resultados):
+    """Presta y devuelve libros al azar, como un mostrador de préstamos con mucha demanda."""
+    _conectar(ruta, opciones)
+    from django.db import OperationalError
+    from core import prestamos
+    from core.models import Libro, Usuario
+    lector = Usuario.objects.get(username=f'escritor{indice}')
+    libros = list(Libro.objects.only('pk', 'titulo'))
+    azar = random.Random(indice)
+    latencias, bloqueos, ocupados = [], 0, 0
+    barrera.wait()
+    for _ in range(operaciones):
+        inicio = reloj.perf_counter()
+        try:
+            prestamo = prestamos.prestar(azar.choice(libros), lector)
+            if prestamo is None:
+                ocupados += 1
+            else:
+                prestamos.devolver(prestamo.pk)
+        except OperationalError:
+            # "database is locked"
+            bloqueos += 1
+        latencias.append(reloj.perf_counter() - inicio)
+    resultados.put((latencias, bloqueos, ocupados))
+
+
+class Command(BaseCommand):
+    """
+    Mide el rendimiento de escritura con varios procesos a la vez (como varios
+    workers de gunicorn) sobre una base SQLite temporal: cada proceso presta
+    y devuelve libros en bucle. Compara la configuración por defecto de
+    Django (journal en modo rollback, transacciones DEFERRED) con la de
+    ``SQLITE_PRAGMAS``/``SQLITE_OPTIONS`` de settings. No toca la base configurada.
+    """
+    help = 'Benchmark de escrituras concurrentes en SQLite: configuración por defecto frente a la ajustada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=4)
+        parser.add_argument('--operaciones', type=int, default=200, help='Préstamo + devolución por proceso.')
+        parser.add_argument('--libros', type=int, default=50, help='Pocos libros = más conflictos entre procesos.')
+        parser.add_argument('--modo', choices=['base', 'ajustado', 'ambos'], default='ambos')
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Este benchmark es solo para SQLite.')
+        contexto = multiprocessing.get_context('spawn')
+        modos = {
+            'base': ('DELETE', {}),
+            # La base es temporal: se mide con WAL aunque en desarrollo no esté activado
+            'ajustado': (settings.SQLITE_JOURNAL_MODE or 'WAL', settings.SQLITE_OPTIONS),
+        }
+        elegidos = list(modos) if options['modo'] == 'ambos' else [options['modo']]
+
+        carpeta = tempfile.mkdtemp(prefix='benchmark_escrituras_')
+        try:
+            plantilla = os.path.join(carpeta, 'plantilla.sqlite3')
+            self.stdout.write('Preparando la base temporal...')
+            self.ejecutar(contexto, _preparar, (plantilla, options['libros'], options['procesos']))
+
+            resumen = {}
+            for modo in elegidos:
+                diario, opciones = modos[modo]
+                ruta = os.path.join(carpeta, f'{modo}.sqlite3')
+                shutil.copyfile(plantilla, ruta)
+                with sqlite3.connect(ruta) as conexion:
+                    conexion.execute(f'PRAGMA journal_mode={diario}')
+                resumen[modo] = self.medir(contexto, ruta, opciones, options['procesos'], options['operaciones'])
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+        if len(resumen) == 2 and resumen['base']:
+            mejora = resumen['ajustado'] / resumen['base']
+            self.stdout.write(self.style.SUCCESS(f'Rendimiento ajustado / por defecto: x{mejora:.2f}'))
+
+    def ejecutar(self, contexto, funcion, argumentos):
+        proceso = contexto.Process(target=funcion, args=argumentos)
+        proceso.start()
+        proceso.join()
+        if proceso.exitcode:
+            raise CommandError(f'{funcion.__name__} terminó con código {proceso.exitcode}.')
+
+    def medir(self, contexto, ruta, opciones, procesos, operaciones):
+        barrera = contexto.Barrier(procesos + 1)
+        resultados = contexto.Queue()
+        hijos = [
+            contexto.Process(target=_escritor, args=(ruta, opciones, i, operaciones, barrera, resultados))
+            for i in range(procesos)
+        ]
+        for hijo in hijos:
+            hijo.start()
+        try:
+            # Todos arrancan a la vez, ya con Django cargado
+            barrera.wait(timeout=120)
+            inicio = reloj.perf_counter()
+            muestras = [resultados.get(timeout=3600) for _ in hijos]
+        except (threading.BrokenBarrierError, queue.Empty):
+            for hijo in hijos:
+                hijo.terminate()
+            raise CommandError('Algún proceso escritor falló; revisa su salida de error.')
+        segundos = reloj.perf_counter() - inicio
+        for hijo in hijos:
+            hijo.join()
+
+        latencias = sorted(l for lista, _, _ in muestras for l in lista)
+        bloqueos = sum(b for _, b, _ in muestras)
+        ocupados = sum(o for _, _, o in muestras)
+        completadas = len(latencias) - bloqueos - ocupados
+        por_segundo = completadas / segundos if segundos else 0
+        modo = os.path.splitext(os.path.basename(ruta))[0]
+        self.stdout.write(
+            f'{modo:<9} {por_segundo:8.1f} préstamos+devoluciones/s  '
+            f'p50 {statistics.median(latencias) * 1000:7.1f} ms  '
+            f'p95 {latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000:7.1f} ms  '
+            f'{bloqueos} "database is locked"  {ocupados} libro(s) ya prestado(s)'
+        )
+        return por_segundo
@@ -0,0 +1,151 @@
+# core/management/commands/benchmark_indices.py
+
+import random
+import time as reloj
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from core.models import Autor, Libro, Prestamo, Reserva, Usuario
+
+# Índices declarados en Meta.indexes de Prestamo y Reserva
+INDICES = [
+    'prestamo_usuario_activo_idx',
+    'prestamo_vence_activo_idx',
+    'prestamo_gestion_idx',
+    'prestamo_usuario_fecha_idx',
+    'reserva_cola_libro_idx',
+    'reserva_retenida_vence_idx',
+    'reserva_usuario_fecha_idx',
+]
+
+
+class Command(BaseCommand):
+    """
+    Genera un volumen sintético de préstamos dentro de una transacción,
+    muestra el plan de ejecución y el tiempo de las consultas calientes con
+    y sin los índices compuestos/parciales, y deshace todo al terminar.
+    """
+    help = ('Compara planes de consulta con y sin índices sobre datos sintéticos '
+            '(por defecto 1M de préstamos). No deja cambios en la base de datos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prestamos', type=int, default=1_000_000)
+        parser.add_argument('--lectores', type=int, default=5_000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--lote', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        self.repeticiones = options['repeticiones']
+        with transaction.atomic():
+            self.generar_datos(options['prestamos'], options['lectores'], options['lote'])
+            self.analizar()
+            consultas = self.consultas_calientes()
+
+            self.stdout.write(self.style.MIGRATE_HEADING('\n=== Con índices ==='))
+            con = self.medir(consultas)
+
+            with connection.cursor() as cursor:
+                for nombre in INDICES:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(nombre)}')
+            self.analizar()
+            self.stdout.write(self.style.MIGRATE_HEADING('\n=== Sin índices ==='))
+            sin = self.medir(consultas)
+
+            self.stdout.write(self.style.MIGRATE_HEADING('\n=== Resumen (ms por consulta) ==='))
+            for nombre in consultas:
+                mejora = sin[nombre] / con[nombre] if con[nombre] else float('inf')
+                self.stdout.write(f'{nombre:<22} sin índice {sin[nombre]:9.3f}  con índice {con[nombre]:9.3f}  x{mejora:.1f}')
+            # Nada de lo anterior debe quedar en la base de datos
+            transaction.set_rollback(True)
+
+    def generar_datos(self, total_prestamos, total_lectores, lote):
+        inicio = reloj.perf_counter()
+        sufijo = f'{random.randrange(16**6):06x}'
+        ahora = timezone.now()
+        autor = Autor.objects.create(nombre='Autor', apellido=f'Bench {sufijo}')
+        usuarios = Usuario.objects.bulk_create(
+            [Usuario(username=f'bench_{sufijo}_{i}', rol=Usuario.ROL_LECTOR) for i in range(total_lectores)],
+            batch_size=lote,
+        )
+        total_libros = max(total_prestamos // 10, 1)
+        libros = Libro.objects.bulk_create(
+            [Libro(titulo=f'Libro {i}', autor=autor, isbn=f'9{sufijo[:5]}{i:07d}') for i in range(total_libros)],
+            batch_size=lote,
+        )
+        self.usuario = usuarios[0]
+        self.libro = libros[0]
+        self.dia = (ahora + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        for desde in range(0, total_prestamos, lote):
+            filas = []
+            for _ in range(min(lote, total_prestamos - desde)):
+                prestado = ahora - timedelta(minutes=random.randrange(60 * 24 * 720))
+                prevista = prestado + timedelta(days=14)
+                # ~95% del histórico ya está devuelto
+                devuelto = prestado + timedelta(days=random.randrange(1, 20)) if random.random() < 0.95 else None
+                filas.append(Prestamo(
+                    libro=random.choice(libros), usuario=random.choice(usuarios),
+                    fecha_prestamo=prestado, fecha_devolucion_prevista=prevista,
+                    fecha_devolucion_real=devuelto,
+                ))
+            Prestamo.objects.bulk_create(filas)
+        Reserva.objects.bulk_create(
+            [
+                Reserva(
+                    libro=random.choice(libros), usuario=random.choice(usuarios),
+                    fecha_reserva=ahora - timedelta(days=random.randrange(30)),
+                    # ~80% ya cerradas; el resto, en cola
+                    estado=random.choice([Reserva.ESTADO_ATENDIDA, Reserva.ESTADO_EXPIRADA])
+                    if random.random() < 0.8 else Reserva.ESTADO_EN_COLA,
+                )
+                for _ in range(total_prestamos // 20)
+            ],
+            batch_size=lote,
+            # Descarta las repetidas en cola (restricción reserva_viva_unica)
+            ignore_conflicts=True,
+        )
+        self.stdout.write(
+            f'Datos sintéticos: {total_prestamos} préstamos, {total_libros} libros, '
+            f'{total_lectores} lectores en {reloj.perf_counter() - inicio:.1f}s'
+        )
+
+    def analizar(self):
+        # Estadísticas frescas para que el planificador elija bien
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def consultas_calientes(self):
+        ahora = timezone.now()
+        return {
+            'sancion_usuario': lambda: Prestamo.objects.filter(
+                usuario=self.usuario, fecha_devolucion_real__isnull=True,
+                fecha_devolucion_prevista__lt=ahora,
+            ),
+            'cola_reservas': lambda: Reserva.objects.filter(
+                libro=self.libro, estado=Reserva.ESTADO_EN_COLA,
+            ).order_by('fecha_reserva')[:1],
+            'recordatorios': lambda: Prestamo.objects.filter(
+                fecha_devolucion_prevista__gte=self.dia,
+                fecha_devolucion_prevista__lt=self.dia + timedelta(days=1),
+                fecha_devolucion_real__isnull=True,
+            ),
+            'gestion_prestamos': lambda: Prestamo.objects.order_by(
+                'fecha_devolucion_real', '-fecha_prestamo', 'id'
+            )[:50],
+            'mis_prestamos': lambda: Prestamo.objects.filter(usuario=self.usuario).order_by('-fecha_prestamo')[:25],
+        }
+
+    def medir(self, consultas):
+        resultados = {}
+        for nombre, construir in consultas.items():
+            plan = construir().explain()
+            inicio = reloj.perf_counter()
+            for _ in range(self.repeticiones):
+                list(construir())
+            ms = (reloj.perf_counter() - inicio) * 1000 / self.repeticiones
+            resultados[nombre] = ms
+            self.stdout.write(self.style.SUCCESS(f'\n[{nombre}] {ms:.3f} ms'))
+            self.stdout.write(plan)
+        return resultados
@@ -0,0 +1,60 @@
+# core/management/commands/benchmark_pdf.py
+
+import resource
+import tempfile
+import time as reloj
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core import reportes
+from core.models import Prestamo
+
+
+class Command(BaseCommand):
+    """
+    Mide el rendimiento de la maquetación del PDF de préstamos activos con
+    filas sintéticas (sin tocar la base de datos). Con ``--minimo`` falla si
+    no se alcanza ese número de filas por segundo.
+    """
+    help = 'Mide filas/segundo del reporte PDF de préstamos (por defecto 50.000 filas).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=50_000)
+        parser.add_argument('--agrupar', choices=reportes.AGRUPACIONES_PDF)
+        parser.add_argument('--minimo', type=float, default=0, help='Filas/segundo mínimas exigidas.')
+
+    def handle(self, *args, **options):
+        total = options['filas']
+        agrupar = options['agrupar']
+        ahora = timezone.now()
+
+        def filas():
+            for i in range(total):
+                prevista = ahora + timedelta(days=i * 14 // total)
+                if agrupar == 'dia':
+                    seccion = f'Vencen el {reportes._fecha(prevista)}'
+                elif agrupar == 'categoria':
+                    seccion = f'Categoría: Categoría {i * 20 // total}'
+                else:
+                    seccion = None
+                estado = Prestamo.ESTADO_RETRASADO if i % 7 == 0 else Prestamo.ESTADO_EN_CURSO
+                yield (f'Libro de prueba número {i}', f'lector_{i % 5000}', ahora - timedelta(days=3),
+                       prevista, estado, seccion)
+
+        with tempfile.TemporaryFile() as salida:
+            inicio = reloj.perf_counter()
+            reportes.renderizar_prestamos_pdf(salida, filas())
+            segundos = reloj.perf_counter() - inicio
+            tamano = salida.tell()
+
+        por_segundo = total / segundos if segundos else float('inf')
+        # ru_maxrss está en KiB en Linux
+        memoria = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            f'{total} filas en {segundos:.2f}s -> {por_segundo:,.0f} filas/s, '
+            f'{tamano / 1024:,.0f} KiB, memoria máxima {memoria:,.0f} MiB'
+        )
+        if por_segundo < options['minimo']:
+            raise CommandError(f'Rendimiento por debajo del mínimo ({options["minimo"]:,.0f} filas/s).')
+        self.stdout.write(self.style.SUCCESS('Benchmark completado.'))
@@ -0,0 +1,197 @@
+# core/management/commands/benchmark_suite.py
+
+import io
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time as reloj
+from contextlib import ExitStack
+
+import django
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from core import estadisticas
+from core.metricas import ContadorSQL
+from core.models import Autor, Libro, Prestamo, Reserva, Usuario
+
+
+def escenarios():
+    """``nombre -> (descripción, función)``; cada función hace una petición o ejecuta un comando."""
+    def vista(nombre, **params):
+        return lambda cliente: cliente.get(reverse(nombre), params)
+
+    def dashboard_frio(cliente):
+        estadisticas.invalidar()
+        return cliente.get(reverse('dashboard_bibliotecario'))
+
+    def recordatorios(cliente):
+        call_command('enviar_recordatorios', stdout=io.StringIO())
+        mail.outbox = []
+
+    return {
+        'catalogo': ('Catálogo, primera página', vista('libro_list')),
+        'catalogo_busqueda': ('Búsqueda de texto completo', vista('libro_list', q='jardín perdido')),
+        'catalogo_filtros': ('Catálogo filtrado por estado y categoría', vista('libro_list', estado='prestado', categoria='1')),
+        'dashboard': ('Dashboard con la caché caliente', vista('dashboard_bibliotecario')),
+        'dashboard_frio': ('Dashboard recalculando el resumen', dashboard_frio),
+        'gestion_prestamos': ('Gestión de préstamos, primera página', vista('gestion_prestamos')),
+        'gestion_retrasados': ('Gestión de préstamos, solo retrasados', vista('gestion_prestamos', estado='retrasado')),
+        'exportar_libros_csv': ('CSV del catálogo completo', vista('reporte_libros_csv')),
+        'exportar_prestamos_csv': ('CSV de todos los préstamos', vista('reporte_prestamos_csv')),
+        'exportar_libros_excel': ('Excel del catálogo completo', vista('reporte_libros_excel')),
+        'exportar_prestamos_pdf': ('PDF de préstamos activos', vista('reporte_prestamos_pdf')),
+        'enviar_recordatorios': ('Comando enviar_recordatorios (correo en memoria)', recordatorios),
+    }
+
+
+class Command(BaseCommand):
+    """
+    Mide las vistas y comandos más pesados (catálogo, búsqueda, dashboard,
+    gestión de préstamos, cada exportación y ``enviar_recordatorios``) contra
+    los datos de la base configurada, normalmente generados con
+    ``generar_datos``. Escribe un JSON con tiempos (mediana, p95), consultas
+    SQL y bytes por escenario; ``--comparar`` lo contrasta con un JSON de otro
+    commit y falla si alguna mediana empeora más de ``--tolerancia``.
+    """
+    help = 'Ejecuta la batería de benchmarks y guarda los resultados en JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--solo', nargs='+', metavar='ESCENARIO', help='Ejecuta solo estos escenarios.')
+        parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto, en la salida estándar).')
+        parser.add_argument('--comparar', metavar='JSON', help='Resultados anteriores con los que comparar.')
+        parser.add_argument('--tolerancia', type=float, default=0.2,
+                            help='Empeoramiento relativo de la mediana admitido al comparar (0.2 = 20%%).')
+
+    def handle(self, *args, **options):
+        todos = escenarios()
+        elegidos = options['solo'] or list(todos)
+        desconocidos = set(elegidos) - set(todos)
+        if desconocidos:
+            raise CommandError(f'Escenarios desconocidos: {", ".join(sorted(desconocidos))}. Disponibles: {", ".join(todos)}.')
+
+        with ExitStack() as pila:
+            # Correo en memoria y 'testserver' en ALLOWED_HOSTS; dentro de las pruebas ya está activo
+            try:
+                setup_test_environment()
+                pila.callback(teardown_test_environment)
+            except RuntimeError:
+                pass
+            # La línea por petición de MetricasMiddleware ensuciaría la salida
+            registro = logging.getLogger('biblioteca.metricas')
+            pila.callback(registro.setLevel, registro.level)
+            registro.setLevel(logging.WARNING)
+            cliente = Client()
+            cliente.force_login(self.bibliotecario())
+            resultados = {nombre: self.medir(cliente, todos[nombre], options['repeticiones']) for nombre in elegidos}
+
+        informe = {'entorno': self.entorno(), 'escenarios': resultados}
+        texto = json.dumps(informe, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {options["salida"]}.'))
+        else:
+            self.stdout.write(texto)
+
+        if options['comparar']:
+            self.comparar(resultados, options['comparar'], options['tolerancia'])
+
+    def bibliotecario(self):
+        usuario, _ = Usuario.objects.get_or_create(
+            username='benchmark_bibliotecario', defaults={'rol': Usuario.ROL_BIBLIOTECARIO, 'password': '!'}
+        )
+        return usuario
+
+    def medir(self, cliente, escenario, repeticiones):
+        descripcion, funcion = escenario
+        # Una pasada de calentamiento (caché, plantillas, páginas de la base de datos)
+        self.ejecutar(cliente, funcion)
+        muestras = [self.ejecutar(cliente, funcion) for _ in range(max(repeticiones, 1))]
+        tiempos = sorted(m[0] for m in muestras)
+        resultado = {
+            'descripcion': descripcion,
+            'repeticiones': len(muestras),
+            'ms_mediana': round(statistics.median(tiempos), 2),
+            'ms_p95': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 2),
+            'ms_min': round(tiempos[0], 2),
+            'ms_max': round(tiempos[-1], 2),
+            'consultas_sql': muestras[-1][1],
+            'ms_sql': round(statistics.median(m[2] for m in muestras), 2),
+            'bytes': muestras[-1][3],
+        }
+        self.stderr.write(
+            f'{descripcion:<50} {resultado["ms_mediana"]:10.1f} ms  '
+            f'{resultado["consultas_sql"]:5d} consultas  {resultado["bytes"] or 0:>12,} bytes'
+        )
+        return resultado
+
+    def ejecutar(self, cliente, funcion):
+        """Devuelve ``(ms, consultas, ms_sql, bytes)`` de una ejecución, incluido el envío del cuerpo."""
+        medicion = ContadorSQL()
+        with ExitStack() as envolturas:
+            for conexion in connections.all():
+                envolturas.enter_context(conexion.execute_wrapper(medicion))
+            inicio = reloj.perf_counter()
+            respuesta = funcion(cliente)
+            tamano = None
+            if respuesta is not None:
+                if respuesta.status_code != 200:
+                    raise CommandError(f'{respuesta.request["PATH_INFO"]} respondió {respuesta.status_code}.')
+                tamano = len(b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content)
+            segundos = reloj.perf_counter() - inicio
+        return segundos * 1000, medicion.consultas, medicion.segundos_sql * 1000, tamano
+
+    def entorno(self):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'django': django.get_version(),
+            'plataforma': platform.platform(),
+            'base_de_datos': f'{connection.vendor} {connection.Database.sqlite_version if connection.vendor == "sqlite" else ""}'.strip(),
+            'volumen': {
+                'autores': Autor.objects.count(),
+                'libros': Libro.objects.count(),
+                'prestamos': Prestamo.objects.count(),
+                'prestamos_activos': Prestamo.objects.activos().count(),
+                'reservas': Reserva.objects.count(),
+                'lectores': Usuario.objects.filter(rol=Usuario.ROL_LECTOR).count(),
+            },
+        }
+
+    def comparar(self, resultados, ruta, tolerancia):
+        with open(ruta, encoding='utf-8') as archivo:
+            anteriores = json.load(archivo)['escenarios']
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n=== Comparación con {ruta} (mediana, ms) ==='))
+        regresiones = []
+        for nombre, actual in resultados.items():
+            anterior = anteriores.get(nombre)
+            if anterior is None:
+                self.stdout.write(f'{nombre:<24} {"(nuevo)":>10} {actual["ms_mediana"]:10.1f}')
+                continue
+            cambio = actual['ms_mediana'] / anterior['ms_mediana'] - 1 if anterior['ms_mediana'] else 0
+            linea = (f'{nombre:<24} {anterior["ms_mediana"]:10.1f} {actual["ms_mediana"]:10.1f} {cambio:+8.1%}  '
+                     f'consultas {anterior["consultas_sql"]} -> {actual["consultas_sql"]}')
+            empeora = cambio > tolerancia or actual['consultas_sql'] > anterior['consultas_sql']
+            if empeora:
+                regresiones.append(nombre)
+            self.stdout.write(self.style.ERROR(linea) if empeora else linea)
+        if regresiones:
+            raise CommandError(f'Regresiones en: {", ".join(regresiones)}.')
+        self.stdout.write(self.style.SUCCESS('Sin regresiones.'))
@@ -1,56 +1,90 @@
 # core/management/commands/enviar_recordatorios.py
 
-from django.core.management.base import BaseCommand
-from django.core.mail import send_mail
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from datetime import timedelta
-from core.models import Prestamo, Usuario
+from datetime import datetime, time, timedelta
+from core import correo
+from core.models import Prestamo
 
 class Command(BaseCommand):
     """
     Comando de gestión para enviar recordatorios de préstamos que vencen mañana.
+
+    Los correos se envían en lotes por conexiones SMTP reutilizadas
+    (``core/correo.py``); con ``--workers N`` se usan N conexiones en paralelo.
     """
     help = 'Envía recordatorios por correo para préstamos que vencen mañana.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Muestra los recordatorios sin enviarlos.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Correos por conexión SMTP.')
+        parser.add_argument('--workers', type=int, default=1, help='Conexiones SMTP en paralelo.')
+        parser.add_argument('--max-por-segundo', type=float, default=0,
+                            help='Límite de correos por segundo en toda la ejecución (0 = sin límite).')
+
     def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size debe ser al menos 1.')
+        if options['workers'] < 1:
+            raise CommandError('--workers debe ser al menos 1.')
+        if options['max_por_segundo'] < 0:
+            raise CommandError('--max-por-segundo no puede ser negativo.')
+
         # 1. Definir la fecha de "mañana"
         today = timezone.now().date()
         tomorrow = today + timedelta(days=1)
-        
+
         # 2. Buscar préstamos que vencen mañana Y no han sido devueltos
+        # (rango de fechas en lugar de __date para aprovechar prestamo_vence_activo_idx)
+        inicio = timezone.make_aware(datetime.combine(tomorrow, time.min))
+        fin = inicio + timedelta(days=1)
         prestamos_a_vencer = Prestamo.objects.filter(
-            fecha_devolucion_prevista__date=tomorrow,
+            fecha_devolucion_prevista__gte=inicio,
+            fecha_devolucion_prevista__lt=fin,
             fecha_devolucion_real__isnull=True
-        ).select_related('usuario', 'libro') # .select_related optimiza la consulta
+        ).values_list('usuario__first_name', 'usuario__username', 'usuario__email', 'libro__titulo')
 
-        if not prestamos_a_vencer.exists():
+        # 3. Armar los mensajes (una sola consulta, sin instanciar modelos)
+        mensajes = []
+        sin_correo = 0
+        for nombre, username, email, titulo in prestamos_a_vencer.iterator():
+            if not email:
+                sin_correo += 1
+                continue
+            mensajes.append(correo.mensaje(
+                'Recordatorio de Vencimiento - Biblioteca Digital',
+                f'Hola {nombre or username},\n\n'
+                f'Este es un recordatorio amigable de que tu préstamo del libro: "{titulo}" vence mañana, {tomorrow.strftime("%Y-%m-%d")}.\n\n'
+                'Por favor, recuerda devolverlo a tiempo para evitar sanciones.\n\n'
+                '¡Gracias por usar la Biblioteca Digital!',
+                email,
+            ))
+        if sin_correo:
+            self.stdout.write(self.style.WARNING(f'{sin_correo} préstamo(s) sin correo del lector; se omiten.'))
+
+        if not mensajes:
             self.stdout.write(self.style.SUCCESS('No hay préstamos que vencen mañana.'))
             return
 
-        self.stdout.write(f'Enviando {prestamos_a_vencer.count()} recordatorio(s)...')
-        
-        # 3. Recorrer y enviar correo a cada uno
-        count_exitosos = 0
-        for prestamo in prestamos_a_vencer:
-            usuario = prestamo.usuario
-            libro = prestamo.libro
-            
-            try:
-                send_mail(
-                    subject='Recordatorio de Vencimiento - Biblioteca Digital',
-                    message=(
-                        f'Hola {usuario.first_name or usuario.username},\n\n'
-                        f'Este es un recordatorio amigable de que tu préstamo del libro: "{libro.titulo}" vence mañana, {tomorrow.strftime("%Y-%m-%d")}.\n\n'
-                        'Por favor, recuerda devolverlo a tiempo para evitar sanciones.\n\n'
-                        '¡Gracias por usar la Biblioteca Digital!'
-                    ),
-                    from_email='noreply@biblioteca.com',
-                    recipient_list=[usuario.email],
-                    fail_silently=False,
-                )
-                self.stdout.write(self.style.SUCCESS(f'Correo enviado a {usuario.email} por el libro "{libro.titulo}"'))
-                count_exitosos += 1
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error enviando correo a {usuario.email}: {e}'))
-        
-        self.stdout.write(self.style.SUCCESS(f'\nProceso completado. {count_exitosos} correos enviados.'))
\ No newline at end of file
+        if options['dry_run']:
+            if options['verbosity'] > 1:
+                for mensaje in mensajes:
+                    self.stdout.write(f'[simulado] {mensaje.to[0]}')
+            self.stdout.write(self.style.SUCCESS(f'Simulación: se enviarían {len(mensajes)} recordatorio(s).'))
+            return
+
+        # 4. Enviar en lotes
+        self.stdout.write(f'Enviando {len(mensajes)} recordatorio(s)...')
+        resultado = correo.enviar_en_lotes(
+            mensajes,
+            tamano_lote=options['batch_size'],
+            hilos=options['workers'],
+            por_segundo=options['max_por_segundo'],
+        )
+        for destinatario, error in resultado.errores:
+            self.stdout.write(self.style.ERROR(f'Error enviando correo a {destinatario}: {error}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\nProceso completado. {resultado.enviados} correos enviados, {len(resultado.errores)} con error, '
+            f'{resultado.lotes} lote(s) en {resultado.segundos:.2f}s ({resultado.por_segundo:.1f} correos/s).'
+        ))
@@ -0,0 +1,189 @@
+# core/management/commands/generar_datos.py
+
+import random
+import time as reloj
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from core import busqueda, estadisticas, sanciones
+from core.models import Autor, Categoria, Libro, Prestamo, Reserva, Usuario
+
+NOMBRES = ['Ana', 'Luis', 'María', 'Jorge', 'Lucía', 'Pedro', 'Elena', 'Andrés', 'Sofía', 'Diego',
+           'Carmen', 'Javier', 'Isabel', 'Mateo', 'Valeria', 'Tomás', 'Julia', 'Gabriel', 'Rosa', 'Héctor']
+APELLIDOS = ['García', 'Rodríguez', 'López', 'Martínez', 'Sánchez', 'Pérez', 'Gómez', 'Díaz', 'Torres',
+             'Ramírez', 'Flores', 'Rivera', 'Morales', 'Castro', 'Ortiz', 'Vargas', 'Rojas', 'Herrera']
+GENEROS = ['Novela', 'Poesía', 'Ensayo', 'Historia', 'Ciencia', 'Filosofía', 'Biografía', 'Infantil',
+           'Teatro', 'Arte', 'Viajes', 'Cocina', 'Tecnología', 'Derecho', 'Economía', 'Policial']
+SUSTANTIVOS = ['jardín', 'río', 'silencio', 'ciudad', 'memoria', 'viaje', 'noche', 'mar', 'camino',
+               'sombra', 'espejo', 'invierno', 'casa', 'tiempo', 'bosque', 'puerta', 'isla', 'voz']
+ADJETIVOS = ['perdido', 'eterno', 'secreto', 'dormido', 'lejano', 'oscuro', 'infinito', 'antiguo',
+             'breve', 'olvidado', 'último', 'blanco', 'quieto', 'roto', 'dorado', 'nuevo']
+
+
+class Command(BaseCommand):
+    """
+    Crea un catálogo sintético realista con ``bulk_create`` en lotes (por
+    defecto 10k autores, 500k libros, 5M préstamos y 200k reservas) para las
+    pruebas de carga y ``benchmark_suite``. Los préstamos se concentran en
+    pocos libros, como en una biblioteca real, y solo hay un préstamo activo
+    por libro. Al final recalcula lo que ``bulk_create`` no mantiene (índice de
+    búsqueda, estadísticas del dashboard y estado de los lectores).
+    """
+    help = 'Genera datos sintéticos en volumen (usar --escala 0.01 para una prueba rápida).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--autores', type=int, default=10_000)
+        parser.add_argument('--libros', type=int, default=500_000)
+        parser.add_argument('--lectores', type=int, default=20_000)
+        parser.add_argument('--prestamos', type=int, default=5_000_000)
+        parser.add_argument('--reservas', type=int, default=200_000)
+        parser.add_argument('--escala', type=float, default=1.0, help='Multiplica todos los volúmenes.')
+        parser.add_argument('--lote', type=int, default=10_000, help='Filas por bulk_create.')
+        parser.add_argument('--semilla', type=int, help='Semilla aleatoria (datos reproducibles).')
+
+    def handle(self, *args, **options):
+        escala = options['escala']
+        volumen = {
+            clave: max(int(options[clave] * escala), 1)
+            for clave in ('autores', 'libros', 'lectores', 'prestamos', 'reservas')
+        }
+        if volumen['libros'] >= 10_000_000:
+            raise CommandError('Como máximo 9.999.999 libros por ejecución (ISBN sintético).')
+        self.lote = options['lote']
+        self.azar = random.Random(options['semilla'])
+        # Prefijo de la ejecución: permite generar varias veces sobre la misma base
+        self.serie = f'{self.azar.randrange(10_000):04d}'
+        self.ahora = timezone.now()
+
+        inicio = reloj.perf_counter()
+        # Una sola transacción: sin un commit (y un fsync) por lote
+        with transaction.atomic():
+            categorias = self.paso('categorías', self.generar_categorias)
+            autores = self.paso('autores', lambda: self.generar_autores(volumen['autores']))
+            lectores = self.paso('lectores', lambda: self.generar_lectores(volumen['lectores']))
+            libros = self.paso('libros', lambda: self.generar_libros(volumen['libros'], autores, categorias))
+            self.paso('préstamos', lambda: self.generar_prestamos(volumen['prestamos'], libros, lectores))
+            self.paso('reservas', lambda: self.generar_reservas(volumen['reservas'], libros, lectores))
+
+            self.stdout.write('Recalculando índice de búsqueda, estadísticas y sanciones...')
+            if busqueda.motor() is not None:
+                busqueda.reconstruir()
+            estadisticas.reconstruir()
+            sanciones.recalcular()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(
+            f'Datos generados en {reloj.perf_counter() - inicio:.1f}s: ' +
+            ', '.join(f'{total:,} {clave}' for clave, total in volumen.items())
+        ))
+
+    def paso(self, nombre, funcion):
+        inicio = reloj.perf_counter()
+        resultado = funcion()
+        segundos = reloj.perf_counter() - inicio
+        total = len(resultado) if isinstance(resultado, (list, set)) else resultado
+        self.stdout.write(f'  {nombre}: {total:,} en {segundos:.1f}s ({total / segundos if segundos else 0:,.0f}/s)')
+        return resultado
+
+    def crear(self, modelo, filas, **kwargs):
+        """bulk_create por lotes de un generador; devuelve los pk creados."""
+        pks, lote = [], []
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) == self.lote:
+                pks.extend(o.pk for o in modelo.objects.bulk_create(lote, **kwargs))
+                lote = []
+        if lote:
+            pks.extend(o.pk for o in modelo.objects.bulk_create(lote, **kwargs))
+        return pks
+
+    def popular(self, pks):
+        # Pocos libros concentran la mayoría de los préstamos
+        return pks[int(len(pks) * self.azar.random() ** 3)]
+
+    def generar_categorias(self):
+        Categoria.objects.bulk_create([Categoria(nombre=n) for n in GENEROS], ignore_conflicts=True)
+        return list(Categoria.objects.filter(nombre__in=GENEROS).values_list('pk', flat=True))
+
+    def generar_autores(self, total):
+        azar = self.azar
+        return self.crear(Autor, (
+            Autor(nombre=azar.choice(NOMBRES), apellido=f'{azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}')
+            for _ in range(total)
+        ))
+
+    def generar_lectores(self, total):
+        azar = self.azar
+        # Contraseña inutilizable: sin coste de hash
+        return self.crear(Usuario, (
+            Usuario(
+                username=f'sint{self.serie}_{i}', password='!', rol=Usuario.ROL_LECTOR,
+                first_name=azar.choice(NOMBRES), last_name=azar.choice(APELLIDOS),
+                email=f'sint{self.serie}_{i}@ejemplo.com',
+            )
+            for i in range(total)
+        ))
+
+    def generar_libros(self, total, autores, categorias):
+        azar = self.azar
+        return self.crear(Libro, (
+            Libro(
+                titulo=f'El {azar.choice(SUSTANTIVOS)} {azar.choice(ADJETIVOS)} {i}',
+                isbn=f'99{self.serie}{i:07d}',
+                autor_id=azar.choice(autores),
+                categoria_id=azar.choice(categorias),
+                resumen=f'Una historia sobre el {azar.choice(SUSTANTIVOS)} y la {azar.choice(["memoria", "noche", "ciudad"])}.',
+            )
+            for i in range(total)
+        ))
+
+    def generar_prestamos(self, total, libros, lectores):
+        """Histórico devuelto más un préstamo activo (~20% vencidos) en una parte de los libros."""
+        azar, ahora = self.azar, self.ahora
+        activos = azar.sample(libros, min(total // 50, len(libros) // 5))
+
+        def filas():
+            for libro_id in activos:
+                prestado = ahora - timedelta(days=azar.randrange(1, 30))
+                yield Prestamo(
+                    libro_id=libro_id, usuario_id=azar.choice(lectores), fecha_prestamo=prestado,
+                    fecha_devolucion_prevista=prestado + timedelta(days=14 if azar.random() < 0.8 else 3),
+                )
+            for _ in range(total - len(activos)):
+                prestado = ahora - timedelta(minutes=azar.randrange(60 * 24 * 720))
+                yield Prestamo(
+                    libro_id=self.popular(libros), usuario_id=azar.choice(lectores), fecha_prestamo=prestado,
+                    fecha_devolucion_prevista=prestado + timedelta(days=14),
+                    fecha_devolucion_real=prestado + timedelta(days=azar.randrange(1, 20)),
+                )
+
+        creados = self.crear(Prestamo, filas())
+        for desde in range(0, len(activos), self.lote):
+            Libro.objects.filter(pk__in=activos[desde:desde + self.lote]).update(
+                estado=Libro.ESTADO_PRESTADO, actualizado_en=ahora
+            )
+        self.activos = activos
+        return len(creados)
+
+    def generar_reservas(self, total, libros, lectores):
+        """En cola sobre libros prestados; el resto, histórico atendido o expirado."""
+        azar, ahora = self.azar, self.ahora
+
+        def filas():
+            for _ in range(total):
+                fecha = ahora - timedelta(days=azar.randrange(60))
+                if self.activos and azar.random() < 0.2:
+                    yield Reserva(libro_id=azar.choice(self.activos), usuario_id=azar.choice(lectores),
+                                  fecha_reserva=fecha)
+                else:
+                    yield Reserva(
+                        libro_id=self.popular(libros), usuario_id=azar.choice(lectores), fecha_reserva=fecha,
+                        estado=Reserva.ESTADO_ATENDIDA if azar.random() < 0.7 else Reserva.ESTADO_EXPIRADA,
+                        fecha_expiracion=fecha + timedelta(days=3),
+                    )
+
+        # Las repetidas en cola (restricción reserva_viva_unica) se descartan
+        self.crear(Reserva, filas(), ignore_conflicts=True)
+        return total
@@ -0,0 +1,69 @@
+# core/management/commands/generar_miniaturas.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from core import portadas
+from core.models import Libro
+
+
+def _iniciar_proceso():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()  # necesario cuando el proceso se crea con 'spawn'
+
+
+def _procesar(tarea):
+    """En un proceso del pool: solo Pillow y almacenamiento, sin base de datos."""
+    libro_pk, nombre = tarea
+    try:
+        return libro_pk, portadas.generar(nombre), None
+    except Exception as e:
+        return libro_pk, None, f'{nombre}: {e}'
+
+
+class Command(BaseCommand):
+    """
+    Genera las miniaturas (WebP y JPEG) de las portadas subidas que aún no las
+    tienen, repartiendo el trabajo de Pillow entre varios procesos. Los
+    procesos solo leen y escriben imágenes; el proceso principal guarda el
+    resultado de cada libro en la base de datos.
+    """
+    help = 'Genera las miniaturas de las portadas existentes en paralelo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help='Procesos de Pillow en paralelo.')
+        parser.add_argument('--todas', action='store_true', help='Regenera también las que ya tienen miniaturas.')
+
+    def handle(self, *args, **options):
+        libros = Libro.objects.exclude(portada='').exclude(portada__isnull=True).order_by('pk')
+        tareas = [
+            (pk, portada) for pk, portada, miniaturas in libros.values_list('pk', 'portada', 'miniaturas').iterator()
+            if options['todas'] or miniaturas.get('origen') != portada
+        ]
+        if not tareas:
+            self.stdout.write('No hay portadas pendientes.')
+            return
+        self.stdout.write(f'{len(tareas)} portada(s) por procesar con {options["procesos"]} proceso(s)...')
+
+        if options['procesos'] <= 1:
+            resultados = map(_procesar, tareas)
+            self.guardar(resultados)
+            return
+        # Cada proceso hijo debe abrir su propia conexión si la necesita
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['procesos'], initializer=_iniciar_proceso) as pool:
+            self.guardar(pool.map(_procesar, tareas, chunksize=4))
+
+    def guardar(self, resultados):
+        guardadas = errores = 0
+        for libro_pk, miniaturas, error in resultados:
+            if error:
+                errores += 1
+                self.stderr.write(f'Libro {libro_pk}: {error}')
+            elif portadas.guardar(libro_pk, miniaturas):
+                guardadas += 1
+        self.stdout.write(self.style.SUCCESS(f'{guardadas} portada(s) con miniaturas, {errores} con error.'))
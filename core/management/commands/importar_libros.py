@@ -0,0 +1,49 @@
+# core/management/commands/importar_libros.py
+
+import csv
+import time as reloj
+
+from django.core.management.base import BaseCommand, CommandError
+from core import importacion
+
+
+class Command(BaseCommand):
+    """
+    Importa (o actualiza por ISBN) libros desde un CSV o XLSX leyendo el
+    archivo fila a fila y guardando por lotes. Las filas rechazadas se
+    escriben en ``--rechazados`` o, si no se indica, en la salida de error.
+    """
+    help = 'Importa el catálogo desde un archivo CSV o XLSX (columnas Titulo, Autor, ISBN, Categoria...).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--lote', type=int, default=importacion.TAMANO_LOTE, help='Libros por INSERT.')
+        parser.add_argument('--rechazados', help='CSV donde dejar las filas rechazadas y su motivo.')
+
+    def handle(self, *args, **options):
+        try:
+            formato = importacion.formato_de(options['archivo'])
+        except importacion.ErrorImportacion as e:
+            raise CommandError(str(e))
+        reporte = open(options['rechazados'], 'w', newline='', encoding='utf-8') if options['rechazados'] else None
+        if reporte:
+            escritor = csv.writer(reporte)
+            escritor.writerow(importacion.CABECERA_RECHAZADOS)
+
+        def rechazados(numero, motivo, valores):
+            if reporte:
+                escritor.writerow(importacion.fila_rechazada(numero, motivo, valores))
+            else:
+                self.stderr.write(f'Fila {numero}: {motivo}')
+
+        inicio = reloj.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                totales = importacion.importar(archivo, formato, rechazados, options['lote'])
+        except (OSError, importacion.ErrorImportacion) as e:
+            raise CommandError(str(e))
+        finally:
+            if reporte:
+                reporte.close()
+        segundos = reloj.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{importacion.resumen_texto(totales)} en {segundos:.1f}s.'))
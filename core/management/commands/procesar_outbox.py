@@ -0,0 +1,46 @@
+# core/management/commands/procesar_outbox.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from core import correo
+
+
+class Command(BaseCommand):
+    """
+    Envía los correos de la bandeja de salida (``CorreoPendiente``) en lotes,
+    cada lote por una conexión SMTP. Los fallos se reintentan con espera
+    creciente; tras ``--max-intentos`` quedan como 'fallido' para revisarlos
+    en el admin. Pensado para correr de forma continua junto al servidor web.
+    """
+    help = 'Procesa la bandeja de salida de correos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Correos por lote (y por conexión).')
+        parser.add_argument('--max-intentos', type=int, default=correo.MAX_INTENTOS)
+        parser.add_argument('--una-vez', action='store_true', help='Vacía lo pendiente y termina.')
+        parser.add_argument('--espera', type=float, default=5.0, help='Segundos entre sondeos si no hay correos.')
+        parser.add_argument('--retener-dias', type=int, default=30, help='Días que se conservan los ya enviados.')
+
+    def handle(self, *args, **options):
+        purgados = correo.purgar_enviados(options['retener_dias'])
+        if purgados:
+            self.stdout.write(f'{purgados} correo(s) enviados purgados.')
+
+        total_enviados = total_fallidos = 0
+        try:
+            while True:
+                enviados, fallidos = correo.procesar_outbox(options['batch_size'], options['max_intentos'])
+                total_enviados += enviados
+                total_fallidos += fallidos
+                if enviados or fallidos:
+                    self.stdout.write(f'Lote: {enviados} enviado(s), {fallidos} con error.')
+                    continue
+                if options['una_vez']:
+                    break
+                time.sleep(options['espera'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_enviados} correo(s) enviados, {total_fallidos} intento(s) fallidos.'
+        ))
@@ -0,0 +1,71 @@
+# core/management/commands/procesar_trabajos.py
+
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _bucle(una_vez, espera):
+    """Ciclo de un proceso trabajador: reclama y ejecuta trabajos pendientes."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()  # necesario cuando el proceso se crea con 'spawn' (y no volver a configurar los logs)
+    from core import trabajos
+
+    procesados = 0
+    while True:
+        trabajo = trabajos.reclamar_siguiente()
+        if trabajo is None:
+            if una_vez:
+                return procesados
+            time.sleep(espera)
+            continue
+        trabajos.ejecutar(trabajo)
+        procesados += 1
+
+
+class Command(BaseCommand):
+    """
+    Trabajador de la cola de reportes. Con ``--procesos N`` lanza N procesos
+    que compiten por los trabajos pendientes (el reclamo es atómico).
+    """
+    help = 'Procesa la cola de trabajos en segundo plano (reportes y miniaturas de portadas).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=1, help='Número de procesos trabajadores.')
+        parser.add_argument('--una-vez', action='store_true', help='Vacía la cola y termina.')
+        parser.add_argument('--espera', type=float, default=2.0, help='Segundos entre sondeos si la cola está vacía.')
+        parser.add_argument('--retener-dias', type=int, default=7, help='Días que se conservan los reportes generados.')
+
+    def handle(self, *args, **options):
+        from core import trabajos
+
+        recuperados = trabajos.recuperar_colgados()
+        purgados = trabajos.purgar_antiguos(options['retener_dias'])
+        if recuperados or purgados:
+            self.stdout.write(f'{recuperados} trabajo(s) recuperado(s), {purgados} purgado(s).')
+
+        if options['procesos'] <= 1:
+            procesados = _bucle(options['una_vez'], options['espera'])
+            self.stdout.write(self.style.SUCCESS(f'{procesados} trabajo(s) procesado(s).'))
+            return
+
+        # Cada proceso hijo debe abrir su propia conexión a la base de datos
+        connections.close_all()
+        procesos = [
+            multiprocessing.Process(target=_bucle, args=(options['una_vez'], options['espera']))
+            for _ in range(options['procesos'])
+        ]
+        for proceso in procesos:
+            proceso.start()
+        self.stdout.write(f'{len(procesos)} procesos trabajadores en marcha.')
+        try:
+            for proceso in procesos:
+                proceso.join()
+        except KeyboardInterrupt:
+            for proceso in procesos:
+                proceso.terminate()
+        self.stdout.write(self.style.SUCCESS('Trabajadores detenidos.'))
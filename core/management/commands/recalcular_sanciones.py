@@ -0,0 +1,36 @@
+# core/management/commands/recalcular_sanciones.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from core import sanciones
+
+
+class Command(BaseCommand):
+    """
+    Marca como bloqueados a los lectores con préstamos que acaban de vencer
+    (un solo ``UPDATE`` sobre ``Usuario``). Con ``--completo`` recalcula el
+    estado de todos los lectores desde la tabla de préstamos, por ejemplo tras
+    una carga masiva con bulk_create.
+    """
+    help = 'Actualiza las sanciones por retraso guardadas en los usuarios.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true',
+                            help='Recalcula préstamos activos, vencimientos y sanciones de todos los usuarios.')
+        parser.add_argument('--cada', type=float, default=0,
+                            help='Repetir cada N segundos (0 = una sola pasada).')
+
+    def handle(self, *args, **options):
+        if options['completo']:
+            total = sanciones.recalcular()
+            self.stdout.write(self.style.SUCCESS(f'{total} usuario(s) recalculados.'))
+        try:
+            while True:
+                bloqueados = sanciones.barrer()
+                self.stdout.write(self.style.SUCCESS(f'{bloqueados} lector(es) bloqueados por retraso.'))
+                if not options['cada']:
+                    break
+                time.sleep(options['cada'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,20 @@
+# core/management/commands/reconstruir_estadisticas.py
+
+from django.core.management.base import BaseCommand
+from core import estadisticas
+from core.models import EstadisticaLibro, EstadisticaMensual
+
+
+class Command(BaseCommand):
+    """
+    Recalcula los contadores del dashboard a partir de la tabla de préstamos
+    (por ejemplo tras una carga masiva con bulk_create, que no emite señales).
+    """
+    help = 'Recalcula desde cero las estadísticas de préstamos del dashboard.'
+
+    def handle(self, *args, **options):
+        estadisticas.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f'Estadísticas reconstruidas: {EstadisticaMensual.objects.count()} meses, '
+            f'{EstadisticaLibro.objects.count()} libros con préstamos.'
+        ))
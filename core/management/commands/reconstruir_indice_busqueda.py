@@ -0,0 +1,21 @@
+# core/management/commands/reconstruir_indice_busqueda.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core import busqueda
+from core.models import Libro
+
+
+class Command(BaseCommand):
+    """
+    Regenera en bloque el índice de texto completo del catálogo.
+    """
+    help = 'Reconstruye el índice de búsqueda (FTS5 en SQLite, tsvector en PostgreSQL).'
+
+    def handle(self, *args, **options):
+        if busqueda.motor() is None:
+            self.stdout.write(self.style.WARNING('El motor de base de datos no tiene índice de búsqueda; se usa icontains.'))
+            return
+        with transaction.atomic():
+            busqueda.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'Índice reconstruido ({Libro.objects.count()} libros).'))
@@ -0,0 +1,203 @@
+# core/metricas.py
+"""
+Métricas por vista: número de consultas SQL, tiempo en SQL, tiempo total y
+tamaño de la respuesta, agrupados por nombre de URL (``libro_list``,
+``gestion_prestamos``...).
+
+``MetricasMiddleware`` mide cada petición con ``connection.execute_wrapper``
+(funciona con DEBUG desactivado y sin guardar el SQL), escribe una línea
+estructurada en el logger ``biblioteca.metricas`` y acumula histogramas en
+memoria que ``/metrics/`` publica en el formato de texto de Prometheus.
+
+Los histogramas son por proceso: con varios workers, Prometheus suma lo que
+expone cada uno (o se consulta cada worker por separado).
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.db import connections
+
+logger = logging.getLogger('biblioteca.metricas')
+
+# Límites superiores de las cubetas (la de +Inf se añade al exportar)
+CUBETAS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CUBETAS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+CUBETAS_BYTES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Vistas que no se miden (el propio endpoint de métricas)
+VISTAS_EXCLUIDAS = {'metricas'}
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, cubetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.cubetas = cubetas
+        # vista -> [cuentas por cubeta (+Inf al final), suma, total]
+        self.series = {}
+
+    def observar(self, vista, valor):
+        serie = self.series.get(vista)
+        if serie is None:
+            serie = self.series[vista] = [[0] * (len(self.cubetas) + 1), 0, 0]
+        serie[0][bisect_left(self.cubetas, valor)] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    def exportar(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        for vista, (cuentas, suma, total) in sorted(self.series.items()):
+            etiqueta = _etiqueta(vista)
+            acumulado = 0
+            for limite, cuenta in zip(self.cubetas, cuentas):
+                acumulado += cuenta
+                lineas.append(f'{self.nombre}_bucket{{vista="{etiqueta}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{vista="{etiqueta}",le="+Inf"}} {total}')
+            lineas.append(f'{self.nombre}_sum{{vista="{etiqueta}"}} {suma:g}')
+            lineas.append(f'{self.nombre}_count{{vista="{etiqueta}"}} {total}')
+        return lineas
+
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Registro:
+    """Histogramas de todas las vistas del proceso, protegidos por un único lock."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self.lock:
+            self.peticiones = {}  # (vista, clase de estado) -> total
+            self.duracion = Histograma(
+                'biblioteca_peticion_segundos', 'Tiempo total de la petición.', CUBETAS_SEGUNDOS)
+            self.sql_segundos = Histograma(
+                'biblioteca_sql_segundos', 'Tiempo en consultas SQL por petición.', CUBETAS_SEGUNDOS)
+            self.sql_consultas = Histograma(
+                'biblioteca_sql_consultas', 'Consultas SQL por petición.', CUBETAS_CONSULTAS)
+            self.respuesta_bytes = Histograma(
+                'biblioteca_respuesta_bytes', 'Tamaño del cuerpo de la respuesta.', CUBETAS_BYTES)
+
+    def registrar(self, vista, estado, segundos, consultas, segundos_sql, tamano):
+        clave = (vista, f'{estado // 100}xx')
+        with self.lock:
+            self.peticiones[clave] = self.peticiones.get(clave, 0) + 1
+            self.duracion.observar(vista, segundos)
+            self.sql_segundos.observar(vista, segundos_sql)
+            self.sql_consultas.observar(vista, consultas)
+            if tamano is not None:
+                self.respuesta_bytes.observar(vista, tamano)
+
+    def exportar(self):
+        with self.lock:
+            lineas = [
+                '# HELP biblioteca_peticiones_total Peticiones atendidas por vista y clase de estado.',
+                '# TYPE biblioteca_peticiones_total counter',
+            ]
+            for (vista, estado), total in sorted(self.peticiones.items()):
+                lineas.append(f'biblioteca_peticiones_total{{vista="{_etiqueta(vista)}",estado="{estado}"}} {total}')
+            for histograma in (self.duracion, self.sql_segundos, self.sql_consultas, self.respuesta_bytes):
+                lineas.extend(histograma.exportar())
+        return '\n'.join(lineas) + '\n'
+
+
+REGISTRO = Registro()
+
+
+class ContadorSQL:
+    """Envoltorio de ``execute_wrapper``: cuenta y cronometra las consultas."""
+    def __init__(self):
+        self.consultas = 0
+        self.segundos_sql = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos_sql += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class CuerpoConCierre:
+    """
+    Envuelve el ``streaming_content`` de una respuesta y llama a ``funcion``
+    una sola vez, al agotarse el cuerpo o al cerrarse la respuesta (Django
+    llama al ``close()`` del iterador, también si el cliente corta antes).
+    Un generador con ``finally`` no basta: si nunca empezó, ``close()`` no
+    ejecuta su ``finally``.
+    """
+    def __init__(self, contenido, funcion):
+        self.contenido = iter(contenido)
+        self.funcion = funcion
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.contenido)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        funcion, self.funcion = self.funcion, None
+        if funcion:
+            funcion()
+
+
+def al_terminar(response, funcion):
+    """Llama a ``funcion`` cuando termine de enviarse la respuesta en streaming ``response``."""
+    response.streaming_content = CuerpoConCierre(response.streaming_content, funcion)
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        medicion = ContadorSQL()
+        envolturas = ExitStack()
+        for conexion in connections.all():
+            envolturas.enter_context(conexion.execute_wrapper(medicion))
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            envolturas.close()
+            raise
+        if response.streaming:
+            # El cuerpo (y sus consultas) se genera después; se cierra al terminar de enviarlo
+            al_terminar(response, lambda: self._terminar(request, response, inicio, medicion, envolturas))
+        else:
+            self._terminar(request, response, inicio, medicion, envolturas)
+        return response
+
+    def _terminar(self, request, response, inicio, medicion, envolturas):
+        envolturas.close()
+        match = getattr(request, 'resolver_match', None)
+        vista = (match.url_name or match.view_name) if match else 'sin_ruta'
+        if vista in VISTAS_EXCLUIDAS:
+            return
+        segundos = time.perf_counter() - inicio
+        if response.streaming:
+            tamano = int(response['Content-Length']) if response.has_header('Content-Length') else None
+        else:
+            tamano = len(response.content)
+        REGISTRO.registrar(vista, response.status_code, segundos, medicion.consultas, medicion.segundos_sql, tamano)
+        logger.info(
+            'vista=%s metodo=%s estado=%s sql=%d sql_ms=%.1f ms=%.1f bytes=%s',
+            vista, request.method, response.status_code, medicion.consultas,
+            medicion.segundos_sql * 1000, segundos * 1000, '-' if tamano is None else tamano,
+            extra={
+                'vista': vista, 'metodo': request.method, 'estado': response.status_code,
+                'sql_consultas': medicion.consultas, 'sql_segundos': medicion.segundos_sql,
+                'segundos': segundos, 'bytes': tamano,
+            },
+        )
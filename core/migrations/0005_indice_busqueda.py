@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# Copia congelada de core/busqueda.py al crear el índice: la migración no debe
+# cambiar si el módulo cambia después
+TABLA_FTS = 'core_libro_fts'
+TABLA_PG = 'core_libro_busqueda'
+# Pesos por columna (rank de FTS5): título/ISBN > autor > categoría > resumen
+PESOS_FTS = 'bm25(10.0, 10.0, 1.0, 5.0, 2.0)'
+
+SELECT_DOCUMENTOS = """
+    SELECT l.id, l.titulo, l.isbn, COALESCE(l.resumen, ''),
+           a.nombre || ' ' || a.apellido, COALESCE(c.nombre, '')
+    FROM core_libro l
+    INNER JOIN core_autor a ON a.id = l.autor_id
+    LEFT JOIN core_categoria c ON c.id = l.categoria_id
+"""
+
+DOCUMENTO_PG = """
+    setweight(to_tsvector('simple', d.titulo), 'A') ||
+    setweight(to_tsvector('simple', d.isbn), 'A') ||
+    setweight(to_tsvector('simple', d.autor), 'B') ||
+    setweight(to_tsvector('simple', d.categoria), 'C') ||
+    setweight(to_tsvector('simple', d.resumen), 'D')
+"""
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+                "titulo, isbn, resumen, autor, categoria, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rank) VALUES ('rank', %s)", [PESOS_FTS])
+            cursor.execute(
+                f"INSERT INTO {TABLA_FTS}(rowid, titulo, isbn, resumen, autor, categoria) {SELECT_DOCUMENTOS}"
+            )
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('optimize')")
+        elif vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLA_PG} ("
+                "libro_id bigint PRIMARY KEY REFERENCES core_libro(id) ON DELETE CASCADE "
+                "DEFERRABLE INITIALLY DEFERRED, documento tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TABLA_PG}_documento_gin ON {TABLA_PG} USING GIN (documento)"
+            )
+            cursor.execute(
+                f"INSERT INTO {TABLA_PG}(libro_id, documento) "
+                f"SELECT d.id, {DOCUMENTO_PG} FROM ({SELECT_DOCUMENTOS}) "
+                "AS d(id, titulo, isbn, resumen, autor, categoria)"
+            )
+
+
+def eliminar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+        elif vendor == 'postgresql':
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLA_PG}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_prestamo_retraso_manual'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+
+
+def calcular_estadisticas(apps, schema_editor):
+    Mensual = apps.get_model('core', 'EstadisticaMensual')
+    PorLibro = apps.get_model('core', 'EstadisticaLibro')
+    PorAutor = apps.get_model('core', 'EstadisticaAutor')
+    prestamos = apps.get_model('core', 'Prestamo').objects.order_by()
+    Mensual.objects.bulk_create(
+        Mensual(mes=f['mes'], prestamos=f['total'])
+        for f in prestamos.annotate(mes=TruncMonth('fecha_prestamo', output_field=DateField()))
+        .values('mes').annotate(total=Count('id'))
+    )
+    PorLibro.objects.bulk_create(
+        (PorLibro(libro_id=f['libro_id'], prestamos=f['total'])
+         for f in prestamos.values('libro_id').annotate(total=Count('id'))),
+        batch_size=1000,
+    )
+    PorAutor.objects.bulk_create(
+        (PorAutor(autor_id=f['libro__autor_id'], prestamos=f['total'])
+         for f in prestamos.values('libro__autor_id').annotate(total=Count('id'))),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_trabajo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primer día del mes', unique=True)),
+                ('prestamos', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EstadisticaAutor',
+            fields=[
+                ('autor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estadistica', serialize=False, to='core.autor')),
+                ('prestamos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-prestamos'], name='estadistica_autor_top_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadisticaLibro',
+            fields=[
+                ('libro', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estadistica', serialize=False, to='core.libro')),
+                ('prestamos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-prestamos'], name='estadistica_libro_top_idx')],
+            },
+        ),
+        migrations.RunPython(calcular_estadisticas, migrations.RunPython.noop),
+    ]
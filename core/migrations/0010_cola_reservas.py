@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:54
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def pasar_a_estados(apps, schema_editor):
+    """
+    atendida=True -> 'atendida'; las pendientes vigentes pasan a la cola (sin
+    plazo: el plazo ahora corre desde que se aparta el libro) y el resto, a
+    'expirada'. Si un lector tenía varias para el mismo libro, queda la más antigua.
+    """
+    Reserva = apps.get_model('core', 'Reserva')
+    ahora = timezone.now()
+    Reserva.objects.filter(atendida=True).update(estado='atendida')
+    Reserva.objects.filter(atendida=False, fecha_expiracion__lte=ahora).update(estado='expirada')
+    vistas = set()
+    repetidas = []
+    pendientes = Reserva.objects.filter(atendida=False, fecha_expiracion__gt=ahora).order_by('fecha_reserva', 'pk')
+    for pk, libro_id, usuario_id in pendientes.values_list('pk', 'libro_id', 'usuario_id'):
+        if (libro_id, usuario_id) in vistas:
+            repetidas.append(pk)
+        vistas.add((libro_id, usuario_id))
+    Reserva.objects.filter(pk__in=repetidas).update(estado='expirada')
+    pendientes.exclude(pk__in=repetidas).update(estado='en_cola', fecha_expiracion=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_correo_pendiente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='estado',
+            field=models.CharField(choices=[('en_cola', 'En cola'), ('retenida', 'Lista para retirar'), ('atendida', 'Atendida'), ('expirada', 'Expirada')], default='en_cola', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='reserva',
+            name='fecha_expiracion',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(pasar_a_estados, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='reserva',
+            name='reserva_pendiente_libro_idx',
+        ),
+        migrations.RemoveField(
+            model_name='reserva',
+            name='atendida',
+        ),
+        migrations.AlterField(
+            model_name='libro',
+            name='estado',
+            field=models.CharField(choices=[('disponible', 'Disponible'), ('prestado', 'Prestado'), ('retrasado', 'Retrasado'), ('reservado', 'Reservado')], default='disponible', max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(condition=models.Q(('estado', 'en_cola')), fields=['libro', 'fecha_reserva'], name='reserva_cola_libro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(condition=models.Q(('estado', 'retenida')), fields=['fecha_expiracion'], name='reserva_retenida_vence_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reserva',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['en_cola', 'retenida'])), fields=('libro', 'usuario'), name='reserva_viva_unica'),
+        ),
+    ]
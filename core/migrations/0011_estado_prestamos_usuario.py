@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def calcular_estado(apps, schema_editor):
+    Usuario = apps.get_model('core', 'Usuario')
+    Prestamo = apps.get_model('core', 'Prestamo')
+    activos = Prestamo.objects.filter(usuario=OuterRef('pk'), fecha_devolucion_real__isnull=True).order_by()
+    Usuario.objects.update(
+        prestamos_activos=Coalesce(
+            Subquery(activos.values('usuario').annotate(total=Count('pk')).values('total')), Value(0)
+        ),
+        vence_primero=Subquery(activos.order_by('fecha_devolucion_prevista').values('fecha_devolucion_prevista')[:1]),
+        bloqueado=Exists(activos.filter(Q(retraso_manual=True) | Q(fecha_devolucion_prevista__lt=timezone.now()))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_cola_reservas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='bloqueado',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='prestamos_activos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='vence_primero',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(calcular_estado, migrations.RunPython.noop),
+    ]
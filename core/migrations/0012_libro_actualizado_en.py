@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_estado_prestamos_usuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
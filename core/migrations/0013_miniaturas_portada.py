@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_libro_actualizado_en'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='miniaturas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='trabajo',
+            name='tipo',
+            field=models.CharField(choices=[('libros_excel', 'Libros (Excel)'), ('libros_csv', 'Libros (CSV)'), ('prestamos_pdf', 'Préstamos activos (PDF)'), ('prestamos_csv', 'Préstamos (CSV)'), ('miniaturas_portada', 'Miniaturas de portada')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_miniaturas_portada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajo',
+            name='resumen',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='trabajo',
+            name='tipo',
+            field=models.CharField(choices=[('libros_excel', 'Libros (Excel)'), ('libros_csv', 'Libros (CSV)'), ('prestamos_pdf', 'Préstamos activos (PDF)'), ('prestamos_csv', 'Préstamos (CSV)'), ('miniaturas_portada', 'Miniaturas de portada'), ('importar_libros', 'Importación de libros')], max_length=30),
+        ),
+    ]
@@ -1,5 +1,8 @@
 # core/models.py
+from django.conf import settings
 from django.db import models
+from django.db.models import Case, Count, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from datetime import timedelta
@@ -21,6 +24,23 @@ class Usuario(AbstractUser):
         help_text='Rol del usuario en el sistema'
     )
 
+    # Estado de préstamos desnormalizado (core/sanciones.py) para consultarlo
+    # desde request.user sin ir a la tabla de préstamos
+    prestamos_activos = models.PositiveIntegerField(default=0)
+    # Fecha prevista más próxima entre sus préstamos activos
+    vence_primero = models.DateTimeField(null=True, blank=True)
+    # Algún préstamo activo retrasado (por fecha o marcado a mano)
+    bloqueado = models.BooleanField(default=False)
+
+    def tiene_sancion(self, ahora=None):
+        """Sin consultas: ``vence_primero`` cubre los retrasos que el barrido aún no marcó."""
+        ahora = ahora or timezone.now()
+        return self.bloqueado or (self.vence_primero is not None and self.vence_primero < ahora)
+
+    def alcanzo_limite(self):
+        limite = settings.MAX_PRESTAMOS_LECTOR
+        return bool(limite) and self.rol == self.ROL_LECTOR and self.prestamos_activos >= limite
+
 # Requisito: CRUD de autores y categorías
 class Autor(models.Model):
     nombre = models.CharField(max_length=100)
@@ -40,11 +60,14 @@ class Libro(models.Model):
     ESTADO_DISPONIBLE = 'disponible'
     ESTADO_PRESTADO = 'prestado'
     ESTADO_RETRASADO = 'retrasado'
+    # Devuelto y apartado para la primera reserva de la cola
+    ESTADO_RESERVADO = 'reservado'
     
     ESTADO_CHOICES = [
         (ESTADO_DISPONIBLE, 'Disponible'),
         (ESTADO_PRESTADO, 'Prestado'),
         (ESTADO_RETRASADO, 'Retrasado'),
+        (ESTADO_RESERVADO, 'Reservado'),
     ]
 
     titulo = models.CharField(max_length=255)
@@ -56,18 +79,101 @@ class Libro(models.Model):
     # Nueva opción de portada subida como archivo; mantenemos portada_url para compatibilidad
     portada = models.ImageField(upload_to='portadas/', blank=True, null=True)
     portada_url = models.URLField(blank=True, null=True)
+    # Miniaturas de la portada subida: {'origen', 'anchos', 'webp', 'jpeg'} (core/portadas.py)
+    miniaturas = models.JSONField(default=dict, blank=True, editable=False)
     
     estado = models.CharField(
         max_length=15,
         choices=ESTADO_CHOICES,
         default=ESTADO_DISPONIBLE
     )
+    # Versión del libro para la caché de fragmentos y el ETag (core/fragmentos.py);
+    # los update() masivos la fijan a mano
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.titulo
 
+    def _srcset(self, formato):
+        url = self.portada.storage.url
+        return ', '.join(f'{url(nombre)} {ancho}w' for ancho, nombre in zip(self.miniaturas['anchos'], self.miniaturas[formato]))
+
+    @property
+    def srcset_webp(self):
+        return self._srcset('webp')
+
+    @property
+    def srcset_jpeg(self):
+        return self._srcset('jpeg')
+
+    @property
+    def miniatura_url(self):
+        # Para navegadores sin srcset: la primera de al menos 320 px
+        anchos = self.miniaturas['anchos']
+        indice = next((i for i, ancho in enumerate(anchos) if ancho >= 320), len(anchos) - 1)
+        return self.portada.storage.url(self.miniaturas['jpeg'][indice])
+
 # Requisito: Reservas y préstamos con control de fechas
+class PrestamoQuerySet(models.QuerySet):
+    """
+    Estado de los préstamos calculado en SQL con una única marca de tiempo,
+    en lugar de evaluar ``esta_retrasado`` fila a fila en Python.
+    """
+    def _q_retrasado(self, ahora):
+        return Q(retraso_manual=True) | Q(fecha_devolucion_prevista__lt=ahora)
+
+    def con_estado(self, ahora=None):
+        ahora = ahora or timezone.now()
+        return self.annotate(
+            estado_prestamo=Case(
+                When(fecha_devolucion_real__isnull=False, then=Value(Prestamo.ESTADO_DEVUELTO)),
+                When(self._q_retrasado(ahora), then=Value(Prestamo.ESTADO_RETRASADO)),
+                default=Value(Prestamo.ESTADO_EN_CURSO),
+                output_field=models.CharField(),
+            ),
+            # Orden de prioridad para listados: retrasados, en curso, devueltos
+            orden_estado=Case(
+                When(fecha_devolucion_real__isnull=False, then=Value(2)),
+                When(self._q_retrasado(ahora), then=Value(0)),
+                default=Value(1),
+                output_field=models.IntegerField(),
+            ),
+        )
+
+    def activos(self):
+        return self.filter(fecha_devolucion_real__isnull=True)
+
+    def devueltos(self):
+        return self.filter(fecha_devolucion_real__isnull=False)
+
+    def retrasados(self, ahora=None):
+        return self.activos().filter(self._q_retrasado(ahora or timezone.now()))
+
+    def en_curso(self, ahora=None):
+        return self.activos().exclude(self._q_retrasado(ahora or timezone.now()))
+
+    def con_estado_igual(self, estado, ahora=None):
+        """Filtra por estado con predicados directos (aprovechan los índices)."""
+        if estado == Prestamo.ESTADO_RETRASADO:
+            return self.retrasados(ahora)
+        if estado == Prestamo.ESTADO_EN_CURSO:
+            return self.en_curso(ahora)
+        if estado == Prestamo.ESTADO_DEVUELTO:
+            return self.devueltos()
+        return self
+
+
 class Prestamo(models.Model):
+    ESTADO_EN_CURSO = 'en_curso'
+    ESTADO_RETRASADO = 'retrasado'
+    ESTADO_DEVUELTO = 'devuelto'
+
+    ESTADO_CHOICES = [
+        (ESTADO_EN_CURSO, 'En curso'),
+        (ESTADO_RETRASADO, 'Retrasado'),
+        (ESTADO_DEVUELTO, 'Devuelto'),
+    ]
+
     libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='prestamos')
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='prestamos')
     
@@ -76,12 +182,37 @@ class Prestamo(models.Model):
     fecha_devolucion_real = models.DateTimeField(null=True, blank=True)
     # Permite al bibliotecario marcar retraso manualmente
     retraso_manual = models.BooleanField(default=False)
+
+    objects = PrestamoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Sanción por retraso (CrearPrestamoView, LibroDetailView)
+            models.Index(
+                fields=['usuario', 'fecha_devolucion_prevista'],
+                condition=Q(fecha_devolucion_real__isnull=True),
+                name='prestamo_usuario_activo_idx',
+            ),
+            # Recordatorios de vencimiento y reporte de préstamos activos
+            models.Index(
+                fields=['fecha_devolucion_prevista'],
+                condition=Q(fecha_devolucion_real__isnull=True),
+                name='prestamo_vence_activo_idx',
+            ),
+            # Listados paginados (gestión y "mis préstamos")
+            models.Index(fields=['fecha_devolucion_real', '-fecha_prestamo', 'id'], name='prestamo_gestion_idx'),
+            models.Index(fields=['usuario', '-fecha_prestamo'], name='prestamo_usuario_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"Préstamo de '{self.libro.titulo}' a {self.usuario.username}"
 
     @property
     def esta_retrasado(self):
+        # Si el queryset usó con_estado(), reutilizar el valor calculado en SQL
+        estado = getattr(self, 'estado_prestamo', None)
+        if estado is not None:
+            return estado == self.ESTADO_RETRASADO
         if self.fecha_devolucion_real:
             return False
         # Si se marcó manualmente, considerar retrasado
@@ -94,19 +225,211 @@ class Prestamo(models.Model):
 
 # Requisito: Reservas con control de fechas
 def default_expiration():
-    # La reserva caduca automáticamente en 3 días si no se atiende
+    # Un libro apartado para una reserva se guarda 3 días; después pasa al siguiente
     return timezone.now() + timedelta(days=3)
 
+class ReservaQuerySet(models.QuerySet):
+    def vivas(self):
+        """En cola o con el libro apartado."""
+        return self.filter(estado__in=[Reserva.ESTADO_EN_COLA, Reserva.ESTADO_RETENIDA])
+
+    def con_posicion(self):
+        """
+        Anota ``posicion_cola`` (1 = la siguiente en recibir el libro) para las
+        reservas en cola, con una subconsulta en la misma consulta.
+        """
+        delante = Reserva.objects.filter(libro=OuterRef('libro'), estado=Reserva.ESTADO_EN_COLA).filter(
+            Q(fecha_reserva__lt=OuterRef('fecha_reserva')) |
+            Q(fecha_reserva=OuterRef('fecha_reserva'), pk__lt=OuterRef('pk'))
+        ).order_by().values('libro').annotate(total=Count('pk')).values('total')
+        return self.annotate(posicion_cola=Case(
+            When(estado=Reserva.ESTADO_EN_COLA, then=Coalesce(Subquery(delante), 0) + 1),
+            default=None,
+        ))
+
 class Reserva(models.Model):
+    # en_cola -> retenida (libro apartado) -> atendida (lo retiró) o expirada (no lo retiró a tiempo)
+    ESTADO_EN_COLA = 'en_cola'
+    ESTADO_RETENIDA = 'retenida'
+    ESTADO_ATENDIDA = 'atendida'
+    ESTADO_EXPIRADA = 'expirada'
+
+    ESTADO_CHOICES = [
+        (ESTADO_EN_COLA, 'En cola'),
+        (ESTADO_RETENIDA, 'Lista para retirar'),
+        (ESTADO_ATENDIDA, 'Atendida'),
+        (ESTADO_EXPIRADA, 'Expirada'),
+    ]
+
     libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='reservas')
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='reservas')
     fecha_reserva = models.DateTimeField(default=timezone.now)
-    fecha_expiracion = models.DateTimeField(default=default_expiration)
-    atendida = models.BooleanField(default=False)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default=ESTADO_EN_COLA)
+    # Límite para retirar el libro apartado (solo en estado 'retenida')
+    fecha_expiracion = models.DateTimeField(null=True, blank=True)
+
+    objects = ReservaQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Una sola reserva viva por lector y libro
+            models.UniqueConstraint(
+                fields=['libro', 'usuario'],
+                condition=Q(estado__in=['en_cola', 'retenida']),
+                name='reserva_viva_unica',
+            ),
+        ]
+        indexes = [
+            # Cola FIFO por libro (devoluciones, posición en la cola)
+            models.Index(
+                fields=['libro', 'fecha_reserva'],
+                condition=Q(estado='en_cola'),
+                name='reserva_cola_libro_idx',
+            ),
+            # Barrido de libros apartados vencidos (barrer_reservas)
+            models.Index(
+                fields=['fecha_expiracion'],
+                condition=Q(estado='retenida'),
+                name='reserva_retenida_vence_idx',
+            ),
+            models.Index(fields=['usuario', '-fecha_reserva'], name='reserva_usuario_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Reserva de '{self.libro.titulo}' por {self.usuario.username}"
 
     @property
     def activa(self):
-        return (not self.atendida) and timezone.now() <= self.fecha_expiracion
\ No newline at end of file
+        if self.estado == self.ESTADO_RETENIDA:
+            return timezone.now() <= self.fecha_expiracion
+        return self.estado == self.ESTADO_EN_COLA
+
+# Cola de trabajos en segundo plano (reportes pesados)
+class Trabajo(models.Model):
+    TIPO_LIBROS_EXCEL = 'libros_excel'
+    TIPO_LIBROS_CSV = 'libros_csv'
+    TIPO_PRESTAMOS_PDF = 'prestamos_pdf'
+    TIPO_PRESTAMOS_CSV = 'prestamos_csv'
+    # Tarea interna sin archivo descargable (portadas grandes)
+    TIPO_MINIATURAS = 'miniaturas_portada'
+    # Importación del catálogo: el archivo es el reporte de filas rechazadas
+    TIPO_IMPORTAR_LIBROS = 'importar_libros'
+
+    TIPO_CHOICES = [
+        (TIPO_LIBROS_EXCEL, 'Libros (Excel)'),
+        (TIPO_LIBROS_CSV, 'Libros (CSV)'),
+        (TIPO_PRESTAMOS_PDF, 'Préstamos activos (PDF)'),
+        (TIPO_PRESTAMOS_CSV, 'Préstamos (CSV)'),
+        (TIPO_MINIATURAS, 'Miniaturas de portada'),
+        (TIPO_IMPORTAR_LIBROS, 'Importación de libros'),
+    ]
+
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_EN_PROCESO = 'en_proceso'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_EN_PROCESO, 'En proceso'),
+        (ESTADO_COMPLETADO, 'Completado'),
+        (ESTADO_ERROR, 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True)
+    # Hash de tipo + parámetros: dos solicitudes idénticas comparten trabajo
+    clave = models.CharField(max_length=64)
+    estado = models.CharField(max_length=15, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+    archivo = models.FileField(upload_to='reportes/', blank=True)
+    error = models.TextField(blank=True)
+    # Resultado legible (p. ej. libros creados y rechazados en una importación)
+    resumen = models.CharField(max_length=255, blank=True)
+    solicitado_por = models.ForeignKey(
+        Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name='trabajos'
+    )
+    creado = models.DateTimeField(default=timezone.now)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Como mucho un trabajo vivo por clave (deduplicación sin carreras)
+            models.UniqueConstraint(
+                fields=['clave'],
+                condition=Q(estado__in=['pendiente', 'en_proceso']),
+                name='trabajo_clave_vivo_unico',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['clave', '-creado'], name='trabajo_clave_idx'),
+            models.Index(fields=['creado'], condition=Q(estado='pendiente'), name='trabajo_pendiente_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} ({self.get_estado_display()})"
+
+# Bandeja de salida: correos que las vistas dejan pendientes y envía procesar_outbox
+class CorreoPendiente(models.Model):
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_ENVIADO = 'enviado'
+    ESTADO_FALLIDO = 'fallido'
+
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_ENVIADO, 'Enviado'),
+        (ESTADO_FALLIDO, 'Fallido'),
+    ]
+
+    asunto = models.CharField(max_length=255)
+    cuerpo = models.TextField()
+    destinatario = models.EmailField()
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    # No se intenta antes de esta fecha (reintentos con espera y reclamos en curso)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    # Lote del procesador que lo tiene reclamado
+    reclamo = models.UUIDField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    creado = models.DateTimeField(default=timezone.now)
+    enviado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['proximo_intento'], condition=Q(estado='pendiente'), name='correo_pendiente_idx'),
+            models.Index(fields=['reclamo'], name='correo_reclamo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.asunto} → {self.destinatario} ({self.get_estado_display()})"
+
+
+# Estadísticas precalculadas del dashboard (mantenidas por core/estadisticas.py)
+class EstadisticaMensual(models.Model):
+    mes = models.DateField(unique=True, help_text="Primer día del mes")
+    prestamos = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.mes:%Y-%m}: {self.prestamos} préstamos"
+
+
+class EstadisticaLibro(models.Model):
+    libro = models.OneToOneField(Libro, on_delete=models.CASCADE, primary_key=True, related_name='estadistica')
+    prestamos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['-prestamos'], name='estadistica_libro_top_idx')]
+
+    def __str__(self):
+        return f"{self.libro_id}: {self.prestamos} préstamos"
+
+
+class EstadisticaAutor(models.Model):
+    autor = models.OneToOneField(Autor, on_delete=models.CASCADE, primary_key=True, related_name='estadistica')
+    prestamos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['-prestamos'], name='estadistica_autor_top_idx')]
+
+    def __str__(self):
+        return f"{self.autor_id}: {self.prestamos} préstamos"
@@ -0,0 +1,132 @@
+# core/paginacion.py
+"""
+Paginación por cursor (keyset) para los listados.
+
+En lugar de ``OFFSET``/``COUNT(*)`` se ordena por una clave estable
+(p. ej. ``('titulo', 'id')``) y cada página pide las filas "posteriores"
+a la última mostrada, así el coste es el mismo en la página 1 que en la 1000.
+Los campos anulables se ordenan con los NULL como valor más pequeño
+(primero en orden ascendente, último en descendente) en todos los motores.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from django.http import Http404
+
+
+class PaginaCursor:
+    def __init__(self, objetos, siguiente_cursor):
+        self.objetos = objetos
+        self.siguiente_cursor = siguiente_cursor
+
+    @property
+    def tiene_mas(self):
+        return self.siguiente_cursor is not None
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+
+def _claves(modelo, orden):
+    claves = []
+    for clave in orden:
+        descendente = clave.startswith('-')
+        nombre = clave.lstrip('-')
+        try:
+            campo = modelo._meta.get_field(nombre)
+        except FieldDoesNotExist:
+            campo = None  # anotación (p. ej. 'rank' de la búsqueda)
+        claves.append((nombre, descendente, campo))
+    return claves
+
+
+def _expresiones_orden(claves):
+    expresiones = []
+    for nombre, descendente, campo in claves:
+        if campo is not None and campo.null:
+            expresiones.append(F(nombre).desc(nulls_last=True) if descendente else F(nombre).asc(nulls_first=True))
+        else:
+            expresiones.append(F(nombre).desc() if descendente else F(nombre).asc())
+    return expresiones
+
+
+def _posteriores(claves, valores):
+    """Q con las filas que van después de ``valores`` según ``claves``."""
+    nombre, descendente, campo = claves[0]
+    valor = valores[0]
+    vacio = Q(pk__in=[])
+    if campo is not None and campo.null:
+        es_nulo = Q(**{f'{nombre}__isnull': True})
+        if valor is None:
+            estricto = vacio if descendente else ~es_nulo
+            igual = es_nulo
+        else:
+            estricto = Q(**{f'{nombre}__lt': valor}) | es_nulo if descendente else Q(**{f'{nombre}__gt': valor})
+            igual = Q(**{nombre: valor})
+    else:
+        estricto = Q(**{f'{nombre}__{"lt" if descendente else "gt"}': valor})
+        igual = Q(**{nombre: valor})
+    if len(claves) == 1:
+        return estricto
+    return estricto | (igual & _posteriores(claves[1:], valores[1:]))
+
+
+def codificar_cursor(valores):
+    datos = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in valores])
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, claves):
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if not isinstance(valores, list) or len(valores) != len(claves):
+            raise ValueError
+        return [
+            campo.to_python(v) if campo is not None and v is not None else v
+            for (nombre, descendente, campo), v in zip(claves, valores)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        raise Http404('Cursor de paginación inválido.')
+
+
+def paginar(queryset, orden, cursor=None, tamano=25, valores=None):
+    """
+    Devuelve la página de ``queryset`` que sigue a ``cursor`` (o la primera).
+    ``valores(fila)`` extrae las claves de orden de la última fila cuando no
+    son atributos (p. ej. filas de ``values_list()``).
+    """
+    claves = _claves(queryset.model, orden)
+    if cursor:
+        queryset = queryset.filter(_posteriores(claves, decodificar_cursor(cursor, claves)))
+    objetos = list(queryset.order_by(*_expresiones_orden(claves))[:tamano + 1])
+    siguiente = None
+    if len(objetos) > tamano:
+        objetos = objetos[:tamano]
+        ultimo = objetos[-1]
+        if valores is None:
+            siguiente = codificar_cursor([getattr(ultimo, nombre) for nombre, _, _ in claves])
+        else:
+            siguiente = codificar_cursor(valores(ultimo))
+    return PaginaCursor(objetos, siguiente)
+
+
+class PaginacionCursorMixin:
+    """
+    Mixin para ``ListView``: sustituye el paginador por números de página
+    por uno de cursor. Deja ``page_obj`` (con ``siguiente_cursor``) en el contexto.
+    """
+    paginate_by = 25
+    orden_cursor = ('id',)
+
+    def get_orden_cursor(self):
+        return self.orden_cursor
+
+    def paginate_queryset(self, queryset, page_size):
+        pagina = paginar(queryset, self.get_orden_cursor(), self.request.GET.get('cursor'), page_size)
+        return (None, pagina, pagina.objetos, pagina.tiene_mas)
@@ -0,0 +1,127 @@
+# core/portadas.py
+"""
+Miniaturas de las portadas subidas.
+
+Cada portada se reduce con Pillow a los anchos de ``PORTADAS_ANCHOS`` en WebP
+y en JPEG (para navegadores sin WebP), sin metadatos (EXIF, perfil ICC), y se
+guardan junto al original en ``portadas/miniaturas/``. Los nombres y anchos
+quedan en ``Libro.miniaturas`` para que las plantillas armen ``srcset`` sin
+consultar el almacenamiento.
+
+Las portadas pequeñas se procesan al guardar el libro; las que superan
+``PORTADAS_MAX_SINCRONO`` bytes van a la cola de trabajos (``procesar_trabajos``).
+``python manage.py generar_miniaturas`` procesa las existentes en paralelo.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Libro
+
+CARPETA = 'portadas/miniaturas'
+
+# formato -> (formato de Pillow, opciones de guardado)
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def nombre_miniatura(original, ancho, formato):
+    base = os.path.splitext(os.path.basename(original))[0]
+    return f'{CARPETA}/{base}-{ancho}.{"jpg" if formato == "jpeg" else formato}'
+
+
+def _abrir(archivo):
+    imagen = Image.open(archivo)
+    # En JPEG decodifica directamente a escala reducida (mucho más rápido con fotos grandes)
+    mayor = max(settings.PORTADAS_ANCHOS)
+    imagen.draft('RGB', (mayor, mayor))
+    imagen = ImageOps.exif_transpose(imagen)
+    if imagen.mode in ('RGBA', 'LA', 'P'):
+        # Fondo blanco para las transparencias (JPEG no las admite)
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, 'white')
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        return fondo
+    return imagen.convert('RGB')
+
+
+def generar(nombre, storage=default_storage):
+    """
+    Crea las miniaturas de la portada ``nombre`` (ruta en el almacenamiento)
+    y devuelve el diccionario que se guarda en ``Libro.miniaturas``. No toca
+    la base de datos, así que puede ejecutarse en otro proceso.
+    """
+    with storage.open(nombre, 'rb') as archivo:
+        imagen = _abrir(archivo)
+    # Nunca se amplía: si la portada es más estrecha, su ancho es el mayor
+    anchos = sorted({min(ancho, imagen.width) for ancho in settings.PORTADAS_ANCHOS})
+    miniaturas = {'origen': nombre, 'anchos': anchos}
+    for formato in FORMATOS:
+        miniaturas[formato] = []
+    for ancho in reversed(anchos):
+        alto = max(round(imagen.height * ancho / imagen.width), 1)
+        # Cada tamaño sale del anterior, ya reducido
+        imagen = imagen.resize((ancho, alto), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for formato, (formato_pil, opciones) in FORMATOS.items():
+            salida = io.BytesIO()
+            imagen.save(salida, formato_pil, **opciones)
+            destino = nombre_miniatura(nombre, ancho, formato)
+            if storage.exists(destino):
+                storage.delete(destino)
+            miniaturas[formato].insert(0, storage.save(destino, ContentFile(salida.getvalue())))
+    return miniaturas
+
+
+def borrar(miniaturas, storage=default_storage):
+    for formato in FORMATOS:
+        for nombre in miniaturas.get(formato, []):
+            storage.delete(nombre)
+
+
+def guardar(libro_pk, miniaturas):
+    """
+    Asocia las miniaturas al libro si su portada sigue siendo la misma y borra
+    las de la portada anterior. Devuelve True si se guardaron.
+    """
+    anterior = Libro.objects.filter(pk=libro_pk).values_list('miniaturas', flat=True).first()
+    guardadas = Libro.objects.filter(pk=libro_pk, portada=miniaturas['origen']).update(
+        miniaturas=miniaturas, actualizado_en=timezone.now()
+    )
+    if not guardadas:
+        # La portada cambió mientras tanto (o el libro ya no existe)
+        borrar(miniaturas)
+        return False
+    if anterior and anterior.get('origen') != miniaturas['origen']:
+        borrar(anterior)
+    return True
+
+
+def actualizar(libro_pk, nombre):
+    return guardar(libro_pk, generar(nombre))
+
+
+def descartar(libro):
+    """El libro se quedó sin portada: borra sus miniaturas."""
+    borrar(libro.miniaturas)
+    Libro.objects.filter(pk=libro.pk).update(miniaturas={}, actualizado_en=timezone.now())
+    libro.miniaturas = {}
+
+
+def pendiente(libro):
+    return bool(libro.portada) and libro.miniaturas.get('origen') != libro.portada.name
+
+
+def es_grande(nombre, storage=default_storage):
+    return storage.size(nombre) > settings.PORTADAS_MAX_SINCRONO
+
+
+def ejecutar_trabajo(parametros):
+    """Trabajo ``miniaturas_portada`` de la cola (core/trabajos.py)."""
+    actualizar(parametros['libro'], parametros['portada'])
@@ -0,0 +1,297 @@
+# core/prestamos.py
+"""
+Operaciones de préstamo sin condiciones de carrera.
+
+Cada cambio de estado es un ``UPDATE ... WHERE <estado esperado>`` dentro de
+``transaction.atomic()``: la base de datos decide quién gana y el número de
+filas actualizadas dice si la operación procede. Funciona igual en SQLite
+(que serializa las escrituras) y en PostgreSQL (el ``UPDATE`` bloquea la fila
+y vuelve a evaluar el ``WHERE`` tras la espera), sin ``select_for_update``.
+Las operaciones en bloque bloquean primero las filas que van a cambiar
+(``select_for_update``) y hacen un solo ``UPDATE`` por tabla sobre esas filas.
+
+Cada operación deja al día el estado desnormalizado del lector
+(``sanciones.recalcular``); el límite de préstamos se respeta con un
+``UPDATE`` condicional sobre ``Usuario.prestamos_activos``.
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from . import correo, estadisticas, reservas, sanciones
+from .models import Libro, Prestamo, Reserva, Usuario
+
+DIAS_PRESTAMO = 14
+
+
+class LimitePrestamos(Exception):
+    """El lector ya tiene el máximo de préstamos activos (``MAX_PRESTAMOS_LECTOR``)."""
+
+
+def _reservar_cupo(usuario, cantidad):
+    """
+    Suma ``cantidad`` a los préstamos activos del lector solo si no supera el
+    límite; condicional, como el resto de operaciones. Devuelve False si no hay cupo.
+    """
+    limite = settings.MAX_PRESTAMOS_LECTOR
+    if not limite or usuario.rol != Usuario.ROL_LECTOR:
+        return True
+    return bool(Usuario.objects.filter(pk=usuario.pk, prestamos_activos__lte=limite - cantidad).update(
+        prestamos_activos=F('prestamos_activos') + cantidad
+    ))
+
+
+def _prestable(usuario, ahora):
+    """Libros que ``usuario`` puede llevarse: disponibles o apartados para él."""
+    apartado = Reserva.objects.filter(
+        libro=OuterRef('pk'), usuario=usuario, estado=Reserva.ESTADO_RETENIDA, fecha_expiracion__gt=ahora
+    )
+    return Q(estado=Libro.ESTADO_DISPONIBLE) | Q(Exists(apartado), estado=Libro.ESTADO_RESERVADO)
+
+
+def _atender_reservas(usuario, libro_ids):
+    """Las reservas vivas del lector sobre los libros que se lleva quedan atendidas."""
+    Reserva.objects.vivas().filter(usuario=usuario, libro_id__in=libro_ids).update(
+        estado=Reserva.ESTADO_ATENDIDA
+    )
+
+
+def prestar(libro, usuario, dias=DIAS_PRESTAMO):
+    """
+    Presta ``libro`` a ``usuario``. Devuelve el préstamo o None si no estaba
+    disponible (o estaba apartado para otro lector). Lanza ``LimitePrestamos``
+    si el lector ya tiene el máximo de préstamos activos.
+    """
+    with transaction.atomic():
+        ahora = timezone.now()
+        tomado = Libro.objects.filter(_prestable(usuario, ahora), pk=libro.pk).update(
+            estado=Libro.ESTADO_PRESTADO, actualizado_en=ahora
+        )
+        if not tomado:
+            return None
+        if not _reservar_cupo(usuario, 1):
+            # Deshace también la toma del libro
+            raise LimitePrestamos(f'Ya tienes {settings.MAX_PRESTAMOS_LECTOR} préstamos activos.')
+        libro.estado = Libro.ESTADO_PRESTADO
+        _atender_reservas(usuario, [libro.pk])
+        # post_save recalcula el estado del lector (core/signals.py)
+        prestamo = Prestamo.objects.create(
+            libro=libro,
+            usuario=usuario,
+            fecha_devolucion_prevista=timezone.now() + timedelta(days=dias),
+        )
+        # El correo sale desde la bandeja de salida (procesar_outbox), sin esperar al SMTP
+        correo.encolar(
+            'Confirmación de Préstamo - Biblioteca Digital',
+            f'Hola {usuario.first_name or usuario.username},\n\n'
+            f'Te confirmamos que has pedido prestado el libro: "{libro.titulo}".\n'
+            f'La fecha de devolución es: {prestamo.fecha_devolucion_prevista.strftime("%Y-%m-%d")}.\n\n'
+            '¡Gracias por usar la Biblioteca Digital!',
+            usuario.email,
+        )
+    return prestamo
+
+
+def devolver(prestamo_pk):
+    """Registra la devolución. Devuelve el préstamo o None si ya estaba devuelto."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        # Al devolver también se limpia el retraso marcado manualmente
+        devuelto = Prestamo.objects.filter(pk=prestamo_pk, fecha_devolucion_real__isnull=True).update(
+            fecha_devolucion_real=ahora, retraso_manual=False
+        )
+        if not devuelto:
+            return None
+        prestamo = Prestamo.objects.select_related('libro').get(pk=prestamo_pk)
+        # Queda apartado para la primera reserva de la cola, o disponible si no hay
+        retenida = reservas.retener_siguientes([prestamo.libro_id], ahora)
+        prestamo.libro.estado = Libro.ESTADO_RESERVADO if retenida else Libro.ESTADO_DISPONIBLE
+        sanciones.recalcular([prestamo.usuario_id], ahora)
+        # update() no emite post_save: los préstamos activos del dashboard cambiaron
+        estadisticas.invalidar()
+    return prestamo
+
+
+def marcar_retrasado(prestamo_pk):
+    """Marca un préstamo activo como retrasado. Devuelve el préstamo o None si ya estaba devuelto."""
+    with transaction.atomic():
+        marcado = Prestamo.objects.filter(pk=prestamo_pk, fecha_devolucion_real__isnull=True).update(
+            retraso_manual=True
+        )
+        if not marcado:
+            return None
+        prestamo = Prestamo.objects.select_related('libro').get(pk=prestamo_pk)
+        # Reflejar también el estado del libro y la sanción del lector
+        Libro.objects.filter(pk=prestamo.libro_id).update(estado=Libro.ESTADO_RETRASADO, actualizado_en=timezone.now())
+        prestamo.libro.estado = Libro.ESTADO_RETRASADO
+        Usuario.objects.filter(pk=prestamo.usuario_id).update(bloqueado=True)
+    return prestamo
+
+
+# --- Operaciones en bloque (mostrador de circulación) ---
+
+# Máximo de identificadores por operación (también acota los parámetros del IN)
+MAX_IDENTIFICADORES = 2000
+
+
+class ConflictoConcurrente(Exception):
+    """Otra operación cambió los mismos libros a mitad; se deshace todo."""
+
+
+def leer_identificadores(texto):
+    """Separa el texto pegado/escaneado (líneas, espacios, comas o punto y coma)."""
+    return [t for t in re.split(r'[\s,;]+', texto or '') if t]
+
+
+def _clasificar(identificadores):
+    """
+    Devuelve ``(ids, isbns, resultados)``: ``resultados`` tiene una entrada por
+    identificador, en el orden recibido; los repetidos o inválidos ya quedan resueltos.
+    Un número de 10 o más dígitos (se admiten guiones) se toma como ISBN.
+    """
+    ids, isbns, resultados, vistos = set(), set(), [], set()
+    for original in identificadores:
+        limpio = original.replace('-', '').strip()
+        resultado = {'identificador': original, 'ok': False, 'detalle': '', 'titulo': ''}
+        resultados.append(resultado)
+        if not limpio.isdigit():
+            resultado['detalle'] = 'Identificador inválido.'
+        elif limpio in vistos:
+            resultado['detalle'] = 'Repetido en la lista.'
+        elif len(limpio) >= 10:
+            isbns.add(limpio)
+        else:
+            ids.add(int(limpio))
+        vistos.add(limpio)
+        resultado['clave'] = limpio
+    return ids, isbns, resultados
+
+
+def devolver_varios(identificadores):
+    """
+    Devuelve de una vez los préstamos indicados por id de préstamo o ISBN del
+    libro. Devuelve un resultado por identificador (``ok``, ``detalle``, ``titulo``).
+    """
+    ids, isbns, resultados = _clasificar(identificadores)
+    ahora = timezone.now()
+    filtro = Q(pk__in=ids) | Q(libro__isbn__in=isbns)
+    with transaction.atomic():
+        # Los activos, bloqueados (en PostgreSQL una devolución simultánea de los mismos
+        # espera y ya no los ve activos); se cierran exactamente esos
+        devueltos = list(
+            Prestamo.objects.activos().select_for_update(of=('self',)).filter(filtro)
+            .values_list('pk', 'libro_id', 'libro__isbn', 'libro__titulo', 'usuario_id')
+        )
+        Prestamo.objects.filter(pk__in=[fila[0] for fila in devueltos]).update(
+            fecha_devolucion_real=ahora, retraso_manual=False
+        )
+        retenidas = reservas.retener_siguientes({fila[1] for fila in devueltos}, ahora)
+        if devueltos:
+            sanciones.recalcular({fila[4] for fila in devueltos}, ahora)
+            estadisticas.invalidar()
+
+    avisados = {r.libro_id: r.usuario.username for r in retenidas}
+    por_id = {fila[0]: fila for fila in devueltos}
+    por_isbn = {fila[2]: fila for fila in devueltos}
+    for resultado in resultados:
+        if resultado['detalle']:
+            continue
+        clave = resultado['clave']
+        fila = por_isbn.get(clave) if len(clave) >= 10 else por_id.get(int(clave))
+        if fila is None:
+            resultado['detalle'] = 'No hay un préstamo activo con ese identificador.'
+            continue
+        resultado['ok'] = True
+        resultado['titulo'] = fila[3]
+        resultado['detalle'] = 'Devuelto.'
+        if fila[1] in avisados:
+            resultado['detalle'] += f' Apartado para {avisados[fila[1]]} (reserva).'
+    return resultados
+
+
+def prestar_varios(usuario, identificadores, dias=DIAS_PRESTAMO):
+    """
+    Presta a ``usuario`` los libros indicados por id o ISBN que estén
+    disponibles o apartados para él. Devuelve un resultado por identificador.
+    """
+    ids, isbns, resultados = _clasificar(identificadores)
+    ahora = timezone.now()
+    if usuario.rol == Usuario.ROL_LECTOR and usuario.tiene_sancion(ahora):
+        for resultado in resultados:
+            resultado['detalle'] = resultado['detalle'] or 'El lector tiene una sanción activa por retraso.'
+        return resultados
+
+    with transaction.atomic():
+        # En PostgreSQL bloquea las filas; SQLite ya serializa las escrituras
+        candidatos = list(
+            Libro.objects.select_for_update()
+            .filter(_prestable(usuario, ahora), Q(pk__in=ids) | Q(isbn__in=isbns))
+            .values_list('pk', 'isbn', 'titulo', 'autor_id')
+        )
+        fuera_de_limite = set()
+        limite = settings.MAX_PRESTAMOS_LECTOR
+        if limite and usuario.rol == Usuario.ROL_LECTOR:
+            # Lo que no cabe en el límite queda fuera (se informa abajo): lo último de la
+            # lista, con el contador releído aquí, el mismo que comprobará _reservar_cupo
+            posicion = {r['clave']: i for i, r in enumerate(resultados) if not r['detalle']}
+            candidatos.sort(key=lambda fila: min(posicion.get(str(fila[0]), len(resultados)),
+                                                 posicion.get(fila[1], len(resultados))))
+            usuario.prestamos_activos = (
+                Usuario.objects.select_for_update().filter(pk=usuario.pk)
+                .values_list('prestamos_activos', flat=True).get()
+            )
+            cupo = max(limite - usuario.prestamos_activos, 0)
+            for pk, isbn, _, _ in candidatos[cupo:]:
+                fuera_de_limite.update((str(pk), isbn))
+            candidatos = candidatos[:cupo]
+        tomados = Libro.objects.filter(
+            _prestable(usuario, ahora), pk__in=[pk for pk, _, _, _ in candidatos]
+        ).update(estado=Libro.ESTADO_PRESTADO, actualizado_en=ahora)
+        if tomados != len(candidatos):
+            raise ConflictoConcurrente('Otro préstamo tomó alguno de los libros; inténtalo de nuevo.')
+        if not _reservar_cupo(usuario, len(candidatos)):
+            raise ConflictoConcurrente('El lector recibió otros préstamos a la vez; inténtalo de nuevo.')
+        _atender_reservas(usuario, [pk for pk, _, _, _ in candidatos])
+        prevista = ahora + timedelta(days=dias)
+        Prestamo.objects.bulk_create([
+            Prestamo(libro_id=pk, usuario=usuario, fecha_prestamo=ahora, fecha_devolucion_prevista=prevista)
+            for pk, _, _, _ in candidatos
+        ])
+        # bulk_create no emite post_save: se actualizan las estadísticas y el lector aquí
+        estadisticas.registrar_varios(ahora, [(pk, autor_id) for pk, _, _, autor_id in candidatos])
+        sanciones.recalcular([usuario.pk], ahora)
+        if candidatos:
+            correo.encolar(
+                'Confirmación de Préstamo - Biblioteca Digital',
+                f'Hola {usuario.first_name or usuario.username},\n\n'
+                'Te confirmamos el préstamo de los siguientes libros:\n'
+                + ''.join(f'- "{titulo}"\n' for _, _, titulo, _ in candidatos)
+                + f'\nLa fecha de devolución es: {prevista.strftime("%Y-%m-%d")}.\n\n'
+                '¡Gracias por usar la Biblioteca Digital!',
+                usuario.email,
+            )
+
+    por_id = {fila[0]: fila for fila in candidatos}
+    por_isbn = {fila[1]: fila for fila in candidatos}
+    for resultado in resultados:
+        if resultado['detalle']:
+            continue
+        clave = resultado['clave']
+        fila = por_isbn.get(clave) if len(clave) >= 10 else por_id.get(int(clave))
+        if fila is None:
+            resultado['detalle'] = (
+                'Supera el límite de préstamos activos del lector.' if clave in fuera_de_limite
+                else 'Libro inexistente, no disponible o apartado para otro lector.'
+            )
+            continue
+        # El mismo libro pedido por id y por ISBN solo se presta una vez
+        por_id.pop(fila[0], None)
+        por_isbn.pop(fila[1], None)
+        resultado['ok'] = True
+        resultado['titulo'] = fila[2]
+        resultado['detalle'] = f'Prestado hasta el {prevista.strftime("%Y-%m-%d")}.'
+    return resultados
@@ -0,0 +1,265 @@
+# core/reportes.py
+"""
+Generación de reportes del sistema.
+
+Las filas se leen con ``values_list().iterator()`` (sin instanciar modelos
+y por bloques), de modo que la memoria usada no depende del tamaño del catálogo.
+"""
+import csv
+
+from . import busqueda
+from .models import Libro, Prestamo
+
+# Filas que se piden a la base de datos en cada ida y vuelta
+TAMANO_BLOQUE = 2000
+
+ESTADOS_LIBRO = dict(Libro.ESTADO_CHOICES)
+
+CABECERA_LIBROS = ['Titulo', 'Autor', 'Categoria', 'ISBN', 'Estado']
+CABECERA_PRESTAMOS = ['Libro', 'Usuario', 'FechaPrestamo', 'DevolucionPrevista', 'DevolucionReal', 'Retrasado']
+
+
+def _fecha(valor):
+    return valor.strftime('%Y-%m-%d') if valor else ''
+
+
+# --- Filas de cada reporte ---
+
+def filas_libros(params=None):
+    """Libros del catálogo con los mismos filtros que ``LibroListView``."""
+    qs = busqueda.filtrar_catalogo(Libro.objects.all(), params or {})
+    filas = qs.values_list(
+        'titulo', 'autor__nombre', 'autor__apellido', 'categoria__nombre', 'isbn', 'estado'
+    ).iterator(chunk_size=TAMANO_BLOQUE)
+    for titulo, nombre, apellido, categoria, isbn, estado in filas:
+        yield [titulo, f'{nombre} {apellido}', categoria or '', isbn, ESTADOS_LIBRO.get(estado, estado)]
+
+
+def filas_prestamos():
+    filas = Prestamo.objects.con_estado().order_by('-fecha_prestamo').values_list(
+        'libro__titulo', 'usuario__username', 'fecha_prestamo',
+        'fecha_devolucion_prevista', 'fecha_devolucion_real', 'estado_prestamo',
+    ).iterator(chunk_size=TAMANO_BLOQUE)
+    for titulo, username, prestado, prevista, real, estado in filas:
+        yield [
+            titulo, username, _fecha(prestado), _fecha(prevista), _fecha(real),
+            'SI' if estado == Prestamo.ESTADO_RETRASADO else 'NO',
+        ]
+
+
+# --- CSV ---
+
+class _Eco:
+    """Pseudo-archivo: ``csv.writer`` devuelve la línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(cabecera, filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(cabecera)
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+def escribir_csv(salida, cabecera, filas):
+    """Vuelca el CSV en un archivo binario (usado por la cola de trabajos)."""
+    for linea in lineas_csv(cabecera, filas):
+        salida.write(linea.encode('utf-8'))
+
+
+# --- Excel ---
+
+CABECERA_LIBROS_EXCEL = ['Título', 'Autor', 'Categoría', 'ISBN', 'Estado']
+
+
+def escribir_libros_excel(salida, params=None):
+    """
+    Escribe el reporte de libros en ``salida`` usando el modo de solo escritura
+    de openpyxl: las filas se vuelcan a disco a medida que llegan, sin
+    cargar la hoja completa en memoria.
+    """
+    from openpyxl import Workbook
+
+    libro_excel = Workbook(write_only=True)
+    hoja = libro_excel.create_sheet('Libros')
+    hoja.append(CABECERA_LIBROS_EXCEL)
+    for fila in filas_libros(params):
+        hoja.append(fila)
+    libro_excel.save(salida)
+
+
+# --- PDF ---
+# Una sola tabla gigante es muy lenta de maquetar en reportlab (crece más que
+# linealmente con las filas). Se parte en tablas de FILAS_POR_TABLA filas con la
+# cabecera repetida y un único TableStyle compartido, y se dibujan página a
+# página con Frame.add/Frame.split (API pública de platypus) a medida que el
+# generador las produce: nunca hay más de una tabla en memoria.
+
+FILAS_POR_TABLA = 32
+ANCHOS_PDF = [190, 110, 80, 90, 70]
+CABECERA_PDF = ['Libro', 'Usuario (Lector)', 'Fecha Préstamo', 'Devolución Prevista', 'Estado']
+AGRUPACIONES_PDF = ('dia', 'categoria')
+MARGEN_PDF = 36
+# Relleno horizontal de las celdas de Table (LEFTPADDING + RIGHTPADDING)
+RELLENO_CELDA = 12
+
+
+def _partir_lineas(texto, ancho, fuente='Helvetica', tamano=9):
+    """Parte ``texto`` en líneas de como mucho ``ancho`` puntos (por palabras y, si no basta, por letras)."""
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    if stringWidth(texto, fuente, tamano) <= ancho:
+        return [texto]
+    lineas = []
+    for linea in simpleSplit(texto, fuente, tamano, ancho) or ['']:
+        while stringWidth(linea, fuente, tamano) > ancho and len(linea) > 1:
+            corte = len(linea) - 1
+            while corte > 1 and stringWidth(linea[:corte], fuente, tamano) > ancho:
+                corte -= 1
+            lineas.append(linea[:corte])
+            linea = linea[corte:]
+        lineas.append(linea)
+    return lineas
+
+
+def _maquetar(salida, flowables, pagesize):
+    """Dibuja ``flowables`` (un iterable) en páginas de ``pagesize`` y guarda el PDF."""
+    from reportlab.pdfgen.canvas import Canvas
+    from reportlab.platypus import Frame
+    from reportlab.platypus.doctemplate import LayoutError
+
+    ancho, alto = pagesize
+    lienzo = Canvas(salida, pagesize=pagesize)
+
+    def nuevo_marco():
+        return Frame(MARGEN_PDF, MARGEN_PDF, ancho - 2 * MARGEN_PDF, alto - 2 * MARGEN_PDF)
+
+    def cabe_con_siguiente(actual, siguiente):
+        """Si ``actual`` y el principio de ``siguiente`` caben en lo que queda de página."""
+        ancho_util = marco._getAvailableWidth()
+        libre = marco._y - marco._y1p - actual.getSpaceBefore()
+        libre -= actual.wrapOn(lienzo, ancho_util, libre)[1] + actual.getSpaceAfter()
+        if libre <= 0:
+            return False
+        return siguiente.wrapOn(lienzo, ancho_util, libre)[1] <= libre or bool(
+            siguiente.splitOn(lienzo, ancho_util, libre)
+        )
+
+    marco, vacio = nuevo_marco(), True
+    flowables = iter(flowables)
+    siguiente = next(flowables, None)
+    while siguiente is not None:
+        cola, siguiente = [siguiente], next(flowables, None)
+        while cola:
+            actual = cola.pop(0)
+            # Frame no aplica keepWithNext (lo hace SimpleDocTemplate): un título
+            # que no cabe con el principio de lo que le sigue pasa a otra página
+            if (not vacio and not cola and siguiente is not None and actual.getKeepWithNext()
+                    and not cabe_con_siguiente(actual, siguiente)):
+                lienzo.showPage()
+                marco, vacio = nuevo_marco(), True
+            if marco.add(actual, lienzo, trySplit=1):
+                vacio = False
+                continue
+            # No cabe entero: lo que quepa en esta página y el resto en la siguiente
+            partes = marco.split(actual, lienzo)
+            if len(partes) > 1:
+                cola[:0] = partes
+            elif vacio:
+                raise LayoutError(f'{actual.__class__.__name__} no cabe en una página vacía.')
+            else:
+                lienzo.showPage()
+                marco, vacio = nuevo_marco(), True
+                cola.insert(0, actual)
+    lienzo.showPage()
+    lienzo.save()
+
+
+def renderizar_prestamos_pdf(salida, filas):
+    """
+    Maqueta el PDF a partir de ``filas`` = (titulo, usuario, prestado, prevista,
+    estado, seccion). Cuando cambia ``seccion`` se abre un nuevo apartado con título.
+    Los títulos y usuarios que no caben en su columna ocupan varias líneas.
+    """
+    from xml.sax.saxutils import escape
+
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import Paragraph, Table, TableStyle
+
+    # El título de un apartado no se queda solo al pie de la página
+    estilo_seccion = ParagraphStyle('Seccion', parent=getSampleStyleSheet()['Heading3'], keepWithNext=1)
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ])
+
+    def celda(texto, ancho):
+        # Varias líneas en una celda de texto: Table las maqueta mucho más rápido que un Paragraph
+        return '\n'.join(_partir_lineas(texto or '', ancho - RELLENO_CELDA))
+
+    def tabla(bloque):
+        t = Table([CABECERA_PDF] + bloque, colWidths=ANCHOS_PDF, repeatRows=1)
+        t.setStyle(table_style)
+        return t
+
+    def flowables():
+        bloque = []
+        seccion_actual = object()
+        vistas = 0
+        for titulo, username, prestado, prevista, estado, seccion in filas:
+            vistas += 1
+            if seccion != seccion_actual:
+                if bloque:
+                    yield tabla(bloque)
+                    bloque = []
+                if seccion is not None:
+                    yield Paragraph(escape(str(seccion)), estilo_seccion)
+                seccion_actual = seccion
+            bloque.append([
+                celda(titulo, ANCHOS_PDF[0]),
+                celda(username, ANCHOS_PDF[1]),
+                _fecha(prestado),
+                _fecha(prevista),
+                "Retrasado" if estado == Prestamo.ESTADO_RETRASADO else "En curso",
+            ])
+            if len(bloque) == FILAS_POR_TABLA:
+                yield tabla(bloque)
+                bloque = []
+        # Sin préstamos activos se deja solo la cabecera, como antes
+        if bloque or not vistas:
+            yield tabla(bloque)
+
+    _maquetar(salida, flowables(), letter)
+
+
+def escribir_prestamos_pdf(salida, agrupar=None):
+    """Reporte PDF de préstamos activos, opcionalmente por día de vencimiento o categoría."""
+    qs = Prestamo.objects.activos().con_estado()
+    campos = ['libro__titulo', 'usuario__username', 'fecha_prestamo', 'fecha_devolucion_prevista', 'estado_prestamo']
+    if agrupar == 'categoria':
+        qs = qs.order_by('libro__categoria__nombre', 'fecha_devolucion_prevista')
+        campos.append('libro__categoria__nombre')
+    else:
+        qs = qs.order_by('fecha_devolucion_prevista')
+    filas = qs.values_list(*campos).iterator(chunk_size=TAMANO_BLOQUE)
+
+    def con_seccion():
+        for fila in filas:
+            if agrupar == 'categoria':
+                yield fila[:5] + (f'Categoría: {fila[5] or "Sin categoría"}',)
+            elif agrupar == 'dia':
+                yield fila + (f'Vencen el {_fecha(fila[3])}',)
+            else:
+                yield fila + (None,)
+
+    renderizar_prestamos_pdf(salida, con_seccion())
@@ -0,0 +1,98 @@
+# core/reservas.py
+"""
+Cola de reservas por libro.
+
+Cada libro tiene una cola FIFO (``estado='en_cola'``, por ``fecha_reserva``).
+Cuando el libro se devuelve, ``retener_siguientes`` lo aparta para la primera
+reserva de la cola (``'retenida'``, con plazo para retirarlo) y el libro pasa
+a 'reservado': solo ese lector puede llevárselo. ``barrer`` (comando
+``barrer_reservas``) vence en un solo ``UPDATE`` los apartados sin retirar y
+pasa el libro a la siguiente reserva.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from . import correo
+from .models import Libro, Reserva, default_expiration
+
+
+def reservar(libro, usuario):
+    """Pone al lector en la cola del libro. Devuelve ``(reserva, creada)``."""
+    existente = Reserva.objects.vivas().filter(libro=libro, usuario=usuario).first()
+    if existente:
+        return existente, False
+    try:
+        with transaction.atomic():
+            return Reserva.objects.create(libro=libro, usuario=usuario), True
+    except IntegrityError:
+        # Doble envío simultáneo: la restricción reserva_viva_unica dejó pasar solo una
+        return Reserva.objects.vivas().get(libro=libro, usuario=usuario), False
+
+
+def aviso_retenida(reserva, titulo):
+    """``(asunto, cuerpo, destinatario)`` del aviso de libro apartado."""
+    return (
+        'Tu reserva está disponible',
+        f'Hola {reserva.usuario.first_name or reserva.usuario.username},\n\n'
+        f'El libro "{titulo}" ya está disponible para préstamo. '
+        f'Tienes hasta {reserva.fecha_expiracion.strftime("%Y-%m-%d %H:%M")} para recogerlo.',
+        reserva.usuario.email,
+    )
+
+
+def retener_siguientes(libro_ids, ahora=None):
+    """
+    Para libros que acaban de quedar libres (devueltos o con el apartado
+    vencido): aparta cada uno para la primera reserva de su cola y lo marca
+    'reservado'; los que no tienen cola vuelven a 'disponible'. Llamar dentro
+    de una transacción. Devuelve las reservas retenidas.
+    """
+    ahora = ahora or timezone.now()
+    libro_ids = set(libro_ids)
+    if not libro_ids:
+        return []
+    ya_retenido = Reserva.objects.filter(libro=OuterRef('libro'), estado=Reserva.ESTADO_RETENIDA)
+    # La cabeza de cada cola en una sola consulta
+    primeras = list(
+        Reserva.objects.filter(libro_id__in=libro_ids, estado=Reserva.ESTADO_EN_COLA)
+        .exclude(Exists(ya_retenido))
+        .annotate(turno=Window(RowNumber(), partition_by=F('libro_id'), order_by=[F('fecha_reserva'), F('pk')]))
+        .filter(turno=1)
+        .select_related('usuario', 'libro')
+    )
+    plazo = default_expiration()
+    Reserva.objects.filter(pk__in=[r.pk for r in primeras], estado=Reserva.ESTADO_EN_COLA).update(
+        estado=Reserva.ESTADO_RETENIDA, fecha_expiracion=plazo
+    )
+    for reserva in primeras:
+        reserva.estado, reserva.fecha_expiracion = Reserva.ESTADO_RETENIDA, plazo
+
+    retenidos = set(
+        Reserva.objects.filter(libro_id__in=libro_ids, estado=Reserva.ESTADO_RETENIDA).values_list('libro_id', flat=True)
+    )
+    # La versión de los libros usa la hora real aunque ``ahora`` sea otra (core/fragmentos.py)
+    marca = timezone.now()
+    Libro.objects.filter(pk__in=retenidos).update(estado=Libro.ESTADO_RESERVADO, actualizado_en=marca)
+    Libro.objects.filter(pk__in=libro_ids - retenidos).update(estado=Libro.ESTADO_DISPONIBLE, actualizado_en=marca)
+    correo.encolar_varios([aviso_retenida(r, r.libro.titulo) for r in primeras])
+    return primeras
+
+
+def barrer(ahora=None):
+    """
+    Vence los apartados cuyo plazo pasó y aparta esos libros para la
+    siguiente reserva de su cola. Devuelve ``(expiradas, promovidas)``.
+    """
+    ahora = ahora or timezone.now()
+    with transaction.atomic():
+        vencidas = Reserva.objects.filter(estado=Reserva.ESTADO_RETENIDA, fecha_expiracion__lte=ahora)
+        libro_ids = set(vencidas.values_list('libro_id', flat=True))
+        expiradas = vencidas.filter(libro_id__in=libro_ids).update(estado=Reserva.ESTADO_EXPIRADA)
+        # Solo los libros que seguían apartados; si alguien se los llevó ya no están 'reservado'
+        libro_ids = set(
+            Libro.objects.filter(pk__in=libro_ids, estado=Libro.ESTADO_RESERVADO).values_list('pk', flat=True)
+        )
+        promovidas = retener_siguientes(libro_ids, ahora)
+    return expiradas, len(promovidas)
@@ -0,0 +1,119 @@
+# core/routers.py
+"""
+Lecturas pesadas a la réplica y todo lo demás a la base principal.
+
+Si existe el alias ``replica`` (``DATABASE_REPLICA_URL``), ``ReplicaMiddleware``
+marca las peticiones GET de las vistas de ``VISTAS_REPLICA`` (dashboard,
+listados, exportaciones y API) y ``RouterReplica`` envía sus lecturas a la réplica.
+Todo lo demás va a ``default``:
+
+- las escrituras, y cualquier lectura posterior a una escritura en la misma
+  petición o tarea;
+- las peticiones de un navegador que escribió hace menos de
+  ``REPLICA_RETRASO_SEGUNDOS`` (cookie ``primaria_hasta``), para que vea sus
+  propios cambios aunque la réplica vaya con retraso;
+- usuarios y sesiones, que se leen en cada petición y no admiten retraso.
+
+El estado vive en un ``ContextVar``, así sirve igual con hilos o con ASGI.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .metricas import al_terminar
+
+ALIAS_REPLICA = 'replica'
+
+# Nombres de URL cuyas lecturas admiten unos segundos de retraso
+VISTAS_REPLICA = {
+    'dashboard_bibliotecario', 'libro_list', 'gestion_prestamos', 'mis_prestamos', 'mis_reservas',
+    'autor_list', 'categoria_list',
+    'reporte_libros_excel', 'reporte_prestamos_pdf', 'reporte_libros_csv', 'reporte_prestamos_csv',
+    'api_libros', 'api_libro', 'api_autores', 'api_categorias', 'api_autocompletar',
+}
+
+# Apps que siempre se leen de la principal (sesión y usuario de cada petición)
+APPS_PRIMARIA = {'sessions', 'auth', 'contenttypes'}
+
+COOKIE_PRIMARIA = 'primaria_hasta'
+
+# (leer de la réplica, ya se escribió en este contexto)
+_estado = ContextVar('estado_replica', default=(False, False))
+
+
+def replica_configurada():
+    return ALIAS_REPLICA in settings.DATABASES
+
+
+def activar_replica(activa=True):
+    _estado.set((activa, False))
+
+
+@contextmanager
+def leer_de_replica():
+    """Para tareas fuera de una petición (p. ej. reportes en segundo plano)."""
+    anterior = _estado.get()
+    activar_replica()
+    try:
+        yield
+    finally:
+        _estado.set(anterior)
+
+
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        replica, escribio = _estado.get()
+        if not replica or escribio or not replica_configurada():
+            return 'default'
+        if model._meta.app_label in APPS_PRIMARIA or model._meta.label == settings.AUTH_USER_MODEL:
+            return 'default'
+        return ALIAS_REPLICA
+
+    def db_for_write(self, model, **hints):
+        # A partir de aquí, leer lo recién escrito exige la principal
+        replica, _ = _estado.get()
+        if replica:
+            _estado.set((replica, True))
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mismos datos en ambos alias
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        activar_replica(False)
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and replica_configurada():
+            # Las próximas peticiones de este navegador leen su propia escritura
+            hasta = int(time.time()) + settings.REPLICA_RETRASO_SEGUNDOS
+            response.set_cookie(COOKIE_PRIMARIA, str(hasta), max_age=settings.REPLICA_RETRASO_SEGUNDOS,
+                                httponly=True, samesite='Lax')
+        if response.streaming:
+            # El cuerpo (y sus consultas) se genera después; se desactiva al terminar de enviarlo
+            al_terminar(response, lambda: activar_replica(False))
+        else:
+            activar_replica(False)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or not replica_configurada():
+            return None
+        if request.resolver_match.url_name not in VISTAS_REPLICA:
+            return None
+        try:
+            reciente = int(request.COOKIES.get(COOKIE_PRIMARIA, 0)) > time.time()
+        except ValueError:
+            reciente = False
+        if not reciente:
+            activar_replica()
+        return None
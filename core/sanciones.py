@@ -0,0 +1,42 @@
+# core/sanciones.py
+"""
+Estado de préstamos de cada lector guardado en ``Usuario``
+(``prestamos_activos``, ``vence_primero``, ``bloqueado``).
+
+Así la comprobación de sanción y del límite de préstamos lee ``request.user``,
+que ya viene cargado, en lugar de consultar la tabla de préstamos. Los campos
+se recalculan en un solo ``UPDATE`` al prestar, devolver o marcar un retraso
+(``recalcular``), y el comando ``recalcular_sanciones`` marca como bloqueados a
+los lectores cuyos préstamos acaban de vencer.
+"""
+from django.apps import apps as apps_globales
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def recalcular(usuario_ids=None, ahora=None):
+    """
+    Recalcula los campos desde los préstamos activos, para ``usuario_ids`` o
+    para todos si es None. Devuelve el número de usuarios actualizados.
+    """
+    Usuario = apps_globales.get_model('core', 'Usuario')
+    Prestamo = apps_globales.get_model('core', 'Prestamo')
+    ahora = ahora or timezone.now()
+    activos = Prestamo.objects.filter(usuario=OuterRef('pk'), fecha_devolucion_real__isnull=True).order_by()
+    usuarios = Usuario.objects.all() if usuario_ids is None else Usuario.objects.filter(pk__in=usuario_ids)
+    return usuarios.update(
+        prestamos_activos=Coalesce(
+            Subquery(activos.values('usuario').annotate(total=Count('pk')).values('total')), Value(0)
+        ),
+        vence_primero=Subquery(activos.order_by('fecha_devolucion_prevista').values('fecha_devolucion_prevista')[:1]),
+        # Mismo criterio que PrestamoQuerySet.retrasados()
+        bloqueado=Exists(activos.filter(Q(retraso_manual=True) | Q(fecha_devolucion_prevista__lt=ahora))),
+    )
+
+
+def barrer(ahora=None):
+    """Bloquea a los lectores con algún préstamo recién vencido. Devuelve cuántos."""
+    Usuario = apps_globales.get_model('core', 'Usuario')
+    ahora = ahora or timezone.now()
+    return Usuario.objects.filter(bloqueado=False, vence_primero__lt=ahora).update(bloqueado=True)
@@ -0,0 +1,149 @@
+# core/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import autocompletar, busqueda, estadisticas, fragmentos, portadas, sanciones, trabajos
+from .models import Autor, Categoria, Libro, Prestamo, Trabajo, Usuario
+
+
+# --- Sincronización del índice de búsqueda ---
+
+@receiver(post_save, sender=Libro)
+def indexar_libro(sender, instance, raw=False, **kwargs):
+    if not raw:
+        busqueda.indexar_libros([instance.pk])
+
+
+@receiver(post_delete, sender=Libro)
+def desindexar_libro(sender, instance, **kwargs):
+    busqueda.desindexar_libro(instance.pk)
+
+
+@receiver(post_save, sender=Autor)
+def indexar_libros_de_autor(sender, instance, created=False, raw=False, **kwargs):
+    # Un autor recién creado todavía no tiene libros
+    if not raw and not created:
+        busqueda.indexar_por_autor(instance.pk)
+
+
+@receiver(post_save, sender=Categoria)
+def indexar_libros_de_categoria(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        busqueda.indexar_por_categoria(instance.pk)
+
+
+@receiver(pre_delete, sender=Categoria)
+def recordar_libros_de_categoria(sender, instance, **kwargs):
+    # Los libros quedan con categoría NULL (SET_NULL) sin emitir señales
+    instance._libros_afectados = list(instance.libros.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Categoria)
+def reindexar_libros_sin_categoria(sender, instance, **kwargs):
+    busqueda.indexar_libros(getattr(instance, '_libros_afectados', []))
+
+
+# --- Estadísticas del dashboard ---
+
+@receiver(post_save, sender=Prestamo)
+def contar_prestamo(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        estadisticas.registrar_prestamo(instance)
+    # Una devolución también cambia los préstamos activos
+    estadisticas.invalidar()
+
+
+@receiver(post_delete, sender=Prestamo)
+def descontar_prestamo(sender, instance, **kwargs):
+    estadisticas.descontar_prestamo(instance)
+    estadisticas.invalidar()
+
+
+@receiver(post_save, sender=Libro)
+@receiver(post_delete, sender=Libro)
+@receiver(post_save, sender=Autor)
+@receiver(post_delete, sender=Autor)
+def invalidar_estadisticas(sender, raw=False, **kwargs):
+    if not raw:
+        estadisticas.invalidar()
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_estadisticas_usuario(sender, update_fields=None, **kwargs):
+    # El login solo guarda last_login (update_fields); eso no cambia los totales
+    if update_fields is None and not kwargs.get('raw'):
+        estadisticas.invalidar()
+
+
+# --- Estado de préstamos del lector (sanción y límite) ---
+
+@receiver(post_save, sender=Prestamo)
+@receiver(post_delete, sender=Prestamo)
+def recalcular_lector(sender, instance, raw=False, **kwargs):
+    # Préstamos creados o editados fuera de core/prestamos.py (admin, borrado en cascada)
+    if not raw:
+        sanciones.recalcular([instance.usuario_id])
+
+
+# --- Versión de los libros (caché de fragmentos y ETag) ---
+
+@receiver(post_save, sender=Autor)
+def tocar_libros_de_autor(sender, instance, created=False, raw=False, **kwargs):
+    # La tarjeta y la ficha muestran el nombre del autor
+    if not raw and not created:
+        fragmentos.tocar_libros(Libro.objects.filter(autor_id=instance.pk))
+
+
+@receiver(post_save, sender=Categoria)
+def tocar_libros_de_categoria(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        fragmentos.tocar_libros(Libro.objects.filter(categoria_id=instance.pk))
+
+
+@receiver(post_delete, sender=Categoria)
+def tocar_libros_sin_categoria(sender, instance, **kwargs):
+    fragmentos.tocar_libros(Libro.objects.filter(pk__in=getattr(instance, '_libros_afectados', [])))
+
+
+# --- Autocompletado ---
+
+@receiver(post_save, sender=Autor)
+@receiver(post_delete, sender=Autor)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Libro)
+def invalidar_autocompletado(sender, raw=False, **kwargs):
+    # Los cambios de título ya cambian la versión del catálogo (actualizado_en)
+    if not raw:
+        autocompletar.invalidar()
+
+
+# --- Miniaturas de portada ---
+
+def _generar_miniaturas(libro_pk, nombre):
+    if portadas.es_grande(nombre):
+        trabajos.encolar(Trabajo.TIPO_MINIATURAS, {'libro': libro_pk, 'portada': nombre})
+        return
+    try:
+        portadas.actualizar(libro_pk, nombre)
+    except OSError:
+        # Imagen que Pillow no puede procesar: el trabajador deja el error registrado
+        trabajos.encolar(Trabajo.TIPO_MINIATURAS, {'libro': libro_pk, 'portada': nombre})
+
+
+@receiver(post_save, sender=Libro)
+def procesar_portada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if not instance.portada:
+        if instance.miniaturas:
+            portadas.descartar(instance)
+        return
+    if portadas.pendiente(instance):
+        libro_pk, nombre = instance.pk, instance.portada.name
+        # Tras el commit: el archivo ya está guardado y el trabajo ve el libro
+        transaction.on_commit(lambda: _generar_miniaturas(libro_pk, nombre))
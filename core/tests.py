@@ -1,9 +1,111 @@
-from django.test import TestCase
-from django.urls import reverse
+import csv
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from threading import Barrier
+from unittest import mock
+
+from django.conf import settings
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_finished
+from django.db import IntegrityError, close_old_connections, connection, connections, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from PIL import Image
+from reportlab import rl_config
+
+from core import (
+    busqueda, correo, estadisticas, importacion, prestamos, reportes, reservas, routers, sanciones, trabajos,
+)
+from core.importacion import normalizar_isbn
+from core.management.commands.benchmark_indices import INDICES
+from core.metricas import REGISTRO
+from core.models import (
+    Autor, Categoria, CorreoPendiente, EstadisticaAutor, EstadisticaLibro, EstadisticaMensual, Libro, Prestamo,
+    Reserva, Trabajo, Usuario,
+)
+from core.routers import ReplicaMiddleware, RouterReplica, leer_de_replica
 
 
 User = get_user_model()
+# Una línea por petición ensuciaría la salida de las pruebas (MetricasTests la revisa con assertLogs)
+logging.getLogger('biblioteca.metricas').setLevel(logging.WARNING)
+
+
+def cerrar_respuesta(respuesta):
+    """Cierra la respuesta como el servidor, sin cerrar la conexión de la prueba (como el cliente de pruebas)."""
+    request_finished.disconnect(close_old_connections)
+    try:
+        respuesta.close()
+    finally:
+        request_finished.connect(close_old_connections)
+
+
+CLAVE = 'ClaveSegura123'
+
+
+class DatosPruebaMixin:
+    """Autor, usuarios, libros y préstamos de prueba; cada clase crea solo lo que usa."""
+
+    def crear_autor(self):
+        self.autor = Autor.objects.create(nombre='Ana', apellido='Autora')
+        return self.autor
+
+    def crear_usuario(self, username, rol=User.ROL_LECTOR, **campos):
+        campos.setdefault('password', CLAVE)
+        return User.objects.create_user(username=username, rol=rol, **campos)
+
+    def crear_lector(self, **campos):
+        self.lector = self.crear_usuario('lector', **campos)
+        return self.lector
+
+    def crear_biblio(self):
+        self.biblio = self.crear_usuario('biblio', User.ROL_BIBLIOTECARIO)
+        return self.biblio
+
+    def entrar(self, usuario):
+        self.client.login(username=usuario.username, password=CLAVE)
+
+    def crear_libros(self, n, titulo='Libro {}', **campos):
+        """``n`` libros de ``self.autor``, numerados a continuación de los ya creados en la prueba."""
+        inicio = getattr(self, 'libros_creados', 0)
+        self.libros_creados = inicio + n
+        return [
+            Libro.objects.create(titulo=titulo.format(i), autor=self.autor, isbn=f'978300000{i:04d}', **campos)
+            for i in range(inicio, inicio + n)
+        ]
+
+    def crear_prestamo(self, libro, usuario, dias=14, **campos):
+        campos.setdefault('fecha_devolucion_prevista', timezone.now() + timedelta(days=dias))
+        return Prestamo.objects.create(libro=libro, usuario=usuario, **campos)
+
+    def usar_media_temporal(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
 
 
 class AuthFlowTests(TestCase):
@@ -47,3 +149,1388 @@ class AuthFlowTests(TestCase):
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, 200)
         self.assertIn('status', resp.json())
+
+
+class BusquedaCatalogoTests(TestCase):
+    def setUp(self):
+        self.garcia = Autor.objects.create(nombre='Gabriel', apellido='García Márquez')
+        self.borges = Autor.objects.create(nombre='Jorge Luis', apellido='Borges')
+        self.novela = Categoria.objects.create(nombre='Novela')
+        self.cien = Libro.objects.create(
+            titulo='Cien años de soledad', autor=self.garcia, categoria=self.novela,
+            isbn='9780307474728', resumen='La saga de la familia Buendía en Macondo.'
+        )
+        self.ficciones = Libro.objects.create(
+            titulo='Ficciones', autor=self.borges, isbn='9788420633121',
+            resumen='Cuentos con laberintos y espejos.'
+        )
+
+    def buscar(self, q):
+        resp = self.client.get(reverse('libro_list'), {'q': q})
+        self.assertEqual(resp.status_code, 200)
+        return list(resp.context['libros'])
+
+    def test_busca_por_titulo_apellido_resumen_categoria_e_isbn(self):
+        self.assertEqual(self.buscar('soledad'), [self.cien])
+        self.assertEqual(self.buscar('marquez'), [self.cien])
+        self.assertEqual(self.buscar('laberintos'), [self.ficciones])
+        self.assertEqual(self.buscar('novela'), [self.cien])
+        self.assertEqual(self.buscar('978842'), [self.ficciones])
+
+    def test_indice_se_sincroniza_al_editar_y_borrar(self):
+        self.borges.apellido = 'Acevedo'
+        self.borges.save()
+        self.assertEqual(self.buscar('acevedo'), [self.ficciones])
+        self.assertEqual(self.buscar('borges'), [])
+        self.novela.delete()
+        self.assertEqual(self.buscar('novela'), [])
+        self.cien.delete()
+        self.assertEqual(self.buscar('soledad'), [])
+
+    def test_resultados_ordenados_por_relevancia(self):
+        otro = Libro.objects.create(
+            titulo='Crónica', autor=self.garcia, isbn='9780307387349',
+            resumen='Una muerte anunciada; no es Cien años de soledad.'
+        )
+        self.assertEqual(self.buscar('soledad'), [self.cien, otro])
+
+    def test_reconstruir_indice(self):
+        call_command('reconstruir_indice_busqueda', stdout=StringIO())
+        self.assertEqual(self.buscar('macondo'), [self.cien])
+
+
+class PaginacionCursorTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.crear_autor()
+        self.crear_biblio()
+        self.crear_lector()
+
+    def recorrer(self, url, clave, params=None):
+        """Sigue los cursores 'Cargar más' y devuelve todas las filas vistas."""
+        params = dict(params or {})
+        vistos = []
+        while True:
+            resp = self.client.get(url, params)
+            self.assertEqual(resp.status_code, 200)
+            vistos.extend(resp.context[clave])
+            pagina = resp.context['page_obj']
+            if not pagina.tiene_mas:
+                return vistos
+            params['cursor'] = pagina.siguiente_cursor
+
+    def test_catalogo_recorre_todas_las_paginas_sin_repetir(self):
+        # Títulos repetidos para forzar el desempate por id
+        for i in range(60):
+            Libro.objects.create(titulo=f'Libro {i % 7}', autor=self.autor, isbn=f'978000000{i:04d}')
+        vistos = self.recorrer(reverse('libro_list'), 'libros')
+        esperado = list(Libro.objects.order_by('titulo', 'id'))
+        self.assertEqual(vistos, esperado)
+
+    def test_busqueda_pagina_por_relevancia(self):
+        for i in range(30):
+            Libro.objects.create(
+                titulo=f'Viaje {i}', autor=self.autor, isbn=f'978100000{i:04d}',
+                resumen='viaje ' * (i % 4)
+            )
+        vistos = self.recorrer(reverse('libro_list'), 'libros', {'q': 'viaje'})
+        self.assertEqual(len(vistos), 30)
+        self.assertEqual(len(set(l.pk for l in vistos)), 30)
+
+    def test_gestion_prestamos_activos_primero_y_sin_count(self):
+        ahora = timezone.now()
+        for i, libro in enumerate(self.crear_libros(120, titulo='L{}')):
+            self.crear_prestamo(
+                libro, self.lector,
+                fecha_prestamo=ahora - timedelta(days=i % 10),
+                fecha_devolucion_real=(ahora - timedelta(days=i % 3)) if i % 2 else None,
+            )
+        self.entrar(self.biblio)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('gestion_prestamos'))
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql']])
+        vistos = self.recorrer(reverse('gestion_prestamos'), 'prestamos')
+        self.assertEqual(len(vistos), 120)
+        self.assertEqual(len(set(p.pk for p in vistos)), 120)
+        activos = [p for p in vistos if p.fecha_devolucion_real is None]
+        self.assertEqual(vistos[:len(activos)], activos)
+
+    def test_cursor_invalido_devuelve_404(self):
+        resp = self.client.get(reverse('libro_list'), {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(resp.status_code, 404)
+
+
+class MetricasTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        REGISTRO.reiniciar()
+
+    def test_registra_consultas_y_tiempos_por_vista(self):
+        Libro.objects.create(titulo='Rayuela', autor=self.crear_autor(), isbn='9785400000001')
+        with self.assertLogs('biblioteca.metricas', level='INFO') as logs:
+            # Anónimo: versión del catálogo (ETag) y página de libros; autores y categorías van por autocompletado
+            with self.assertNumQueries(2):
+                self.client.get(reverse('libro_list'))
+        self.assertIn('vista=libro_list metodo=GET estado=200 sql=2 ', logs.output[0])
+        self.assertEqual(logs.records[0].sql_consultas, 2)
+
+        with self.settings(DEBUG=True):
+            texto = self.client.get(reverse('metricas')).content.decode()
+        self.assertIn('biblioteca_peticiones_total{vista="libro_list",estado="2xx"} 1', texto)
+        self.assertIn('biblioteca_sql_consultas_sum{vista="libro_list"} 2', texto)
+        self.assertIn('biblioteca_peticion_segundos_bucket{vista="libro_list",le="+Inf"} 1', texto)
+        # El propio endpoint no se mide
+        self.assertNotIn('vista="metricas"', texto)
+
+    def test_respuestas_en_streaming_se_miden_al_terminar(self):
+        self.entrar(self.crear_biblio())
+        respuesta = self.client.get(reverse('reporte_libros_csv'))
+        self.assertEqual(REGISTRO.sql_consultas.series.get('reporte_libros_csv'), None)
+        b''.join(respuesta.streaming_content)
+        self.assertEqual(REGISTRO.sql_consultas.series['reporte_libros_csv'][2], 1)
+
+    def test_respuesta_en_streaming_cerrada_sin_leer(self):
+        self.entrar(self.crear_biblio())
+        respuesta = self.client.get(reverse('reporte_libros_csv'))
+        # El cliente corta antes del primer bloque: igual se registra
+        cerrar_respuesta(respuesta)
+        self.assertEqual(REGISTRO.sql_consultas.series['reporte_libros_csv'][2], 1)
+
+    def test_token_obligatorio_sin_debug(self):
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metricas')).status_code, 200)
+        with self.settings(METRICAS_TOKEN='secreto'):
+            self.assertEqual(self.client.get(reverse('metricas')).status_code, 401)
+            respuesta = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer secreto')
+            self.assertEqual(respuesta.status_code, 200)
+
+
+class ConsultasConstantesMixin:
+    """
+    Verifica que una vista ejecuta el mismo número de consultas SQL
+    independientemente de cuántas filas muestre (sin N+1).
+    """
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        if resp.streaming:
+            # Las respuestas en streaming consultan al consumirse
+            with CaptureQueriesContext(connection) as ctx_stream:
+                b''.join(resp.streaming_content)
+            return len(ctx.captured_queries) + len(ctx_stream.captured_queries)
+        return len(ctx.captured_queries)
+
+    def assertConsultasConstantes(self, url, crear_filas, filas=3):
+        crear_filas(filas)
+        pocas = self.contar_consultas(url)
+        crear_filas(filas * 3)
+        muchas = self.contar_consultas(url)
+        self.assertEqual(
+            pocas, muchas,
+            f'{url}: {pocas} consultas con {filas} filas y {muchas} con {filas * 4}'
+        )
+
+
+class ConsultasPorVistaTests(ConsultasConstantesMixin, DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.crear_autor()
+        self.categoria = Categoria.objects.create(nombre='Ensayo')
+        self.crear_biblio()
+        self.crear_lector()
+
+    def crear_prestados(self, n):
+        return self.crear_libros(n, categoria=self.categoria, estado=Libro.ESTADO_PRESTADO)
+
+    def crear_prestamos(self, n):
+        for libro in self.crear_prestados(n):
+            self.crear_prestamo(libro, self.lector)
+
+    def crear_reservas(self, n):
+        for libro in self.crear_prestados(n):
+            Reserva.objects.create(libro=libro, usuario=self.lector)
+
+    def test_vistas_del_bibliotecario(self):
+        self.entrar(self.biblio)
+        for nombre in ('gestion_prestamos', 'reporte_prestamos_pdf', 'reporte_prestamos_csv'):
+            with self.subTest(vista=nombre):
+                self.assertConsultasConstantes(reverse(nombre), self.crear_prestamos)
+        self.assertConsultasConstantes(reverse('reporte_libros_csv'), self.crear_prestados)
+
+    def test_vistas_del_lector(self):
+        self.entrar(self.lector)
+        self.assertConsultasConstantes(reverse('mis_prestamos'), self.crear_prestamos)
+        self.assertConsultasConstantes(reverse('mis_reservas'), self.crear_reservas)
+        self.assertConsultasConstantes(reverse('libro_list'), self.crear_prestados)
+
+
+class EstadoPrestamoTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.crear_autor()
+        self.crear_lector()
+        self.crear_biblio()
+        ahora = timezone.now()
+        libros = self.crear_libros(4, titulo='L{}')
+        self.en_curso = self.crear_prestamo(libros[0], self.lector, dias=7)
+        self.vencido = self.crear_prestamo(libros[1], self.lector, dias=-1)
+        self.manual = self.crear_prestamo(libros[2], self.lector, dias=7, retraso_manual=True)
+        self.devuelto = self.crear_prestamo(libros[3], self.lector, dias=-3, fecha_devolucion_real=ahora)
+
+    def test_con_estado_coincide_con_la_propiedad(self):
+        estados = {p.pk: p.estado_prestamo for p in Prestamo.objects.con_estado()}
+        self.assertEqual(estados, {
+            self.en_curso.pk: Prestamo.ESTADO_EN_CURSO,
+            self.vencido.pk: Prestamo.ESTADO_RETRASADO,
+            self.manual.pk: Prestamo.ESTADO_RETRASADO,
+            self.devuelto.pk: Prestamo.ESTADO_DEVUELTO,
+        })
+        for p in Prestamo.objects.all():
+            self.assertEqual(p.esta_retrasado, estados[p.pk] == Prestamo.ESTADO_RETRASADO)
+
+    def test_filtros_por_estado(self):
+        self.assertCountEqual(Prestamo.objects.retrasados(), [self.vencido, self.manual])
+        self.assertCountEqual(Prestamo.objects.en_curso(), [self.en_curso])
+        self.assertCountEqual(Prestamo.objects.con_estado_igual(Prestamo.ESTADO_DEVUELTO), [self.devuelto])
+
+    def test_gestion_filtra_y_ordena_por_estado(self):
+        self.entrar(self.biblio)
+        resp = self.client.get(reverse('gestion_prestamos'), {'estado': 'retrasado'})
+        self.assertCountEqual(resp.context['prestamos'], [self.vencido, self.manual])
+        resp = self.client.get(reverse('gestion_prestamos'), {'orden': 'estado'})
+        self.assertEqual(
+            [p.estado_prestamo for p in resp.context['prestamos']],
+            ['retrasado', 'retrasado', 'en_curso', 'devuelto'],
+        )
+
+
+class SancionesTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.crear_autor()
+        self.libros = self.crear_libros(4, titulo='L{}')
+        self.crear_lector()
+
+    def test_sancion_sin_consultar_prestamos_y_barrido(self):
+        prestamo = prestamos.prestar(self.libros[0], self.lector)
+        self.lector.refresh_from_db()
+        self.assertEqual((self.lector.prestamos_activos, self.lector.bloqueado), (1, False))
+        self.assertFalse(self.lector.tiene_sancion())
+
+        # Vence: se detecta aunque el barrido aún no haya pasado
+        self.assertTrue(self.lector.tiene_sancion(prestamo.fecha_devolucion_prevista + timedelta(minutes=1)))
+        type(prestamo).objects.filter(pk=prestamo.pk).update(fecha_devolucion_prevista=timezone.now() - timedelta(days=1))
+        self.assertEqual(sanciones.barrer(), 0)  # vence_primero aún tiene la fecha original
+        sanciones.recalcular([self.lector.pk])
+        self.assertEqual(User.objects.filter(bloqueado=True).count(), 1)
+
+        self.entrar(self.lector)
+        # Sesión, usuario, libro y autor: ninguna sobre préstamos
+        with self.assertNumQueries(4):
+            respuesta = self.client.get(reverse('libro_detail', args=[self.libros[1].pk]))
+        self.assertTrue(respuesta.context['usuario_bloqueado'])
+        self.client.post(reverse('prestamo_crear', args=[self.libros[1].pk]))
+        self.assertEqual(self.libros[1].prestamos.count(), 0)
+
+        prestamos.devolver(prestamo.pk)
+        self.lector.refresh_from_db()
+        self.assertEqual((self.lector.prestamos_activos, self.lector.vence_primero, self.lector.bloqueado), (0, None, False))
+
+    def test_limite_de_prestamos_activos(self):
+        with self.settings(MAX_PRESTAMOS_LECTOR=2):
+            prestamos.prestar(self.libros[0], self.lector)
+            self.lector.refresh_from_db()
+            resultados = prestamos.prestar_varios(self.lector, [l.isbn for l in self.libros[1:]])
+            self.assertEqual([r['ok'] for r in resultados].count(True), 1)
+            self.assertIn('límite', [r for r in resultados if not r['ok']][0]['detalle'])
+            self.lector.refresh_from_db()
+            self.assertTrue(self.lector.alcanzo_limite())
+            libre = Libro.objects.filter(estado=Libro.ESTADO_DISPONIBLE).first()
+            with self.assertRaises(prestamos.LimitePrestamos):
+                prestamos.prestar(libre, self.lector)
+            # La excepción deshace también la toma del libro
+            libre.refresh_from_db()
+            self.assertEqual(libre.estado, Libro.ESTADO_DISPONIBLE)
+            self.assertEqual(self.lector.prestamos.filter(fecha_devolucion_real__isnull=True).count(), 2)
+
+
+class FragmentosCatalogoTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.crear_autor()
+        self.libro = Libro.objects.create(titulo='Rayuela', autor=self.autor, isbn='9785600000001')
+        self.crear_lector()
+        self.url = reverse('libro_detail', args=[self.libro.pk])
+
+    def test_detalle_responde_304_hasta_que_cambia_el_libro(self):
+        primera = self.client.get(self.url)
+        etag = primera['ETag']
+        self.assertIn('Last-Modified', primera)
+        # Revalidación: solo se lee el libro, sin renderizar la plantilla
+        with self.assertNumQueries(1):
+            segunda = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(segunda.status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=primera['Last-Modified']).status_code, 304)
+
+        # Un préstamo (update() masivo) también cambia la versión
+        prestamos.prestar(self.libro, self.lector)
+        tercera = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(tercera.status_code, 200)
+        self.assertNotEqual(tercera['ETag'], etag)
+        self.assertContains(tercera, 'Prestado')
+
+    def test_etag_distinto_por_usuario_y_sin_fecha_para_autenticados(self):
+        anonimo = self.client.get(self.url)['ETag']
+        self.entrar(self.lector)
+        respuesta = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', respuesta)
+        self.assertNotEqual(respuesta['ETag'], anonimo)
+        # La sanción se muestra fuera del fragmento cacheado y cambia el ETag
+        Usuario.objects.filter(pk=self.lector.pk).update(bloqueado=True)
+        bloqueado = self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(bloqueado.status_code, 200)
+        self.assertContains(bloqueado, 'Tienes sanción activa')
+
+    def test_fragmentos_por_libro_y_version(self):
+        url_lista = reverse('libro_list')
+        self.assertContains(self.client.get(url_lista), 'Rayuela')
+        # Sin tocar la versión, la tarjeta sale de la caché
+        Libro.objects.filter(pk=self.libro.pk).update(titulo='Rayuela 2')
+        self.assertNotContains(self.client.get(url_lista), 'Rayuela 2')
+        # Renombrar al autor invalida la tarjeta de sus libros
+        self.autor.apellido = 'Cortázar'
+        self.autor.save()
+        respuesta = self.client.get(url_lista)
+        self.assertContains(respuesta, 'Rayuela 2')
+        self.assertContains(respuesta, 'Cortázar')
+
+    def test_catalogo_cambia_de_etag_al_borrar_un_libro(self):
+        otro = Libro.objects.create(titulo='Ficciones', autor=self.autor, isbn='9785600000002')
+        url_lista = reverse('libro_list')
+        etag = self.client.get(url_lista)['ETag']
+        self.assertEqual(self.client.get(url_lista, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Otra página u otro filtro es otra versión
+        self.assertNotEqual(self.client.get(url_lista, {'q': 'rayuela'})['ETag'], etag)
+        Libro.objects.filter(pk=otro.pk).delete()
+        self.assertEqual(self.client.get(url_lista, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_con_mensajes_pendientes_no_hay_304(self):
+        self.entrar(self.lector)
+        etag = self.client.get(self.url)['ETag']
+        # La reserva redirige al detalle con un mensaje que hay que mostrar
+        respuesta = self.client.post(reverse('reserva_crear', args=[self.libro.pk]), HTTP_IF_NONE_MATCH=etag, follow=True)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.context['messages']), 1)
+
+
+class BackendContador(locmem.EmailBackend):
+    """Backend de prueba: cuenta conexiones abiertas y falla con destinatarios 'falla@'."""
+    aperturas = 0
+
+    def open(self):
+        type(self).aperturas += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any(m.to[0].startswith('falla@') for m in messages):
+            raise OSError('buzón inexistente')
+        return super().send_messages(messages)
+
+
+class RecordatoriosTests(DatosPruebaMixin, TestCase):
+    def crear_vencimientos(self, correos):
+        self.crear_autor()
+        for n, (email, libro) in enumerate(zip(correos, self.crear_libros(len(correos), titulo='V{}'))):
+            self.crear_prestamo(libro, self.crear_usuario(f'lector{n}', email=email), dias=1)
+
+    def test_lotes_en_paralelo_reutilizan_conexiones(self):
+        self.crear_vencimientos([f'l{n}@ejemplo.com' for n in range(4)] + ['falla@ejemplo.com', ''])
+        BackendContador.aperturas = 0
+        salida = StringIO()
+        with self.settings(EMAIL_BACKEND='core.tests.BackendContador'):
+            call_command('enviar_recordatorios', '--batch-size', '2', '--workers', '2', stdout=salida)
+        self.assertEqual(len(mail.outbox), 4)
+        # 3 lotes + 1 reapertura tras el fallo, en lugar de una conexión por correo
+        self.assertEqual(BackendContador.aperturas, 4)
+        self.assertIn('4 correos enviados, 1 con error', salida.getvalue())
+
+    def test_dry_run_no_envia(self):
+        self.crear_vencimientos(['a@ejemplo.com', 'b@ejemplo.com'])
+        salida = StringIO()
+        call_command('enviar_recordatorios', '--dry-run', stdout=salida)
+        self.assertEqual(mail.outbox, [])
+        self.assertIn('se enviarían 2', salida.getvalue())
+
+    def test_opciones_invalidas(self):
+        self.crear_vencimientos(['a@ejemplo.com'])
+        for opciones in (['--batch-size', '0'], ['--batch-size', '-5'], ['--workers', '0'], ['--max-por-segundo', '-1']):
+            with self.subTest(opciones=opciones), self.assertRaises(CommandError):
+                call_command('enviar_recordatorios', *opciones, stdout=StringIO())
+
+    def test_envia_solo_los_que_vencen_manana(self):
+        self.crear_autor()
+        self.crear_lector(email='lector@ejemplo.com')
+        manana = timezone.now() + timedelta(days=1)
+        for libro, prevista in zip(self.crear_libros(3, titulo='L{}'), [manana, manana + timedelta(days=2), timezone.now()]):
+            self.crear_prestamo(libro, self.lector, fecha_devolucion_prevista=prevista)
+        call_command('enviar_recordatorios', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('"L0"', mail.outbox[0].body)
+
+
+class BandejaSalidaTests(DatosPruebaMixin, TestCase):
+    def test_prestamo_y_devolucion_dejan_el_correo_en_la_bandeja(self):
+        self.crear_autor()
+        libro = Libro.objects.create(titulo='Rayuela', autor=self.autor, isbn='9785200000001')
+        self.crear_lector(email='lector@ejemplo.com')
+        otro = self.crear_usuario('otro', email='otro@ejemplo.com')
+        self.crear_biblio()
+
+        self.entrar(self.lector)
+        self.client.post(reverse('prestamo_crear', args=[libro.pk]))
+        Reserva.objects.create(libro=libro, usuario=otro)
+        self.entrar(self.biblio)
+        self.client.post(reverse('prestamo_devolver', args=[Prestamo.objects.get().pk]))
+        # Ninguna vista habló con el servidor de correo
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(CorreoPendiente.objects.filter(estado=CorreoPendiente.ESTADO_PENDIENTE).count(), 2)
+
+        call_command('procesar_outbox', '--una-vez', stdout=StringIO())
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['lector@ejemplo.com', 'otro@ejemplo.com'])
+        self.assertFalse(CorreoPendiente.objects.exclude(estado=CorreoPendiente.ESTADO_ENVIADO).exists())
+
+    def test_reintentos_con_espera_y_descarte(self):
+        correo.encolar('Aviso', 'Hola', 'ok@ejemplo.com')
+        fallido = correo.encolar('Aviso', 'Hola', 'falla@ejemplo.com')
+        with self.settings(EMAIL_BACKEND='core.tests.BackendContador'):
+            self.assertEqual(correo.procesar_outbox(max_intentos=2), (1, 1))
+            fallido.refresh_from_db()
+            self.assertEqual((fallido.estado, fallido.intentos), (CorreoPendiente.ESTADO_PENDIENTE, 1))
+            self.assertGreater(fallido.proximo_intento, timezone.now())
+            # Todavía en espera: no se reintenta
+            self.assertEqual(correo.procesar_outbox(max_intentos=2), (0, 0))
+            CorreoPendiente.objects.filter(pk=fallido.pk).update(proximo_intento=timezone.now())
+            self.assertEqual(correo.procesar_outbox(max_intentos=2), (0, 1))
+        fallido.refresh_from_db()
+        self.assertEqual(fallido.estado, CorreoPendiente.ESTADO_FALLIDO)
+        self.assertIn('buzón inexistente', fallido.ultimo_error)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class ColaReservasTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.crear_autor()
+        self.libro = Libro.objects.create(titulo='Rayuela', autor=self.autor, isbn='9785300000001')
+        self.lectores = [self.crear_usuario(f'lector{i}', email=f'l{i}@ejemplo.com') for i in range(3)]
+
+    def prestar_y_encolar(self):
+        prestamo = prestamos.prestar(self.libro, self.lectores[0])
+        for lector in self.lectores[1:]:
+            reservas.reservar(self.libro, lector)
+        return prestamo
+
+    def test_devolucion_aparta_el_libro_para_la_cabeza_de_la_cola(self):
+        prestamo = self.prestar_y_encolar()
+        self.assertEqual(reservas.reservar(self.libro, self.lectores[1])[1], False)
+        self.assertEqual(
+            [r.posicion_cola for r in Reserva.objects.con_posicion().order_by('fecha_reserva', 'pk')], [1, 2]
+        )
+
+        prestamos.devolver(prestamo.pk)
+        self.libro.refresh_from_db()
+        self.assertEqual(self.libro.estado, Libro.ESTADO_RESERVADO)
+        # Apartado: otro lector no puede llevárselo, el de la reserva sí
+        self.assertIsNone(prestamos.prestar(self.libro, self.lectores[2]))
+        self.assertIsNotNone(prestamos.prestar(self.libro, self.lectores[1]))
+        self.assertEqual(
+            dict(Reserva.objects.values_list('usuario__username', 'estado')),
+            {'lector1': Reserva.ESTADO_ATENDIDA, 'lector2': Reserva.ESTADO_EN_COLA},
+        )
+        self.assertEqual(Reserva.objects.con_posicion().get(usuario=self.lectores[2]).posicion_cola, 1)
+
+    def test_barrido_vence_apartados_y_promueve_la_siguiente(self):
+        prestamos.devolver(self.prestar_y_encolar().pk)
+        CorreoPendiente.objects.all().delete()
+        # Nada vencido todavía
+        salida = StringIO()
+        call_command('barrer_reservas', stdout=salida)
+        self.assertIn('0 reserva(s) expiradas', salida.getvalue())
+
+        Reserva.objects.filter(estado=Reserva.ESTADO_RETENIDA).update(fecha_expiracion=timezone.now() - timedelta(minutes=1))
+        call_command('barrer_reservas', stdout=salida)
+        self.assertIn('1 reserva(s) expiradas, 1 promovida(s)', salida.getvalue())
+        self.assertEqual(
+            dict(Reserva.objects.values_list('usuario__username', 'estado')),
+            {'lector1': Reserva.ESTADO_EXPIRADA, 'lector2': Reserva.ESTADO_RETENIDA},
+        )
+        self.assertEqual(list(CorreoPendiente.objects.values_list('destinatario', flat=True)), ['l2@ejemplo.com'])
+
+        # Sin nadie más en la cola, el libro vuelve a estar disponible
+        Reserva.objects.filter(estado=Reserva.ESTADO_RETENIDA).update(fecha_expiracion=timezone.now() - timedelta(minutes=1))
+        call_command('barrer_reservas', stdout=salida)
+        self.libro.refresh_from_db()
+        self.assertEqual(self.libro.estado, Libro.ESTADO_DISPONIBLE)
+
+    def test_mis_reservas_muestra_la_posicion(self):
+        self.prestar_y_encolar()
+        self.entrar(self.lectores[2])
+        respuesta = self.client.get(reverse('mis_reservas'))
+        self.assertContains(respuesta, 'Posición 2 en la cola')
+
+
+class ReportesCSVTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.crear_autor()
+        self.categoria = Categoria.objects.create(nombre='Ensayo')
+        self.libro = Libro.objects.create(
+            titulo='Guerra, paz y "comillas"', autor=self.autor, categoria=self.categoria, isbn='9786000000001'
+        )
+        Libro.objects.create(titulo='Otro', autor=self.autor, isbn='9786000000002', estado=Libro.ESTADO_PRESTADO)
+        self.crear_biblio()
+        self.crear_prestamo(self.libro, self.biblio, dias=-1)
+        self.entrar(self.biblio)
+
+    def leer_csv(self, url, params=None):
+        resp = self.client.get(url, params or {})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        texto = b''.join(resp.streaming_content).decode('utf-8')
+        return list(csv.reader(io.StringIO(texto)))
+
+    def test_libros_csv_con_comas_y_comillas(self):
+        filas = self.leer_csv(reverse('reporte_libros_csv'))
+        self.assertEqual(filas[0], ['Titulo', 'Autor', 'Categoria', 'ISBN', 'Estado'])
+        self.assertIn(['Guerra, paz y "comillas"', 'Ana Autora', 'Ensayo', '9786000000001', 'Disponible'], filas)
+        self.assertEqual(len(filas), 3)
+
+    def test_libros_csv_acepta_filtros_del_catalogo(self):
+        filas = self.leer_csv(reverse('reporte_libros_csv'), {'estado': 'prestado'})
+        self.assertEqual([f[0] for f in filas[1:]], ['Otro'])
+        filas = self.leer_csv(reverse('reporte_libros_csv'), {'q': 'guerra'})
+        self.assertEqual([f[0] for f in filas[1:]], ['Guerra, paz y "comillas"'])
+
+    def test_prestamos_csv(self):
+        filas = self.leer_csv(reverse('reporte_prestamos_csv'))
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][0], 'Guerra, paz y "comillas"')
+        self.assertEqual(filas[1][-2:], ['', 'SI'])
+
+
+class ReporteExcelTests(DatosPruebaMixin, TestCase):
+    def test_excel_generado_con_openpyxl_en_modo_escritura(self):
+        self.crear_autor()
+        categoria = Categoria.objects.create(nombre='Ensayo')
+        for libro in self.crear_libros(5)[1::2]:
+            libro.categoria = categoria
+            libro.save()
+        self.entrar(self.crear_biblio())
+        resp = self.client.get(reverse('reporte_libros_excel'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('reporte_libros.xlsx', resp['Content-Disposition'])
+        hoja = load_workbook(io.BytesIO(b''.join(resp.streaming_content))).active
+        filas = list(hoja.iter_rows(values_only=True))
+        self.assertEqual(filas[0], ('Título', 'Autor', 'Categoría', 'ISBN', 'Estado'))
+        self.assertEqual(filas[1], ('Libro 0', 'Ana Autora', None, '9783000000000', 'Disponible'))
+        self.assertEqual(filas[2][2], 'Ensayo')
+        self.assertEqual(len(filas), 6)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_generar_datos_y_benchmark_en_json(self):
+        call_command('generar_datos', autores=5, libros=60, lectores=10, prestamos=600, reservas=40,
+                     semilla=7, lote=50, stdout=StringIO())
+        self.assertEqual(Libro.objects.count(), 60)
+        self.assertEqual(Prestamo.objects.count(), 600)
+        # Un solo préstamo activo por libro y el libro marcado como prestado
+        activos = Prestamo.objects.activos()
+        self.assertEqual(activos.count(), activos.values('libro').distinct().count())
+        self.assertEqual(Libro.objects.filter(estado=Libro.ESTADO_PRESTADO).count(), activos.count())
+        self.assertTrue(Reserva.objects.exists())
+        self.assertEqual(User.objects.filter(prestamos_activos__gt=0).count(), activos.values('usuario').distinct().count())
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'actual.json')
+            call_command('benchmark_suite', repeticiones=1, solo=['catalogo', 'exportar_libros_csv', 'enviar_recordatorios'],
+                         salida=salida, stdout=StringIO(), stderr=StringIO())
+            with open(salida, encoding='utf-8') as archivo:
+                informe = json.load(archivo)
+            self.assertEqual(informe['entorno']['volumen']['libros'], 60)
+            self.assertEqual(set(informe['escenarios']), {'catalogo', 'exportar_libros_csv', 'enviar_recordatorios'})
+            self.assertGreater(informe['escenarios']['exportar_libros_csv']['bytes'], 0)
+
+            # Una referencia mucho más rápida se detecta como regresión
+            for resultado in informe['escenarios'].values():
+                resultado['ms_mediana'] /= 1000
+            referencia = os.path.join(carpeta, 'anterior.json')
+            with open(referencia, 'w', encoding='utf-8') as archivo:
+                json.dump(informe, archivo)
+            with self.assertRaises(CommandError):
+                call_command('benchmark_suite', repeticiones=1, solo=['catalogo'], comparar=referencia,
+                             stdout=StringIO(), stderr=StringIO())
+
+    def test_benchmark_indices_conoce_los_indices_del_modelo(self):
+        declarados = {indice.name for modelo in (Prestamo, Reserva) for indice in modelo._meta.indexes}
+        self.assertEqual(set(INDICES), declarados)
+        salida = StringIO()
+        call_command('benchmark_indices', prestamos=200, lectores=20, repeticiones=1, lote=100, stdout=salida)
+        self.assertIn('Resumen', salida.getvalue())
+        # Deshace los datos sintéticos y los índices borrados
+        self.assertFalse(Prestamo.objects.exists())
+
+
+class ReportePDFTests(DatosPruebaMixin, TestCase):
+    def filas(self, n, seccion=None):
+        ahora = timezone.now()
+        return [(f'Libro {i}', 'lector', ahora, ahora, 'en_curso', seccion and f'{seccion} {i // 40}')
+                for i in range(n)]
+
+    def paginas(self, contenido):
+        return contenido.count(b'/Type /Page\n')
+
+    def test_tabla_troceada_en_varias_paginas(self):
+        salida = io.BytesIO()
+        reportes.renderizar_prestamos_pdf(salida, iter(self.filas(100)))
+        self.assertTrue(salida.getvalue().startswith(b'%PDF'))
+        self.assertGreaterEqual(self.paginas(salida.getvalue()), 3)
+
+    def test_secciones_y_reporte_vacio(self):
+        salida = io.BytesIO()
+        reportes.renderizar_prestamos_pdf(salida, iter(self.filas(100, 'Vencen el dia')))
+        self.assertGreaterEqual(self.paginas(salida.getvalue()), 3)
+        vacio = io.BytesIO()
+        reportes.renderizar_prestamos_pdf(vacio, iter([]))
+        self.assertEqual(self.paginas(vacio.getvalue()), 1)
+
+    def test_titulo_de_seccion_no_queda_solo_al_pie(self):
+        ahora = timezone.now()
+        # 34 filas llenan la página hasta dejar sitio para el título pero no para su tabla
+        filas = [(f'Libro {i}', 'lector', ahora, ahora, 'en_curso', 'Primero') for i in range(34)]
+        filas.append(('Ultimo', 'lector', ahora, ahora, 'en_curso', 'Segundo'))
+        salida = io.BytesIO()
+        with mock.patch.object(rl_config, 'pageCompression', 0):
+            reportes.renderizar_prestamos_pdf(salida, iter(filas))
+        paginas = re.findall(rb'stream\r?\n(.*?)endstream', salida.getvalue(), re.S)
+        self.assertEqual(len(paginas), 2)
+        self.assertNotIn(b'Segundo', paginas[0])
+        self.assertIn(b'Segundo', paginas[1])
+        self.assertIn(b'Ultimo', paginas[1])
+
+    def test_textos_largos_en_varias_lineas(self):
+        ahora = timezone.now()
+        titulo = 'Crónica de una biblioteca que guardaba todos los libros del mundo y algunos más'
+        usuario = 'lector_con_un_nombre_de_usuario_larguisimo'
+        salida = io.BytesIO()
+        with mock.patch.object(rl_config, 'pageCompression', 0):
+            reportes.renderizar_prestamos_pdf(salida, iter([(titulo, usuario, ahora, ahora, 'en_curso', None)]))
+        contenido = salida.getvalue()
+        self.assertIn(b'algunos m', contenido)
+        self.assertIn(b'larguisimo', contenido)
+        self.assertNotIn('…'.encode('cp1252'), contenido)
+        self.assertEqual(self.paginas(contenido), 1)
+
+    def test_vista_acepta_agrupacion(self):
+        self.entrar(self.crear_biblio())
+        for agrupar in ('', 'dia', 'categoria', 'otra'):
+            with self.subTest(agrupar=agrupar):
+                resp = self.client.get(reverse('reporte_prestamos_pdf'), {'agrupar': agrupar})
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp['Content-Type'], 'application/pdf')
+                self.assertTrue(b''.join(resp.streaming_content).startswith(b'%PDF'))
+
+
+class ColaTrabajosTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.usar_media_temporal()
+        Libro.objects.create(titulo='Libro, uno', autor=self.crear_autor(), isbn='9788000000001')
+        self.entrar(self.crear_biblio())
+
+    def test_solicitudes_identicas_se_deduplican(self):
+        url = reverse('reporte_solicitar', args=[Trabajo.TIPO_PRESTAMOS_PDF])
+        for _ in range(3):
+            self.assertRedirects(self.client.post(url), reverse('reportes_trabajos'))
+        self.assertEqual(Trabajo.objects.count(), 1)
+        # Con filtros distintos es otro reporte
+        url = reverse('reporte_solicitar', args=[Trabajo.TIPO_LIBROS_CSV])
+        self.client.post(url, {'estado': 'disponible'})
+        self.client.post(url, {'estado': 'prestado'})
+        self.assertEqual(Trabajo.objects.count(), 3)
+
+    def test_carrera_con_el_ganador_ya_terminado(self):
+        crear = Trabajo.objects.create
+        intentos = []
+
+        def perder_la_carrera(**campos):
+            # El INSERT choca con el trabajo de otra solicitud, que termina antes de buscarlo
+            intentos.append(campos)
+            if len(intentos) == 1:
+                raise IntegrityError('trabajo_clave_vivo_unico')
+            return crear(**campos)
+
+        clave = trabajos.calcular_clave(Trabajo.TIPO_PRESTAMOS_CSV, {})
+        fallido = Trabajo.objects.create(tipo=Trabajo.TIPO_PRESTAMOS_CSV, clave=clave, estado=Trabajo.ESTADO_ERROR)
+        with mock.patch.object(Trabajo.objects, 'create', side_effect=perder_la_carrera):
+            trabajo, creado = trabajos.encolar(Trabajo.TIPO_PRESTAMOS_CSV)
+        self.assertTrue(creado)
+        self.assertNotEqual(trabajo.pk, fallido.pk)
+
+        intentos.clear()
+        Trabajo.objects.filter(pk=trabajo.pk).update(estado=Trabajo.ESTADO_COMPLETADO)
+        frescura = [timedelta(0), trabajos.ventana_frescura()]
+        with mock.patch.object(Trabajo.objects, 'create', side_effect=perder_la_carrera), \
+                mock.patch.object(trabajos, 'ventana_frescura', side_effect=frescura):
+            self.assertEqual(trabajos.encolar(Trabajo.TIPO_PRESTAMOS_CSV), (trabajo, False))
+
+    def test_trabajador_genera_archivo_y_descarga(self):
+        self.client.post(reverse('reporte_solicitar', args=[Trabajo.TIPO_LIBROS_CSV]))
+        trabajo = Trabajo.objects.get()
+        estado = self.client.get(reverse('trabajo_estado', args=[trabajo.pk])).json()
+        self.assertEqual(estado['estado'], 'pendiente')
+        self.assertIsNone(estado['descarga'])
+
+        call_command('procesar_trabajos', '--una-vez', stdout=StringIO())
+
+        estado = self.client.get(reverse('trabajo_estado', args=[trabajo.pk])).json()
+        self.assertEqual(estado['estado'], 'completado')
+        resp = self.client.get(estado['descarga'])
+        contenido = b''.join(resp.streaming_content).decode('utf-8')
+        self.assertIn('"Libro, uno"', contenido)
+
+    def test_reclamo_es_exclusivo(self):
+        trabajos.encolar(Trabajo.TIPO_PRESTAMOS_CSV)
+        primero = trabajos.reclamar_siguiente()
+        self.assertEqual(primero.estado, Trabajo.ESTADO_EN_PROCESO)
+        self.assertIsNone(trabajos.reclamar_siguiente())
+
+    def test_lector_no_puede_solicitar(self):
+        self.entrar(self.crear_lector())
+        self.client.post(reverse('reporte_solicitar', args=[Trabajo.TIPO_PRESTAMOS_PDF]))
+        self.assertFalse(Trabajo.objects.exists())
+
+
+class ImportacionLibrosTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.usar_media_temporal()
+        self.crear_autor()
+        self.existente = Libro.objects.create(
+            titulo='Título viejo', autor=self.autor, isbn='9780306406157', estado=Libro.ESTADO_PRESTADO
+        )
+
+    def test_isbn_10_y_13(self):
+        self.assertEqual(normalizar_isbn('0-306-40615-2'), '9780306406157')
+        self.assertEqual(normalizar_isbn('978 0 306 40615 7'), '9780306406157')
+        self.assertEqual(normalizar_isbn('080442957X'), '9780804429573')
+        self.assertIsNone(normalizar_isbn('9780306406158'))
+        self.assertIsNone(normalizar_isbn('12345'))
+
+    def test_csv_crea_actualiza_y_rechaza(self):
+        contenido = (
+            'Título;Autor;Categoría;ISBN\n'
+            'Título nuevo;ana autora;Novela;0-306-40615-2\n'
+            'Cien años de soledad;García Márquez, Gabriel;novela;9788437604947\n'
+            'Repetido;Ana Autora;;9788437604947\n'
+            'Sin ISBN válido;Ana Autora;;9788437604940\n'
+            ';Ana Autora;;9788437604947\n'
+        ).encode('utf-8-sig')
+        rechazos = []
+        # Autores y categorías una vez; por lote: autor, categoría, ISBN existentes, upsert e índice (+ savepoint)
+        with self.assertNumQueries(10):
+            totales = importacion.importar(
+                BytesIO(contenido), 'csv', lambda fila, motivo, valores: rechazos.append((fila, motivo))
+            )
+        self.assertEqual(totales, {'creados': 1, 'actualizados': 1, 'rechazados': 3})
+        self.assertEqual(rechazos, [(4, 'ISBN repetido en el archivo.'), (5, 'ISBN inválido.'), (6, 'Falta titulo.')])
+
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.titulo, self.existente.estado), ('Título nuevo', Libro.ESTADO_PRESTADO))
+        self.assertEqual(Autor.objects.count(), 2)
+        self.assertEqual(Categoria.objects.get().nombre, 'Novela')
+        nuevo = Libro.objects.get(isbn='9788437604947')
+        self.assertEqual((nuevo.autor.nombre, nuevo.autor.apellido), ('Gabriel', 'García Márquez'))
+        # Indexado aunque bulk_create no emite señales
+        self.assertEqual(list(busqueda.buscar(Libro.objects.all(), 'soledad')), [nuevo])
+
+    def test_subida_xlsx_por_la_cola(self):
+        hoja = Workbook()
+        hoja.active.append(['Titulo', 'Autor', 'ISBN'])
+        hoja.active.append(['Desde Excel', 'Ana Autora', 9788437604947])
+        hoja.active.append(['Malo', 'Ana Autora', 'abc'])
+        datos = BytesIO()
+        hoja.save(datos)
+
+        self.entrar(self.crear_biblio())
+        archivo = SimpleUploadedFile('catalogo.xlsx', datos.getvalue())
+        self.assertRedirects(self.client.post(reverse('libros_importar'), {'archivo': archivo}), reverse('reportes_trabajos'))
+
+        trabajo = trabajos.ejecutar(trabajos.reclamar_siguiente())
+        self.assertEqual(trabajo.tipo, Trabajo.TIPO_IMPORTAR_LIBROS)
+        self.assertEqual(trabajo.resumen, '1 creado(s), 0 actualizado(s), 1 rechazado(s)')
+        self.assertTrue(Libro.objects.filter(titulo='Desde Excel').exists())
+        self.assertFalse(default_storage.exists(trabajo.parametros['archivo']))
+        reporte = b''.join(self.client.get(reverse('trabajo_descargar', args=[trabajo.pk])).streaming_content)
+        self.assertIn('3,ISBN inválido.,Malo', reporte.decode('utf-8'))
+        self.assertContains(self.client.get(reverse('reportes_trabajos')), 'catalogo.xlsx')
+
+
+class MiniaturasPortadaTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.usar_media_temporal()
+        self.crear_autor()
+
+    def imagen(self, nombre='portada.jpg', ancho=900, alto=1400):
+        imagen = Image.new('RGB', (ancho, alto), 'teal')
+        exif = Image.Exif()
+        exif[0x010F] = 'Camara'  # Make
+        salida = BytesIO()
+        imagen.save(salida, 'JPEG', exif=exif)
+        return SimpleUploadedFile(nombre, salida.getvalue(), content_type='image/jpeg')
+
+    def crear_libro(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Libro.objects.create(titulo='Rayuela', autor=self.autor, isbn='9785700000001', **kwargs)
+
+    def test_al_subir_se_generan_miniaturas_sin_metadatos(self):
+        libro = self.crear_libro(portada=self.imagen())
+        libro.refresh_from_db()
+        self.assertEqual(libro.miniaturas['anchos'], [160, 320, 640])
+        self.assertEqual(len(libro.miniaturas['webp']), 3)
+        with default_storage.open(libro.miniaturas['jpeg'][0]) as archivo:
+            miniatura = Image.open(archivo)
+            self.assertEqual(miniatura.size, (160, 249))
+            self.assertEqual(len(miniatura.getexif()), 0)
+        with default_storage.open(libro.miniaturas['webp'][-1]) as archivo:
+            self.assertEqual(Image.open(archivo).format, 'WEBP')
+
+        respuesta = self.client.get(reverse('libro_list'))
+        self.assertContains(respuesta, '<source type="image/webp"')
+        self.assertContains(respuesta, f'{libro.miniaturas["jpeg"][1]} 320w')
+        self.assertContains(respuesta, 'loading="lazy"')
+
+    def test_portada_estrecha_no_se_amplia_y_al_quitarla_se_borran(self):
+        libro = self.crear_libro(portada=self.imagen(ancho=300, alto=450))
+        libro.refresh_from_db()
+        self.assertEqual(libro.miniaturas['anchos'], [160, 300])
+        nombres = libro.miniaturas['jpeg'] + libro.miniaturas['webp']
+        with self.captureOnCommitCallbacks(execute=True):
+            libro.portada = None
+            libro.save()
+        libro.refresh_from_db()
+        self.assertEqual(libro.miniaturas, {})
+        self.assertFalse(any(default_storage.exists(nombre) for nombre in nombres))
+
+    def test_portadas_grandes_van_a_la_cola(self):
+        with override_settings(PORTADAS_MAX_SINCRONO=100):
+            libro = self.crear_libro(portada=self.imagen())
+        libro.refresh_from_db()
+        self.assertEqual(libro.miniaturas, {})
+        trabajo = Trabajo.objects.get()
+        self.assertEqual(trabajo.tipo, Trabajo.TIPO_MINIATURAS)
+        call_command('procesar_trabajos', '--una-vez', stdout=StringIO())
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, Trabajo.ESTADO_COMPLETADO)
+        libro.refresh_from_db()
+        self.assertEqual(libro.miniaturas['anchos'], [160, 320, 640])
+
+    def test_comando_rellena_las_existentes(self):
+        libro = self.crear_libro(portada=self.imagen())
+        # Como una portada subida antes de existir las miniaturas
+        Libro.objects.filter(pk=libro.pk).update(miniaturas={})
+        salida = StringIO()
+        call_command('generar_miniaturas', procesos=1, stdout=salida, stderr=StringIO())
+        self.assertIn('1 portada(s) con miniaturas', salida.getvalue())
+        libro.refresh_from_db()
+        self.assertEqual(len(libro.miniaturas['jpeg']), 3)
+        # Ya no queda nada pendiente
+        salida = StringIO()
+        call_command('generar_miniaturas', procesos=1, stdout=salida)
+        self.assertIn('No hay portadas pendientes', salida.getvalue())
+
+
+class EstadisticasDashboardTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.crear_autor()
+        self.libros = self.crear_libros(3)
+        self.crear_biblio()
+
+    def prestar(self, libro, dias_atras=0):
+        inicio = timezone.now() - timedelta(days=dias_atras)
+        # Los contadores se suman al confirmar la transacción del préstamo
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.crear_prestamo(
+                libro, self.biblio, fecha_prestamo=inicio, fecha_devolucion_prevista=inicio + timedelta(days=14)
+            )
+
+    def contadores(self):
+        return (
+            sorted(EstadisticaMensual.objects.filter(prestamos__gt=0).values_list('mes', 'prestamos')),
+            sorted(EstadisticaLibro.objects.filter(prestamos__gt=0).values_list('libro_id', 'prestamos')),
+            sorted(EstadisticaAutor.objects.filter(prestamos__gt=0).values_list('autor_id', 'prestamos')),
+        )
+
+    def test_contadores_incrementales_coinciden_con_reconstruir(self):
+        self.prestar(self.libros[0])
+        self.prestar(self.libros[0], dias_atras=40)
+        borrado = self.prestar(self.libros[1], dias_atras=70)
+        self.prestar(self.libros[2], dias_atras=70)
+        borrado.delete()
+        incremental = self.contadores()
+        self.assertIn((self.libros[0].pk, 2), incremental[1])
+        self.assertEqual(incremental[2], [(self.autor.pk, 3)])
+        estadisticas.reconstruir()
+        self.assertEqual(self.contadores(), incremental)
+
+    def test_prestamo_deshecho_no_cuenta(self):
+        self.prestar(self.libros[0])
+        operaciones = (
+            lambda: prestamos.prestar(self.libros[1], self.biblio),
+            lambda: prestamos.prestar_varios(self.biblio, [self.libros[2].isbn]),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            for prestar in operaciones:
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    self.assertTrue(prestar())
+                    # Sin tocar (ni bloquear) la fila del mes mientras dura la transacción
+                    self.assertEqual(EstadisticaMensual.objects.get().prestamos, 1)
+                    raise RuntimeError('falla después de prestar')
+        self.assertEqual(EstadisticaMensual.objects.get().prestamos, 1)
+        self.assertEqual(self.contadores()[1:], ([(self.libros[0].pk, 1)], [(self.autor.pk, 1)]))
+
+    def test_dashboard_cacheado_e_invalidado(self):
+        self.prestar(self.libros[0])
+        self.entrar(self.biblio)
+        url = reverse('dashboard_bibliotecario')
+        resp = self.client.get(url)
+        self.assertEqual(resp.context['total_prestamos_activos'], 1)
+        self.assertEqual(json.loads(resp.context['chart_libros_labels']), ['Libro 0'])
+        # La segunda visita no recalcula nada
+        with self.assertNumQueries(2):  # sesión y usuario
+            self.client.get(url)
+        prestamo = self.prestar(self.libros[1])
+        prestamo.delete()
+        self.prestar(self.libros[2])
+        resp = self.client.get(url)
+        self.assertEqual(resp.context['total_prestamos_activos'], 2)
+        self.assertEqual(json.loads(resp.context['chart_autores_data']), [2])
+
+
+class CirculacionMasivaTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.crear_autor()
+        self.crear_lector(email='l@ejemplo.com')
+        self.crear_biblio()
+        self.libros = self.crear_libros(60)
+
+    def prestar_todos(self, libros):
+        # Las estadísticas se suman al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            return [prestamos.prestar(libro, self.lector) for libro in libros]
+
+    def test_devolucion_masiva_informa_cada_identificador(self):
+        p0, p1, p2 = self.prestar_todos(self.libros[:3])
+        otro = self.crear_usuario('otro', email='o@ejemplo.com')
+        tercero = self.crear_usuario('tercero', email='t@ejemplo.com')
+        Reserva.objects.create(libro=self.libros[1], usuario=otro)
+        Reserva.objects.create(libro=self.libros[1], usuario=tercero)
+        CorreoPendiente.objects.all().delete()
+
+        resultados = prestamos.devolver_varios(
+            [str(p0.pk), '978-3000-00-0001', 'abc', str(p0.pk), '9999999999999', str(p2.pk)]
+        )
+        self.assertEqual([r['ok'] for r in resultados], [True, True, False, False, False, True])
+        self.assertIn('Apartado para otro', resultados[1]['detalle'])
+        self.assertEqual(resultados[2]['detalle'], 'Identificador inválido.')
+        self.assertEqual(resultados[3]['detalle'], 'Repetido en la lista.')
+        self.assertEqual(Libro.objects.filter(estado=Libro.ESTADO_DISPONIBLE).count(), 59)
+        self.assertEqual(Libro.objects.get(pk=self.libros[1].pk).estado, Libro.ESTADO_RESERVADO)
+        # Solo la primera reserva de la cola queda retenida y notificada
+        retenidas = Reserva.objects.filter(estado=Reserva.ESTADO_RETENIDA)
+        self.assertEqual(list(retenidas.values_list('usuario__username', flat=True)), ['otro'])
+        self.assertEqual(list(CorreoPendiente.objects.values_list('destinatario', flat=True)), ['o@ejemplo.com'])
+        # Ya devueltos: una segunda pasada no cambia nada
+        self.assertFalse(any(r['ok'] for r in prestamos.devolver_varios([str(p0.pk), str(p1.pk)])))
+
+    def test_devolucion_repetida_en_el_mismo_instante(self):
+        self.prestar_todos(self.libros[:1])
+        for username in ('otro', 'tercero'):
+            Reserva.objects.create(libro=self.libros[0], usuario=self.crear_usuario(username))
+        # Dos lotes con la misma marca de tiempo: el segundo no debe contar el préstamo del primero
+        with mock.patch.object(timezone, 'now', return_value=timezone.now()):
+            primera = prestamos.devolver_varios([self.libros[0].isbn])
+            segunda = prestamos.devolver_varios([self.libros[0].isbn])
+        self.assertTrue(primera[0]['ok'])
+        self.assertFalse(segunda[0]['ok'])
+        self.assertEqual(
+            list(Reserva.objects.filter(estado=Reserva.ESTADO_RETENIDA).values_list('usuario__username', flat=True)),
+            ['otro'],
+        )
+
+    def test_limite_respeta_el_orden_escaneado_y_el_contador_actual(self):
+        with self.settings(MAX_PRESTAMOS_LECTOR=3):
+            # Otro préstamo del mismo lector, hecho con otra instancia
+            self.prestar_todos(self.libros[:1])
+            lector = User.objects.get(pk=self.lector.pk)
+            prestamos.prestar(self.libros[1], self.lector)
+            pedidos = [self.libros[9], self.libros[2], self.libros[5]]
+            resultados = prestamos.prestar_varios(lector, [libro.isbn for libro in pedidos])
+        self.assertEqual([r['ok'] for r in resultados], [True, False, False])
+        self.assertIn('límite', resultados[1]['detalle'])
+        self.assertEqual(
+            set(Prestamo.objects.activos().values_list('libro_id', flat=True)),
+            {self.libros[0].pk, self.libros[1].pk, self.libros[9].pk},
+        )
+
+    def test_consultas_constantes(self):
+        consultas = []
+        for libros in (self.libros[:5], self.libros[5:55]):
+            isbns = [libro.isbn for libro in libros]
+            self.prestar_todos(libros)
+            with CaptureQueriesContext(connection) as ctx:
+                resultados = prestamos.devolver_varios(isbns)
+            self.assertTrue(all(r['ok'] for r in resultados))
+            consultas.append(len(ctx))
+        self.assertEqual(consultas[0], consultas[1])
+
+    def test_prestamo_masivo_desde_la_vista(self):
+        self.prestar_todos(self.libros[:1])
+        self.entrar(self.biblio)
+        texto = '\n'.join([self.libros[0].isbn, self.libros[1].isbn, str(self.libros[2].pk), self.libros[2].isbn])
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(
+                reverse('prestamos_prestar_varios'), {'lector': 'lector', 'identificadores': texto},
+                HTTP_ACCEPT='application/json',
+            )
+        datos = resp.json()
+        self.assertEqual(datos['correctos'], 2)
+        self.assertEqual([r['ok'] for r in datos['resultados']], [False, True, True, False])
+        self.assertEqual(Prestamo.objects.activos().filter(usuario=self.lector).count(), 3)
+        self.assertEqual(EstadisticaAutor.objects.get(autor=self.autor).prestamos, 3)
+        isbns = ' '.join(libro.isbn for libro in self.libros[:4])
+        resp = self.client.post(reverse('prestamos_devolver_varios'), {'identificadores': isbns})
+        self.assertContains(resp, '3 de 4 identificador(es)')
+
+
+class RouterReplicaTests(TestCase):
+    def setUp(self):
+        # Sin DATABASE_REPLICA_URL en las pruebas: se simula que existe el alias
+        parche = mock.patch.object(routers, 'replica_configurada', return_value=True)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.addCleanup(routers.activar_replica, False)
+
+    def decisiones(self, metodo, nombre_url, cookies=None):
+        """Pasa una petición por ReplicaMiddleware y devuelve (alias para Libro, alias para Usuario, respuesta)."""
+        router, vistas = RouterReplica(), []
+
+        def vista(request):
+            middleware.process_view(request, None, (), {})
+            vistas.append((router.db_for_read(Libro), router.db_for_read(User)))
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(vista)
+        url = reverse(nombre_url)
+        peticion = getattr(RequestFactory(), metodo)(url)
+        peticion.COOKIES.update(cookies or {})
+        peticion.resolver_match = resolve(url)
+        respuesta = middleware(peticion)
+        return vistas[0][0], vistas[0][1], respuesta
+
+    def test_listados_leen_de_la_replica_salvo_usuarios(self):
+        libro, usuario, _ = self.decisiones('get', 'dashboard_bibliotecario')
+        self.assertEqual((libro, usuario), ('replica', 'default'))
+        self.assertEqual(self.decisiones('get', 'libro_list')[0], 'replica')
+        # Las demás vistas siguen en la principal
+        self.assertEqual(self.decisiones('get', 'home')[0], 'default')
+
+    def test_despues_de_escribir_se_lee_de_la_principal(self):
+        *_, respuesta = self.decisiones('post', 'libro_list')
+        cookie = respuesta.cookies['primaria_hasta']
+        self.assertEqual(self.decisiones('get', 'libro_list', {'primaria_hasta': cookie.value})[0], 'default')
+
+        router = RouterReplica()
+        with leer_de_replica():
+            self.assertEqual(router.db_for_read(Libro), 'replica')
+            self.assertEqual(router.db_for_write(Libro), 'default')
+            # Lectura tras escritura en la misma tarea
+            self.assertEqual(router.db_for_read(Libro), 'default')
+        self.assertEqual(router.db_for_read(Libro), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'core'))
+
+    def test_streaming_lee_de_la_replica_hasta_cerrar(self):
+        router = RouterReplica()
+
+        def vista(request):
+            middleware.process_view(request, None, (), {})
+            return StreamingHttpResponse(router.db_for_read(Libro) for _ in range(2))
+
+        middleware = ReplicaMiddleware(vista)
+        url = reverse('libro_list')
+        peticion = RequestFactory().get(url)
+        peticion.resolver_match = resolve(url)
+        respuesta = middleware(peticion)
+        self.assertEqual(next(iter(respuesta)), b'replica')
+        cerrar_respuesta(respuesta)
+        self.assertEqual(router.db_for_read(Libro), 'default')
+
+
+class ReplicaSQLiteTests(DatosPruebaMixin, TestCase):
+    """Principal y réplica en dos archivos SQLite con datos distintos, como una réplica con retraso."""
+
+    @classmethod
+    def setUpClass(cls):
+        # En el atributo de clase el runner buscaría el alias antes de que exista
+        cls.databases = {'default', 'replica'}
+        carpeta = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        replica = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(carpeta, 'replica.sqlite3'), 'TEST': {'MIRROR': None},
+        }
+        with warnings.catch_warnings():
+            # Django avisa de que cambiar DATABASES no reconfigura las conexiones: se registra abajo
+            warnings.simplefilter('ignore')
+            cls.enterClassContext(override_settings(DATABASES={**settings.DATABASES, 'replica': replica}))
+        connections.settings['replica'] = replica
+        cls.addClassCleanup(cls.quitar_replica)
+        # Solo las tablas del catálogo (allow_migrate no migra la réplica)
+        with connections['replica'].schema_editor() as editor:
+            for modelo in (Autor, Categoria, Libro):
+                editor.create_model(modelo)
+        super().setUpClass()
+
+    @classmethod
+    def quitar_replica(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(routers.activar_replica, False)
+        self.crear_autor()
+        self.crear_libros(1, titulo='En la principal {}')
+        Autor.objects.using('replica').bulk_create([Autor(pk=self.autor.pk, nombre='Ana', apellido='Autora')])
+        Libro.objects.using('replica').bulk_create(
+            [Libro(titulo='En la réplica', autor_id=self.autor.pk, isbn='9783000000000')]
+        )
+
+    def titulos(self):
+        resp = self.client.get(reverse('libro_list'))
+        self.assertEqual(resp.status_code, 200)
+        return [libro.titulo for libro in resp.context['libros']]
+
+    def test_listado_lee_de_la_replica(self):
+        self.assertEqual(self.titulos(), ['En la réplica'])
+        # Fuera de VISTAS_REPLICA se lee la principal
+        self.assertContains(self.client.get(reverse('libro_detail', args=[Libro.objects.get().pk])), 'En la principal 0')
+
+    def test_despues_de_escribir_el_navegador_lee_la_principal(self):
+        libro = Libro.objects.get()
+        self.entrar(self.crear_lector())
+        self.assertEqual(self.titulos(), ['En la réplica'])
+        self.client.post(reverse('prestamo_crear', args=[libro.pk]))
+        # Cookie primaria_hasta: el lector ve su propio préstamo aunque la réplica no lo tenga
+        self.assertIn('primaria_hasta', self.client.cookies)
+        self.assertEqual(self.titulos(), ['En la principal 0'])
+        self.assertEqual(Libro.objects.using('replica').get().estado, Libro.ESTADO_DISPONIBLE)
+
+    def test_lectura_tras_escritura_en_la_misma_tarea(self):
+        with leer_de_replica():
+            self.assertEqual(list(Libro.objects.values_list('titulo', flat=True)), ['En la réplica'])
+            self.crear_libros(1, titulo='Nuevo {}')
+            self.assertEqual(
+                list(Libro.objects.order_by('pk').values_list('titulo', flat=True)), ['En la principal 0', 'Nuevo 1']
+            )
+        self.assertEqual(Libro.objects.count(), 2)
+
+
+class ApiCatalogoTests(DatosPruebaMixin, TestCase):
+    def setUp(self):
+        self.crear_autor()
+        self.libros = self.crear_libros(5, categoria=Categoria.objects.create(nombre='Novela'))
+        Reserva.objects.create(libro=self.libros[0], usuario=self.crear_lector())
+
+    def test_campos_elegidos_y_paginacion_por_cursor(self):
+        url = reverse('api_libros')
+        with self.assertNumQueries(2):  # versión del catálogo + página
+            datos = self.client.get(url, {'fields': 'id,titulo,disponible', 'limite': 2}).json()
+        self.assertEqual(datos['resultados'][0], {'id': self.libros[0].pk, 'titulo': 'Libro 0', 'disponible': True})
+        titulos = [l['titulo'] for l in datos['resultados']]
+        while datos['siguiente']:
+            datos = self.client.get(url, {'fields': 'titulo', 'limite': 2, 'cursor': datos['siguiente']}).json()
+            titulos += [l['titulo'] for l in datos['resultados']]
+        self.assertEqual(titulos, [f'Libro {i}' for i in range(5)])
+
+        completo = self.client.get(url, {'fields': 'autor,categoria,en_cola', 'q': 'libro 0'}).json()
+        self.assertEqual(completo['resultados'], [{'autor': 'Ana Autora', 'categoria': 'Novela', 'en_cola': 1}])
+        self.assertEqual(self.client.get(url, {'fields': 'titulo,clave'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'roto'}).status_code, 404)
+
+    def test_busqueda_masiva_en_una_consulta(self):
+        pedidos = {'ids': f'{self.libros[1].pk},999', 'isbn': f'{self.libros[3].isbn},9780000000000', 'fields': 'id'}
+        with self.assertNumQueries(2):
+            datos = self.client.get(reverse('api_libros'), pedidos).json()
+        self.assertEqual(datos['resultados'], [{'id': self.libros[1].pk}, {'id': self.libros[3].pk}])
+        self.assertEqual(datos['no_encontrados'], [999, '9780000000000'])
+        self.assertEqual(self.client.get(reverse('api_libro', args=[999])).status_code, 404)
+
+    def test_etag_responde_304_hasta_que_cambia_el_catalogo(self):
+        url = reverse('api_libros')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        prestamos.prestar(self.libros[2], Usuario.objects.get(username='lector'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Autores y categorías: ETag del contenido
+        url = reverse('api_autores')
+        respuesta = self.client.get(url, {'fields': 'nombre,libros'})
+        self.assertEqual(respuesta.json()['resultados'], [{'nombre': 'Ana', 'libros': 5}])
+        self.assertEqual(self.client.get(url, {'fields': 'nombre,libros'}, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        self.assertEqual(self.client.post(url).status_code, 405)
+
+
+class AutocompletadoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.garcia = Autor.objects.create(nombre='Gabriel', apellido='García Márquez')
+        Autor.objects.create(nombre='Julio', apellido='Cortázar')
+        novela = Categoria.objects.create(nombre='Novela')
+        self.libro = Libro.objects.create(
+            titulo='Cien años de soledad', autor=self.garcia, categoria=novela, isbn='9788437604947'
+        )
+        Libro.objects.create(titulo='Rayuela', autor=self.garcia, isbn='9788437604572')
+
+    def sugerir(self, tipo, q, **extra):
+        return self.client.get(reverse('api_autocompletar'), {'tipo': tipo, 'q': q, **extra}).json()['resultados']
+
+    def test_autores_y_categorias_por_prefijo_en_memoria(self):
+        esperado = [{'id': self.garcia.pk, 'texto': 'Gabriel García Márquez'}]
+        self.assertEqual(self.sugerir('autor', 'GARCIA m'), esperado)
+        # Índice ya construido: sin consultas
+        with self.assertNumQueries(0):
+            self.assertEqual(self.sugerir('autor', 'gabr'), esperado)
+        self.assertEqual(self.sugerir('categoria', 'nov')[0]['texto'], 'Novela')
+
+        # Un autor nuevo invalida la versión compartida
+        Autor.objects.create(nombre='Gabriela', apellido='Mistral')
+        self.assertEqual([r['texto'] for r in self.sugerir('autor', 'gabr')], ['Gabriel García Márquez', 'Gabriela Mistral'])
+        self.assertEqual(len(self.sugerir('autor', 'gabr', k=1)), 1)
+
+    def test_libros_por_titulo_e_isbn(self):
+        self.assertEqual(self.sugerir('libro', 'cien sol'), [{'id': self.libro.pk, 'texto': 'Cien años de soledad'}])
+        self.assertEqual(len(self.sugerir('libro', '978-84-376')), 2)
+        self.assertEqual(self.sugerir('libro', '97884376049')[0]['texto'], 'Cien años de soledad (9788437604947)')
+        self.assertEqual(self.sugerir('libro', 'c'), [])
+
+        # El LRU se invalida con la versión del catálogo
+        self.libro.titulo = 'Crónica de una muerte anunciada'
+        self.libro.save()
+        self.assertEqual(self.sugerir('libro', 'cien'), [])
+        self.assertEqual(self.client.get(reverse('api_autocompletar'), {'tipo': 'editorial'}).status_code, 400)
+
+    def test_catalogo_no_incrusta_todos_los_autores(self):
+        respuesta = self.client.get(reverse('libro_list'), {'autor': self.garcia.pk})
+        self.assertContains(respuesta, 'value="Gabriel García Márquez"')
+        self.assertNotContains(respuesta, 'Cortázar')
+
+
+class AjustesSQLiteTests(TestCase):
+    def test_pragmas_y_modo_de_transaccion(self):
+        with connection.cursor() as cursor:
+            valores = {}
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                cursor.execute(f'PRAGMA {pragma}')
+                valores[pragma] = cursor.fetchone()[0]
+        # synchronous=NORMAL es 1 y temp_store=MEMORY es 2
+        # WAL solo si se pidió (SQLITE_JOURNAL_MODE o Render); si no, el modo por defecto de SQLite
+        diario = (settings.SQLITE_JOURNAL_MODE or 'delete').lower()
+        self.assertEqual(valores, {'journal_mode': diario, 'synchronous': 1, 'busy_timeout': 5000, 'temp_store': 2})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_benchmark_de_escrituras(self):
+        salida = StringIO()
+        call_command('benchmark_escrituras', procesos=2, operaciones=3, libros=5, modo='ajustado', stdout=salida)
+        self.assertIn('ajustado', salida.getvalue())
+        self.assertIn('0 "database is locked"', salida.getvalue())
+
+
+class PrestamosConcurrentesTests(DatosPruebaMixin, TransactionTestCase):
+    """Cientos de préstamos simultáneos: nunca dos préstamos activos del mismo libro."""
+    HILOS = 200
+    RONDAS = 3
+    # En SQLite cada préstamo completo retiene el bloqueo de escritura de toda la base
+    # (~10 ms): 200 a la vez superan el busy_timeout de 5 s, como lo harían 200 workers
+    HILOS_SQLITE = 32
+
+    def setUp(self):
+        self.crear_autor()
+        # Sin contraseña: cifrar cientos de claves dominaría la prueba
+        self.lectores = [
+            User.objects.create(username=f'lector{i}', rol=User.ROL_LECTOR) for i in range(self.HILOS)
+        ]
+
+    def en_paralelo(self, funcion, argumentos, hilos=HILOS):
+        # Con menos hilos que tareas el propio ejecutor las mantiene ocupados
+        barrera = Barrier(len(argumentos)) if hilos >= len(argumentos) else None
+
+        def tarea(args):
+            try:
+                if barrera:
+                    barrera.wait(timeout=5)
+                return funcion(*args)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            return list(ejecutor.map(tarea, argumentos))
+
+    def test_un_solo_prestamo_por_libro(self):
+        libro = Libro.objects.create(titulo='Único', autor=self.autor, isbn='9785300000001')
+        for _ in range(self.RONDAS):
+            resultados = self.en_paralelo(
+                lambda lector: prestamos.prestar(Libro.objects.get(pk=libro.pk), lector),
+                [(lector,) for lector in self.lectores],
+            )
+            self.assertEqual(sum(r is not None for r in resultados), 1)
+            ganador = next(r for r in resultados if r is not None)
+            self.assertEqual(Prestamo.objects.activos().filter(libro=libro).count(), 1)
+            # Devoluciones simultáneas: solo una cuenta
+            devoluciones = self.en_paralelo(prestamos.devolver, [(ganador.pk,)] * self.HILOS)
+            self.assertEqual(sum(d is not None for d in devoluciones), 1)
+        self.assertEqual(Prestamo.objects.filter(libro=libro).count(), self.RONDAS)
+
+    def test_libros_distintos_no_se_bloquean(self):
+        libros = self.crear_libros(self.HILOS, titulo='L{}')
+        hilos = self.HILOS_SQLITE if connection.vendor == 'sqlite' else self.HILOS
+        resultados = self.en_paralelo(prestamos.prestar, list(zip(libros, self.lectores)), hilos)
+        self.assertTrue(all(resultados))
+        self.assertEqual(Prestamo.objects.activos().count(), self.HILOS)
+        self.assertFalse(Libro.objects.filter(estado=Libro.ESTADO_DISPONIBLE).exists())
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_prestamo_no_espera_a_otro_libro(self):
+        # En SQLite el bloqueo de escritura es de toda la base: solo aplica con bloqueos por fila
+        libro_a = Libro.objects.create(titulo='A', autor=self.autor, isbn='9785500000001')
+        libro_b = Libro.objects.create(titulo='B', autor=self.autor, isbn='9785500000002')
+        tomado, seguir = threading.Event(), threading.Event()
+
+        def prestamo_abierto():
+            # Toma la fila de A como prestar() y no confirma hasta que B termine
+            try:
+                with transaction.atomic():
+                    Libro.objects.filter(pk=libro_a.pk, estado=Libro.ESTADO_DISPONIBLE).update(
+                        estado=Libro.ESTADO_PRESTADO
+                    )
+                    tomado.set()
+                    seguir.wait(timeout=10)
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=prestamo_abierto)
+        hilo.start()
+        try:
+            self.assertTrue(tomado.wait(timeout=5))
+            inicio = time.monotonic()
+            self.assertIsNotNone(prestamos.prestar(libro_b, self.lectores[1]))
+            self.assertLess(time.monotonic() - inicio, 2)
+        finally:
+            seguir.set()
+            hilo.join()
+
@@ -0,0 +1,163 @@
+# core/trabajos.py
+"""
+Cola de trabajos en segundo plano respaldada por la base de datos.
+
+Las vistas llaman a ``encolar()`` y responden al instante; el comando
+``procesar_trabajos`` (uno o varios procesos) reclama los pendientes con un
+``UPDATE`` condicional, genera el archivo en ``MEDIA_ROOT/reportes/`` y deja
+el trabajo como completado. Dos solicitudes idénticas dentro de la ventana de
+frescura (``REPORTES_VENTANA_FRESCURA``) reutilizan el mismo trabajo.
+Las tareas internas de ``TAREAS`` (miniaturas de portadas grandes) no dejan
+archivo para descargar. Las ``IMPORTACIONES`` escriben en la base principal y
+dejan como archivo el reporte de filas rechazadas.
+"""
+import hashlib
+import json
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import importacion, portadas, reportes, routers
+from .models import Trabajo
+
+# Parámetros de filtrado que aceptan los reportes de libros
+PARAMETROS_LIBROS = ('q', 'estado', 'categoria', 'autor')
+
+
+def _libros_csv(salida, parametros):
+    reportes.escribir_csv(salida, reportes.CABECERA_LIBROS, reportes.filas_libros(parametros))
+
+
+def _prestamos_csv(salida, parametros):
+    reportes.escribir_csv(salida, reportes.CABECERA_PRESTAMOS, reportes.filas_prestamos())
+
+
+def _prestamos_pdf(salida, parametros):
+    reportes.escribir_prestamos_pdf(salida, parametros.get('agrupar'))
+
+
+# tipo -> (función generadora, extensión del archivo)
+GENERADORES = {
+    Trabajo.TIPO_LIBROS_EXCEL: (reportes.escribir_libros_excel, 'xlsx'),
+    Trabajo.TIPO_LIBROS_CSV: (_libros_csv, 'csv'),
+    Trabajo.TIPO_PRESTAMOS_PDF: (_prestamos_pdf, 'pdf'),
+    Trabajo.TIPO_PRESTAMOS_CSV: (_prestamos_csv, 'csv'),
+}
+
+# tipo -> (función que escribe el reporte y devuelve el resumen, extensión)
+IMPORTACIONES = {
+    Trabajo.TIPO_IMPORTAR_LIBROS: (importacion.ejecutar_trabajo, 'csv'),
+}
+
+# tipo -> función que recibe los parámetros (tareas internas, sin archivo descargable)
+TAREAS = {
+    Trabajo.TIPO_MINIATURAS: portadas.ejecutar_trabajo,
+}
+
+
+def calcular_clave(tipo, parametros):
+    datos = json.dumps([tipo, parametros], sort_keys=True)
+    return hashlib.sha256(datos.encode()).hexdigest()
+
+
+def ventana_frescura():
+    return timedelta(seconds=getattr(settings, 'REPORTES_VENTANA_FRESCURA', 300))
+
+
+def encolar(tipo, parametros=None, usuario=None):
+    """
+    Devuelve ``(trabajo, creado)``. Si ya hay uno idéntico pendiente, en curso
+    o terminado dentro de la ventana de frescura, se reutiliza.
+    """
+    parametros = {k: v for k, v in (parametros or {}).items() if v}
+    clave = calcular_clave(tipo, parametros)
+    for intento in range(3):
+        limite = timezone.now() - ventana_frescura()
+        existente = Trabajo.objects.filter(clave=clave, creado__gte=limite).exclude(
+            estado=Trabajo.ESTADO_ERROR
+        ).order_by('-creado').first()
+        if existente:
+            return existente, False
+        try:
+            with transaction.atomic():
+                return Trabajo.objects.create(
+                    tipo=tipo, parametros=parametros, clave=clave, solicitado_por=usuario
+                ), True
+        except IntegrityError:
+            # Otra solicitud idéntica ganó la carrera (restricción trabajo_clave_vivo_unico).
+            # Se vuelve a buscar: si ya terminó se reutiliza y si falló se crea otro
+            if intento == 2:
+                raise
+
+
+def reclamar_siguiente():
+    """Marca como 'en proceso' el pendiente más antiguo; seguro con varios procesos."""
+    while True:
+        pk = Trabajo.objects.filter(estado=Trabajo.ESTADO_PENDIENTE).order_by('creado').values_list(
+            'pk', flat=True
+        ).first()
+        if pk is None:
+            return None
+        reclamado = Trabajo.objects.filter(pk=pk, estado=Trabajo.ESTADO_PENDIENTE).update(
+            estado=Trabajo.ESTADO_EN_PROCESO, iniciado=timezone.now()
+        )
+        if reclamado:
+            return Trabajo.objects.get(pk=pk)
+        # Otro proceso se lo llevó primero; probar con el siguiente
+
+
+def _generar_archivo(trabajo, generar, extension):
+    """Guarda en ``trabajo.archivo`` lo que escribe ``generar`` y devuelve su resultado."""
+    with tempfile.TemporaryFile() as temporal:
+        resultado = generar(temporal, trabajo.parametros)
+        temporal.seek(0)
+        nombre = f'{trabajo.tipo}-{uuid.uuid4().hex}.{extension}'
+        trabajo.archivo.save(nombre, File(temporal), save=False)
+    return resultado
+
+
+def ejecutar(trabajo):
+    try:
+        if trabajo.tipo in TAREAS:
+            TAREAS[trabajo.tipo](trabajo.parametros)
+        elif trabajo.tipo in IMPORTACIONES:
+            trabajo.resumen = _generar_archivo(trabajo, *IMPORTACIONES[trabajo.tipo])
+        else:
+            # Los reportes solo leen: a la réplica, si la hay
+            with routers.leer_de_replica():
+                _generar_archivo(trabajo, *GENERADORES[trabajo.tipo])
+        trabajo.estado = Trabajo.ESTADO_COMPLETADO
+    except Exception as e:
+        trabajo.estado = Trabajo.ESTADO_ERROR
+        trabajo.error = str(e)
+    trabajo.terminado = timezone.now()
+    trabajo.save(update_fields=['archivo', 'estado', 'error', 'resumen', 'terminado'])
+    return trabajo
+
+
+def recuperar_colgados(minutos=30):
+    """Devuelve a la cola los trabajos de un proceso que murió a mitad."""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return Trabajo.objects.filter(estado=Trabajo.ESTADO_EN_PROCESO, iniciado__lt=limite).update(
+        estado=Trabajo.ESTADO_PENDIENTE, iniciado=None
+    )
+
+
+def purgar_antiguos(dias):
+    """Borra los trabajos terminados (y sus archivos) de hace más de ``dias``."""
+    limite = timezone.now() - timedelta(days=dias)
+    antiguos = Trabajo.objects.filter(
+        estado__in=[Trabajo.ESTADO_COMPLETADO, Trabajo.ESTADO_ERROR], creado__lt=limite
+    )
+    total = 0
+    for trabajo in antiguos.iterator():
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+        trabajo.delete()
+        total += 1
+    return total
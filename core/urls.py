@@ -1,6 +1,6 @@
 # core/urls.py
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # URLs de Autenticación
@@ -9,6 +9,7 @@ urlpatterns = [
     path('logout/', views.custom_logout_view, name='logout'),
     # Salud de BD
     path('health/db/', views.db_health, name='db_health'),
+    path('metrics/', views.metricas, name='metricas'),
     
     # URLs de Dashboards
     path('dashboard/bibliotecario/', views.DashboardView.as_view(), name='dashboard_bibliotecario'),
@@ -20,6 +21,7 @@ urlpatterns = [
     path('libros/nuevo/', views.LibroCreateView.as_view(), name='libro_create'),
     path('libros/<int:pk>/editar/', views.LibroUpdateView.as_view(), name='libro_update'),
     path('libros/<int:pk>/eliminar/', views.LibroDeleteView.as_view(), name='libro_delete'),
+    path('libros/importar/', views.ImportarLibrosView.as_view(), name='libros_importar'),
     
     # --- URLs DE PRÉSTAMOS ---
     path('prestamos/crear/<int:libro_pk>/', views.CrearPrestamoView.as_view(), name='prestamo_crear'),
@@ -27,12 +29,27 @@ urlpatterns = [
     path('prestamos/gestion/', views.GestionPrestamosListView.as_view(), name='gestion_prestamos'),
     path('prestamos/devolver/<int:prestamo_pk>/', views.DevolverLibroView.as_view(), name='prestamo_devolver'),
     path('prestamos/marcar-retrasado/<int:prestamo_pk>/', views.MarcarPrestamoRetrasadoView.as_view(), name='prestamo_marcar_retrasado'),
+    # Mostrador de circulación: operaciones en bloque
+    path('prestamos/devolucion-masiva/', views.CirculacionMasivaView.as_view(operacion='devolver'), name='prestamos_devolver_varios'),
+    path('prestamos/prestamo-masivo/', views.CirculacionMasivaView.as_view(operacion='prestar'), name='prestamos_prestar_varios'),
     
     # --- URLs DE REPORTES ---
     path('reportes/libros-excel/', views.exportar_libros_excel, name='reporte_libros_excel'),
     path('reportes/prestamos-pdf/', views.exportar_prestamos_pdf, name='reporte_prestamos_pdf'),
     path('reportes/libros-csv/', views.exportar_libros_csv, name='reporte_libros_csv'),
     path('reportes/prestamos-csv/', views.exportar_prestamos_csv, name='reporte_prestamos_csv'),
+    # Reportes en segundo plano (cola de trabajos)
+    path('reportes/solicitar/<str:tipo>/', views.solicitar_reporte, name='reporte_solicitar'),
+    path('reportes/trabajos/', views.TrabajosListView.as_view(), name='reportes_trabajos'),
+    path('reportes/trabajos/<int:pk>/', views.estado_trabajo, name='trabajo_estado'),
+    path('reportes/trabajos/<int:pk>/descargar/', views.descargar_trabajo, name='trabajo_descargar'),
+
+    # --- API JSON DEL CATÁLOGO (solo lectura) ---
+    path('api/libros/', api.libros, name='api_libros'),
+    path('api/libros/<int:pk>/', api.libro, name='api_libro'),
+    path('api/autores/', api.autores, name='api_autores'),
+    path('api/categorias/', api.categorias, name='api_categorias'),
+    path('api/autocompletar/', api.sugerencias, name='api_autocompletar'),
 
     # --- URLs DE RESERVAS ---
     path('reservas/crear/<int:libro_pk>/', views.CrearReservaView.as_view(), name='reserva_crear'),
@@ -1,33 +1,34 @@
 # core/views.py
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.views import LoginView
 from django.views.generic import (
-    CreateView, ListView, DetailView, UpdateView, DeleteView, TemplateView
+    CreateView, ListView, DetailView, UpdateView, DeleteView, TemplateView, FormView
 )
-from django.urls import reverse_lazy
-from .forms import CustomUserCreationForm, LibroForm, CustomAuthenticationForm
-from .models import Usuario, Libro, Autor, Categoria, Prestamo, Reserva
+from django.urls import reverse, reverse_lazy
+from .forms import CustomUserCreationForm, LibroForm, CustomAuthenticationForm, ImportarLibrosForm
+from .models import Usuario, Libro, Autor, Categoria, Prestamo, Reserva, Trabajo
+from . import busqueda, estadisticas, fragmentos, prestamos, reportes, reservas, trabajos
+from . import metricas as metricas_registro
+from .paginacion import PaginacionCursorMixin
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import user_passes_test
 from django.views import View
+from django.views.decorators.http import require_POST
 from django.utils import timezone
-from datetime import timedelta
 from django.contrib import messages
-from django.db.models import Count, Q
-from django.db.models.functions import TruncMonth
+from django.db.models import Q
 import json
 
 # --- IMPORTACIONES PARA REPORTES ---
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+import os
+import tempfile
+import uuid
+from django.core.files.storage import default_storage
 
 # --- IMPORTACIÓN PARA CORREO ---
-from django.core.mail import send_mail
 from django.conf import settings
 from django.http import JsonResponse
 
@@ -101,71 +102,66 @@ def db_health(request):
             'message': str(e)
         }, status=500)
 
+# --- Métricas por vista (formato de texto de Prometheus) ---
+def metricas(request):
+    """
+    Histogramas de consultas SQL, tiempos y tamaño de respuesta por vista
+    (``core/metricas.py``). Con ``METRICAS_TOKEN`` exige ``Authorization: Bearer <token>``;
+    sin él solo responde con DEBUG activado.
+    """
+    token = settings.METRICAS_TOKEN
+    if not token and not settings.DEBUG:
+        return HttpResponse('Define METRICAS_TOKEN para publicar las métricas.\n', status=403, content_type='text/plain')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('No autorizado.\n', status=401, content_type='text/plain')
+    return HttpResponse(metricas_registro.REGISTRO.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # --- Vistas de Dashboards ---
 
 class DashboardView(BibliotecarioRequiredMixin, TemplateView):
     template_name = 'dashboards/dashboard_bibliotecario.html'
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_libros'] = Libro.objects.count()
-        context['total_lectores'] = Usuario.objects.filter(rol=Usuario.ROL_LECTOR).count()
-        context['total_prestamos_activos'] = Prestamo.objects.filter(fecha_devolucion_real__isnull=True).count()
-        prestamos_por_mes = Prestamo.objects.annotate(
-            mes=TruncMonth('fecha_prestamo')
-        ).values('mes').annotate(total=Count('id')).order_by('mes')
-        labels_meses = [p['mes'].strftime('%b %Y') for p in prestamos_por_mes]
-        data_meses = [p['total'] for p in prestamos_por_mes]
-        context['chart_meses_labels'] = json.dumps(labels_meses)
-        context['chart_meses_data'] = json.dumps(data_meses)
-        top_libros = Libro.objects.annotate(
-            num_prestamos=Count('prestamos')
-        ).filter(num_prestamos__gt=0).order_by('-num_prestamos')[:5]
-        labels_libros = [libro.titulo for libro in top_libros]
-        data_libros = [libro.num_prestamos for libro in top_libros]
-        context['chart_libros_labels'] = json.dumps(labels_libros)
-        context['chart_libros_data'] = json.dumps(data_libros)
-
-        # Nuevo: Top autores por cantidad de préstamos
-        top_autores = Autor.objects.annotate(
-            num_prestamos=Count('libros__prestamos')
-        ).filter(num_prestamos__gt=0).order_by('-num_prestamos')[:5]
-        labels_autores = [f"{a.nombre} {a.apellido}" for a in top_autores]
-        data_autores = [a.num_prestamos for a in top_autores]
-        context['chart_autores_labels'] = json.dumps(labels_autores)
-        context['chart_autores_data'] = json.dumps(data_autores)
+        # Contadores precalculados y cacheados (core/estadisticas.py)
+        datos = estadisticas.resumen()
+        context['total_libros'] = datos['total_libros']
+        context['total_lectores'] = datos['total_lectores']
+        context['total_prestamos_activos'] = datos['total_prestamos_activos']
+        series = {'meses': datos['meses'], 'libros': datos['top_libros'], 'autores': datos['top_autores']}
+        for nombre, serie in series.items():
+            context[f'chart_{nombre}_labels'] = json.dumps([etiqueta for etiqueta, _ in serie])
+            context[f'chart_{nombre}_data'] = json.dumps([total for _, total in serie])
         return context
 
 def dashboard_lector(request):
     return render(request, 'dashboards/dashboard_lector.html')
 
 # --- VISTAS DEL CRUD DE LIBROS ---
-class LibroListView(ListView):
+class LibroListView(PaginacionCursorMixin, ListView):
     model = Libro
     template_name = 'core/libro_list.html' 
     context_object_name = 'libros' 
+    paginate_by = 24
+    def get_orden_cursor(self):
+        # Con búsqueda se ordena por relevancia; si no, alfabéticamente
+        return ('rank', 'id') if busqueda.terminos(self.request.GET.get('q')) else ('titulo', 'id')
     def get_queryset(self):
         qs = Libro.objects.all().select_related('autor', 'categoria')
-        q = self.request.GET.get('q')
-        estado = self.request.GET.get('estado')
-        categoria_id = self.request.GET.get('categoria')
-        autor_id = self.request.GET.get('autor')
-        if q:
-            qs = qs.filter(
-                Q(titulo__icontains=q) |
-                Q(isbn__icontains=q) |
-                Q(autor__nombre__icontains=q)
-            )
-        if estado:
-            qs = qs.filter(estado=estado)
-        if categoria_id:
-            qs = qs.filter(categoria_id=categoria_id)
-        if autor_id:
-            qs = qs.filter(autor_id=autor_id)
-        return qs.order_by('titulo')
+        return busqueda.filtrar_catalogo(qs, self.request.GET)
+    def get(self, request, *args, **kwargs):
+        # 304 si el catálogo no cambió desde la última visita (core/fragmentos.py)
+        version, ultimo_cambio = fragmentos.version_catalogo()
+        return fragmentos.responder_condicional(
+            request, version, ultimo_cambio, lambda: super(LibroListView, self).get(request, *args, **kwargs)
+        )
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categorias'] = Categoria.objects.all().order_by('nombre')
-        context['autores'] = Autor.objects.all().order_by('nombre')
+        context['fragmentos_segundos'] = settings.FRAGMENTOS_CACHE_SEGUNDOS
+        context['fragmentos_version'] = fragmentos.VERSION_PLANTILLAS
+        # Los filtros se eligen con el autocompletado (api_autocompletar): solo se lee el elegido
+        categoria_id, autor_id = self.request.GET.get('categoria', ''), self.request.GET.get('autor', '')
+        context['categoria_seleccionada'] = Categoria.objects.filter(pk=categoria_id).first() if categoria_id.isdigit() else None
+        context['autor_seleccionado'] = Autor.objects.filter(pk=autor_id).first() if autor_id.isdigit() else None
         context['selected'] = {
             'q': self.request.GET.get('q', ''),
             'estado': self.request.GET.get('estado', ''),
@@ -177,18 +173,27 @@ class LibroDetailView(DetailView):
     model = Libro
     template_name = 'core/libro_detail.html'
     context_object_name = 'libro'
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        return fragmentos.responder_condicional(
+            request, fragmentos.version_libro(self.object), self.object.actualizado_en,
+            lambda: self.render_to_response(self.get_context_data(object=self.object)),
+        )
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['fragmentos_segundos'] = settings.FRAGMENTOS_CACHE_SEGUNDOS
+        context['fragmentos_version'] = fragmentos.VERSION_PLANTILLAS
         usuario = self.request.user
-        usuario_bloqueado = False
-        if usuario.is_authenticated and usuario.rol == Usuario.ROL_LECTOR:
-            usuario_bloqueado = Prestamo.objects.filter(
-                usuario=usuario,
-                fecha_devolucion_real__isnull=True,
-                fecha_devolucion_prevista__lt=timezone.now()
-            ).exists()
-        context['usuario_bloqueado'] = usuario_bloqueado
-        context['puede_reservar'] = self.object.estado != Libro.ESTADO_DISPONIBLE
+        # Estado desnormalizado en el propio usuario: sin consultas extra
+        es_lector = usuario.is_authenticated and usuario.rol == Usuario.ROL_LECTOR
+        context['usuario_bloqueado'] = es_lector and usuario.tiene_sancion()
+        context['limite_alcanzado'] = es_lector and usuario.alcanzo_limite()
+        # Apartado para este lector tras una devolución: puede retirarlo aunque esté 'reservado'
+        apartado = usuario.is_authenticated and self.object.estado == Libro.ESTADO_RESERVADO
+        context['reserva_retenida'] = apartado and self.object.reservas.filter(
+            usuario=usuario, estado=Reserva.ESTADO_RETENIDA, fecha_expiracion__gt=timezone.now()
+        ).exists()
+        context['puede_reservar'] = self.object.estado != Libro.ESTADO_DISPONIBLE and not context['reserva_retenida']
         return context
 class LibroCreateView(BibliotecarioRequiredMixin, CreateView):
     model = Libro
@@ -200,6 +205,18 @@ class LibroUpdateView(BibliotecarioRequiredMixin, UpdateView):
     form_class = LibroForm
     template_name = 'core/libro_form.html'
     success_url = reverse_lazy('libro_list')
+class ImportarLibrosView(BibliotecarioRequiredMixin, FormView):
+    """Sube un CSV/XLSX y lo importa en la cola de trabajos (core/importacion.py)."""
+    template_name = 'core/importar_libros.html'
+    form_class = ImportarLibrosForm
+    def form_valid(self, form):
+        archivo = form.cleaned_data['archivo']
+        extension = os.path.splitext(archivo.name)[1].lower()
+        nombre = default_storage.save(f'importaciones/{uuid.uuid4().hex}{extension}', archivo)
+        trabajos.encolar(Trabajo.TIPO_IMPORTAR_LIBROS, {'archivo': nombre, 'origen': archivo.name}, self.request.user)
+        messages.success(self.request, f'Importación de "{archivo.name}" en cola. El reporte de filas rechazadas se descarga aquí al terminar.')
+        return redirect('reportes_trabajos')
+
 class LibroDeleteView(BibliotecarioRequiredMixin, DeleteView):
     model = Libro
     template_name = 'core/libro_confirm_delete.html'
@@ -266,40 +283,21 @@ class CategoriaDeleteView(BibliotecarioRequiredMixin, DeleteView):
 class CrearPrestamoView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         libro_pk = self.kwargs.get('libro_pk')
-        libro = Libro.objects.get(pk=libro_pk)
+        libro = get_object_or_404(Libro, pk=libro_pk)
         # Bloqueo por sanción: si el usuario tiene retrasos activos, no puede pedir
-        tiene_retraso = Prestamo.objects.filter(
-            usuario=request.user,
-            fecha_devolucion_real__isnull=True,
-            fecha_devolucion_prevista__lt=timezone.now()
-        ).exists()
-        if tiene_retraso:
+        if request.user.tiene_sancion():
             messages.error(request, 'No puedes pedir préstamos: tienes sanción activa por retraso.')
             return redirect('libro_detail', pk=libro_pk)
-        if libro.estado == Libro.ESTADO_DISPONIBLE:
-            fecha_devolucion = timezone.now() + timedelta(days=14) 
-            prestamo = Prestamo.objects.create(
-                libro=libro,
-                usuario=request.user,
-                fecha_devolucion_prevista=fecha_devolucion
-            )
-            libro.estado = Libro.ESTADO_PRESTADO
-            libro.save()
-            try:
-                send_mail(
-                    subject='Confirmación de Préstamo - Biblioteca Digital',
-                    message=(
-                        f'Hola {request.user.first_name or request.user.username},\n\n'
-                        f'Te confirmamos que has pedido prestado el libro: "{libro.titulo}".\n'
-                        f'La fecha de devolución es: {prestamo.fecha_devolucion_prevista.strftime("%Y-%m-%d")}.\n\n'
-                        '¡Gracias por usar la Biblioteca Digital!'
-                    ),
-                    from_email='noreply@biblioteca.com',
-                    recipient_list=[request.user.email],
-                    fail_silently=False,
-                )
-            except Exception as e:
-                messages.warning(request, f"Préstamo registrado, pero hubo un error enviando el correo: {e}")
+        if request.user.alcanzo_limite():
+            messages.error(request, f'Ya tienes {settings.MAX_PRESTAMOS_LECTOR} préstamos activos; devuelve alguno para pedir otro.')
+            return redirect('libro_detail', pk=libro_pk)
+        # Condicional: si dos lectores piden el mismo libro a la vez, solo uno lo obtiene
+        try:
+            prestamo = prestamos.prestar(libro, request.user)
+        except prestamos.LimitePrestamos as e:
+            messages.error(request, f'{e} Devuelve alguno para pedir otro.')
+            return redirect('libro_detail', pk=libro_pk)
+        if prestamo:
             messages.success(request, f'¡Has pedido prestado "{libro.titulo}" con éxito!')
             return redirect('mis_prestamos')
         else:
@@ -309,171 +307,231 @@ class CrearPrestamoView(LoginRequiredMixin, View):
 class CrearReservaView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         libro_pk = self.kwargs.get('libro_pk')
-        libro = Libro.objects.get(pk=libro_pk)
+        libro = get_object_or_404(Libro, pk=libro_pk)
         if libro.estado != Libro.ESTADO_DISPONIBLE:
-            # Evitar duplicadas activas del mismo usuario
-            ya_reservado = Reserva.objects.filter(libro=libro, usuario=request.user, atendida=False, fecha_expiracion__gt=timezone.now()).exists()
-            if ya_reservado:
+            # Una sola reserva viva por lector y libro (restricción reserva_viva_unica)
+            reserva, creada = reservas.reservar(libro, request.user)
+            if not creada:
                 messages.info(request, 'Ya tienes una reserva activa de este libro.')
                 return redirect('libro_detail', pk=libro_pk)
-            Reserva.objects.create(libro=libro, usuario=request.user)
-            messages.success(request, 'Reserva creada. Te avisaremos cuando el libro esté disponible.')
+            messages.success(request, 'Te has unido a la cola de reservas. Te avisaremos cuando el libro esté apartado para ti.')
             return redirect('mis_reservas')
         else:
             messages.info(request, 'El libro está disponible, puedes pedirlo en préstamo directamente.')
             return redirect('libro_detail', pk=libro_pk)
-class MisPrestamosListView(LoginRequiredMixin, ListView):
+class MisPrestamosListView(LoginRequiredMixin, PaginacionCursorMixin, ListView):
     model = Prestamo
     template_name = 'core/mis_prestamos.html'
     context_object_name = 'prestamos'
+    orden_cursor = ('-fecha_prestamo', '-id')
     def get_queryset(self):
-        return Prestamo.objects.filter(usuario=self.request.user).order_by('-fecha_prestamo')
-class GestionPrestamosListView(BibliotecarioRequiredMixin, ListView):
+        return Prestamo.objects.filter(usuario=self.request.user).select_related('libro').only(
+            'fecha_prestamo', 'fecha_devolucion_prevista', 'fecha_devolucion_real', 'retraso_manual',
+            'libro__titulo',
+        ).con_estado().order_by('-fecha_prestamo')
+class GestionPrestamosListView(BibliotecarioRequiredMixin, PaginacionCursorMixin, ListView):
     model = Prestamo
     template_name = 'core/gestion_prestamos.html'
     context_object_name = 'prestamos'
+    paginate_by = 50
+    def get_orden_cursor(self):
+        if self.request.GET.get('orden') == 'estado':
+            # Retrasados primero, luego en curso y devueltos
+            return ('orden_estado', '-fecha_prestamo', 'id')
+        # Activos primero (fecha_devolucion_real NULL), luego los más recientes
+        return ('fecha_devolucion_real', '-fecha_prestamo', 'id')
     def get_queryset(self):
-        return Prestamo.objects.all().order_by('fecha_devolucion_real', '-fecha_prestamo')
+        ahora = timezone.now()
+        qs = Prestamo.objects.select_related('libro', 'usuario').only(
+            'fecha_prestamo', 'fecha_devolucion_prevista', 'fecha_devolucion_real', 'retraso_manual',
+            'libro__titulo', 'usuario__username',
+        )
+        qs = qs.con_estado_igual(self.request.GET.get('estado'), ahora)
+        return qs.con_estado(ahora).order_by('fecha_devolucion_real', '-fecha_prestamo')
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['estados'] = Prestamo.ESTADO_CHOICES
+        context['selected'] = {
+            'estado': self.request.GET.get('estado', ''),
+            'orden': self.request.GET.get('orden', ''),
+        }
+        return context
 class DevolverLibroView(BibliotecarioRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         prestamo_pk = self.kwargs.get('prestamo_pk')
-        prestamo = Prestamo.objects.get(pk=prestamo_pk)
-        prestamo.fecha_devolucion_real = timezone.now()
-        # Si estaba marcado como retrasado manualmente, limpiarlo al devolver
-        prestamo.retraso_manual = False
-        prestamo.save()
-        prestamo.libro.estado = Libro.ESTADO_DISPONIBLE
-        prestamo.libro.save()
-        # Notificar la primera reserva activa si existe
-        reserva = Reserva.objects.filter(
-            libro=prestamo.libro,
-            atendida=False,
-            fecha_expiracion__gt=timezone.now()
-        ).order_by('fecha_reserva').first()
-        if reserva:
-            try:
-                send_mail(
-                    subject='Tu reserva está disponible',
-                    message=(
-                        f'Hola {reserva.usuario.first_name or reserva.usuario.username},\n\n'
-                        f'El libro "{prestamo.libro.titulo}" ya está disponible para préstamo. '
-                        f'Tienes hasta {reserva.fecha_expiracion.strftime("%Y-%m-%d %H:%M")} para recogerlo.'
-                    ),
-                    from_email='noreply@biblioteca.com',
-                    recipient_list=[reserva.usuario.email],
-                    fail_silently=True,
-                )
-            except Exception:
-                pass
-            reserva.atendida = True
-            reserva.save()
+        prestamo = prestamos.devolver(prestamo_pk)
+        if prestamo is None:
+            get_object_or_404(Prestamo, pk=prestamo_pk)
+            messages.info(request, 'Este préstamo ya fue devuelto.')
+            return redirect('gestion_prestamos')
         messages.success(request, f'El libro "{prestamo.libro.titulo}" ha sido devuelto.')
         return redirect('gestion_prestamos')
 
 class MarcarPrestamoRetrasadoView(BibliotecarioRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         prestamo_pk = self.kwargs.get('prestamo_pk')
-        prestamo = Prestamo.objects.get(pk=prestamo_pk)
-        if prestamo.fecha_devolucion_real:
+        prestamo = prestamos.marcar_retrasado(prestamo_pk)
+        if prestamo is None:
+            get_object_or_404(Prestamo, pk=prestamo_pk)
             messages.info(request, 'Este préstamo ya fue devuelto.')
             return redirect('gestion_prestamos')
-        prestamo.retraso_manual = True
-        prestamo.save()
-        # Reflejar también el estado del libro
-        prestamo.libro.estado = Libro.ESTADO_RETRASADO
-        prestamo.libro.save()
         messages.success(request, f'Préstamo de "{prestamo.libro.titulo}" marcado como retrasado.')
         return redirect('gestion_prestamos')
 
+class CirculacionMasivaView(BibliotecarioRequiredMixin, View):
+    """Devolución o préstamo de muchos libros de una vez (ids o ISBN pegados o escaneados)."""
+    template_name = 'core/circulacion_masiva.html'
+    operacion = 'devolver'  # o 'prestar'
+    def get(self, request, *args, **kwargs):
+        return render(request, self.template_name, {'operacion': self.operacion})
+    def post(self, request, *args, **kwargs):
+        texto = request.POST.get('identificadores', '')
+        identificadores = prestamos.leer_identificadores(texto)
+        context = {'operacion': self.operacion, 'texto': texto, 'lector': request.POST.get('lector', '')}
+        if not identificadores:
+            messages.error(request, 'Indica al menos un identificador.')
+            return render(request, self.template_name, context)
+        if len(identificadores) > prestamos.MAX_IDENTIFICADORES:
+            messages.error(request, f'Como máximo {prestamos.MAX_IDENTIFICADORES} identificadores por operación.')
+            return render(request, self.template_name, context)
+        if self.operacion == 'prestar':
+            lector = Usuario.objects.filter(username=context['lector']).first()
+            if lector is None:
+                messages.error(request, 'No existe un usuario con ese nombre.')
+                return render(request, self.template_name, context)
+            try:
+                resultados = prestamos.prestar_varios(lector, identificadores)
+            except prestamos.ConflictoConcurrente as e:
+                messages.error(request, str(e))
+                return render(request, self.template_name, context)
+        else:
+            resultados = prestamos.devolver_varios(identificadores)
+        correctos = sum(r['ok'] for r in resultados)
+        if 'application/json' in request.headers.get('Accept', ''):
+            return JsonResponse({
+                'correctos': correctos,
+                'resultados': [
+                    {k: r[k] for k in ('identificador', 'ok', 'titulo', 'detalle')} for r in resultados
+                ],
+            })
+        messages.success(request, f'{correctos} de {len(resultados)} identificador(es) procesados correctamente.')
+        context['resultados'] = resultados
+        return render(request, self.template_name, context)
+
 # --- VISTAS DE REPORTES ---
 @bibliotecario_required
 def exportar_libros_excel(request):
-    # Importación perezosa de pandas para evitar que falle el arranque si no está instalado
+    # openpyxl es opcional: sin él devolvemos el reporte en CSV como alternativa
     try:
-        import pandas as pd
+        import openpyxl  # noqa: F401
     except ImportError:
-        # Si pandas no está disponible, devolvemos el reporte en CSV como alternativa
         return exportar_libros_csv(request)
-    libros = Libro.objects.all()
-    data = {
-        'Título': [libro.titulo for libro in libros],
-        'Autor': [str(libro.autor) for libro in libros],
-        'Categoría': [str(libro.categoria) for libro in libros],
-        'ISBN': [libro.isbn for libro in libros],
-        'Estado': [libro.get_estado_display() for libro in libros],
-    }
-    df = pd.DataFrame(data)
-    response = HttpResponse(
+    # El archivo se arma en disco (no en memoria) y se envía por bloques
+    archivo = tempfile.TemporaryFile()
+    reportes.escribir_libros_excel(archivo, request.GET)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename='reporte_libros.xlsx',
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
     )
-    response['Content-Disposition'] = 'attachment; filename="reporte_libros.xlsx"'
-    df.to_excel(response, index=False)
-    return response
 
 @bibliotecario_required
 def exportar_prestamos_pdf(request):
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="reporte_prestamos_activos.pdf"'
-    prestamos = Prestamo.objects.filter(fecha_devolucion_real__isnull=True).order_by('fecha_devolucion_prevista')
-    doc = SimpleDocTemplate(response, pagesize=letter)
-    elements = []
-    data = [['Libro', 'Usuario (Lector)', 'Fecha Préstamo', 'Devolución Prevista', 'Estado']]
-    for prestamo in prestamos:
-        estado = "Retrasado" if prestamo.esta_retrasado else "En curso"
-        data.append([
-            prestamo.libro.titulo,
-            prestamo.usuario.username,
-            prestamo.fecha_prestamo.strftime('%Y-%m-%d'),
-            prestamo.fecha_devolucion_prevista.strftime('%Y-%m-%d'),
-            estado
-        ])
-    table_style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ])
-    table = Table(data)
-    table.setStyle(table_style)
-    elements.append(table)
-    doc.build(elements)
-    return response
+    # ?agrupar=dia|categoria separa el reporte en apartados
+    agrupar = request.GET.get('agrupar')
+    if agrupar not in reportes.AGRUPACIONES_PDF:
+        agrupar = None
+    archivo = tempfile.TemporaryFile()
+    reportes.escribir_prestamos_pdf(archivo, agrupar)
+    archivo.seek(0)
+    return FileResponse(
+        archivo, as_attachment=True, filename='reporte_prestamos_activos.pdf', content_type='application/pdf'
+    )
 
 # --- VISTAS DE REPORTES CSV ---
+# Se transmiten fila a fila: el primer byte sale de inmediato y la memoria no crece con el catálogo
 @bibliotecario_required
 def exportar_libros_csv(request):
-    libros = Libro.objects.all()
-    response = HttpResponse(content_type='text/csv')
+    # Acepta los mismos filtros que el catálogo (?q=&estado=&categoria=&autor=)
+    filas = reportes.filas_libros(request.GET)
+    response = StreamingHttpResponse(
+        reportes.lineas_csv(reportes.CABECERA_LIBROS, filas), content_type='text/csv; charset=utf-8'
+    )
     response['Content-Disposition'] = 'attachment; filename="reporte_libros.csv"'
-    # Generar CSV manualmente para evitar dependencias
-    header = 'Titulo,Autor,Categoria,ISBN,Estado\n'
-    response.write(header)
-    for libro in libros:
-        fila = f'{libro.titulo},{libro.autor},{libro.categoria},{libro.isbn},{libro.get_estado_display()}\n'
-        response.write(fila)
     return response
 
 @bibliotecario_required
 def exportar_prestamos_csv(request):
-    prestamos = Prestamo.objects.all().order_by('-fecha_prestamo')
-    response = HttpResponse(content_type='text/csv')
+    filas = reportes.filas_prestamos()
+    response = StreamingHttpResponse(
+        reportes.lineas_csv(reportes.CABECERA_PRESTAMOS, filas), content_type='text/csv; charset=utf-8'
+    )
     response['Content-Disposition'] = 'attachment; filename="reporte_prestamos.csv"'
-    header = 'Libro,Usuario,FechaPrestamo,DevolucionPrevista,DevolucionReal,Retrasado\n'
-    response.write(header)
-    for p in prestamos:
-        retrasado = 'SI' if p.esta_retrasado else 'NO'
-        fecha_real = p.fecha_devolucion_real.strftime('%Y-%m-%d') if p.fecha_devolucion_real else ''
-        fila = f'{p.libro.titulo},{p.usuario.username},{p.fecha_prestamo.strftime('%Y-%m-%d')},{p.fecha_devolucion_prevista.strftime('%Y-%m-%d')},{fecha_real},{retrasado}\n'
-        response.write(fila)
     return response
 
+# --- REPORTES EN SEGUNDO PLANO ---
+@bibliotecario_required
+@require_POST
+def solicitar_reporte(request, tipo):
+    if tipo not in trabajos.GENERADORES:
+        raise Http404('Tipo de reporte desconocido.')
+    parametros = {}
+    if tipo in (Trabajo.TIPO_LIBROS_EXCEL, Trabajo.TIPO_LIBROS_CSV):
+        parametros = {k: request.POST.get(k, '') for k in trabajos.PARAMETROS_LIBROS}
+    elif tipo == Trabajo.TIPO_PRESTAMOS_PDF and request.POST.get('agrupar') in reportes.AGRUPACIONES_PDF:
+        parametros = {'agrupar': request.POST['agrupar']}
+    trabajo, creado = trabajos.encolar(tipo, parametros, request.user)
+    if creado:
+        messages.success(request, f'Reporte "{trabajo.get_tipo_display()}" en cola. Podrás descargarlo aquí cuando esté listo.')
+    else:
+        messages.info(request, f'Ya hay un reporte "{trabajo.get_tipo_display()}" reciente; se reutiliza.')
+    return redirect('reportes_trabajos')
+
+class TrabajosListView(BibliotecarioRequiredMixin, ListView):
+    model = Trabajo
+    template_name = 'core/trabajo_list.html'
+    context_object_name = 'trabajos'
+    def get_queryset(self):
+        # Reportes e importaciones; las tareas internas (miniaturas) se ven en el admin
+        tipos = [*trabajos.GENERADORES, *trabajos.IMPORTACIONES]
+        return Trabajo.objects.filter(tipo__in=tipos).order_by('-creado')[:50]
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['tipos'] = [(tipo, etiqueta) for tipo, etiqueta in Trabajo.TIPO_CHOICES if tipo in trabajos.GENERADORES]
+        context['hay_pendientes'] = any(
+            t.estado in (Trabajo.ESTADO_PENDIENTE, Trabajo.ESTADO_EN_PROCESO) for t in context['trabajos']
+        )
+        return context
+
+@bibliotecario_required
+def estado_trabajo(request, pk):
+    trabajo = get_object_or_404(Trabajo, pk=pk)
+    completado = trabajo.estado == Trabajo.ESTADO_COMPLETADO and bool(trabajo.archivo)
+    return JsonResponse({
+        'id': trabajo.pk,
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'creado': trabajo.creado.isoformat(),
+        'terminado': trabajo.terminado.isoformat() if trabajo.terminado else None,
+        'error': trabajo.error or None,
+        'resumen': trabajo.resumen or None,
+        'descarga': reverse('trabajo_descargar', args=[trabajo.pk]) if completado else None,
+    })
+
+@bibliotecario_required
+def descargar_trabajo(request, pk):
+    trabajo = get_object_or_404(Trabajo.objects.exclude(archivo=''), pk=pk, estado=Trabajo.ESTADO_COMPLETADO)
+    return FileResponse(trabajo.archivo.open('rb'), as_attachment=True, filename=os.path.basename(trabajo.archivo.name))
+
 # --- VISTAS DE RESERVAS ---
-class MisReservasListView(LoginRequiredMixin, ListView):
+class MisReservasListView(LoginRequiredMixin, PaginacionCursorMixin, ListView):
     model = Reserva
     template_name = 'core/mis_reservas.html'
     context_object_name = 'reservas'
+    orden_cursor = ('-fecha_reserva', '-id')
     def get_queryset(self):
-        return Reserva.objects.filter(usuario=self.request.user).order_by('-fecha_reserva')
\ No newline at end of file
+        return Reserva.objects.filter(usuario=self.request.user).select_related('libro').only(
+            'fecha_reserva', 'fecha_expiracion', 'estado', 'libro__titulo',
+        ).con_posicion().order_by('-fecha_reserva')
\ No newline at end of file